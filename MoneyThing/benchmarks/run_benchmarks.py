@@ -0,0 +1,198 @@
+"""
+Times the app's hot paths against synthetic users.
+
+    python -m benchmarks.run_benchmarks --sizes 1000 10000 100000
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/old.json benchmarks/results/new.json
+
+Run from the MoneyThing directory, results are written as json for comparing across commits.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from src.user_context import UserContext
+from src.sql_database import SQLDatabase
+from src.db_manager import DatabaseManager
+import src.utils as utils
+from benchmarks.synthetic_data import generate_user_data, make_statement_pages, make_lidl_receipt_text
+
+BENCHMARKS = {}
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def benchmark(name, writes=False):
+    """
+    registers a benchmark, called with (db_manager, num_transactions, run index)
+    :param writes: the benchmark changes the db, the db manager is reloaded before each run
+    """
+    def decorator(func):
+        BENCHMARKS[name] = {"func": func, "writes": writes}
+        return func
+    return decorator
+
+
+@benchmark("db_manager_load")
+def bench_db_manager_load(db_manager, num_transactions, run):
+    DatabaseManager(db_manager.context)
+
+@benchmark("save_changes", writes=True)
+def bench_save_changes(db_manager, num_transactions, run):
+    table = db_manager.transactions
+    updated_df = table.db_data[table.COLUMNS].copy()
+    edited = updated_df.sample(frac=0.01, random_state=run).index
+    updated_df.loc[edited, "description"] = f"edited in run {run}"
+    table.save_changes(updated_df, db_manager.db)
+
+@benchmark("search_term")
+def bench_search_term(db_manager, num_transactions, run):
+    utils.get_df_matching_search_term(db_manager.get_transactions_display_df(), "tesco")
+
+@benchmark("graph_info")
+def bench_graph_info(db_manager, num_transactions, run):
+    from src.money_tracker import get_graph_info
+    get_graph_info(db_manager, "Current Account")
+
+@benchmark("spending_view")
+def bench_spending_view(db_manager, num_transactions, run):
+    from page.spending_view_page import get_all_categories_spending, get_unassigned_category_spending
+    # the spending view prints its working, which would swamp the timings
+    with contextlib.redirect_stdout(io.StringIO()):
+        get_all_categories_spending(db_manager)
+        get_unassigned_category_spending(db_manager)
+
+@benchmark("statement_import", writes=True)
+def bench_statement_import(db_manager, num_transactions, run):
+    from src.statement_parsers import parse_statement_pages
+    from src.pdf_reader import store_transactions_df
+    # pdf text extraction is left out, it depends on pdfplumber rather than this code
+    transactions_df, snapshot_info = parse_statement_pages(
+        make_statement_pages(max(num_transactions // 10, 10), seed=run)
+    )
+    with db_manager.db.transaction():
+        store_transactions_df(transactions_df, snapshot_info, db_manager, "Current Account")
+
+@benchmark("receipt_import", writes=True)
+def bench_receipt_import(db_manager, num_transactions, run):
+    from src.receipt_parsers import parse_receipt_text
+    from src.receipt_reader import store_receipt
+    # OCR is left out, it is tesseract's time rather than this code's
+    with db_manager.db.transaction():
+        for i in range(max(num_transactions // 1000, 5)):
+            parser, parsed = parse_receipt_text(make_lidl_receipt_text(20, seed=run*1000+i))
+            store_receipt(parser, parsed, db_manager, "Current Account")
+
+@benchmark("vendor_merge", writes=True)
+def bench_vendor_merge(db_manager, num_transactions, run):
+    vendor_ids = list(db_manager.vendors.db_data["vendor_id"])
+    db_manager.merge_vendors(vendor_ids[1:3], vendor_ids[0], "Merged Location")
+
+
+def time_benchmark(name, context, num_transactions, repeat) -> dict:
+    func = BENCHMARKS[name]["func"]
+    timings = []
+    db_manager = DatabaseManager(context)
+    for run in range(repeat):
+        if BENCHMARKS[name]["writes"] and run > 0:
+            db_manager = DatabaseManager(context)
+        start = time.perf_counter()
+        func(db_manager, num_transactions, run)
+        timings.append(time.perf_counter() - start)
+    return {
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "runs": timings
+    }
+
+def get_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(sizes, names, repeat, max_seconds) -> dict:
+    results = {
+        "commit": get_commit(),
+        "timestamp": datetime.datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "sizes": {}
+    }
+    too_slow = set()
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            context = UserContext(1, os.path.join(temp_dir, "database.db"))
+            db = SQLDatabase(context)
+            start = time.perf_counter()
+            row_counts = generate_user_data(db, size)
+            print(f"[{size}] generated {row_counts} in {time.perf_counter()-start:.1f}s", file=sys.stderr)
+
+            size_results = {"row_counts": row_counts, "timings": {}}
+            for name in names:
+                if name in too_slow:
+                    size_results["timings"][name] = {"skipped": f"took over {max_seconds}s at a smaller size"}
+                    continue
+                timing = time_benchmark(name, context, size, repeat)
+                size_results["timings"][name] = timing
+                print(f"[{size}] {name}: min {timing['min']*1000:.1f}ms median {timing['median']*1000:.1f}ms",
+                      file=sys.stderr)
+                if timing["min"] > max_seconds:
+                    too_slow.add(name)
+            results["sizes"][str(size)] = size_results
+    return results
+
+def compare_results(base_path, new_path):
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{'size':>8} {'benchmark':<20} {'base ms':>10} {'new ms':>10} {'speedup':>8}")
+    for size, new_size_results in new["sizes"].items():
+        base_timings = base["sizes"].get(size, {}).get("timings", {})
+        for name, timing in new_size_results["timings"].items():
+            base_timing = base_timings.get(name, {})
+            if "min" not in timing or "min" not in base_timing:
+                continue
+            print(f"{size:>8} {name:<20} {base_timing['min']*1000:>10.1f} {timing['min']*1000:>10.1f} "
+                  f"{base_timing['min']/timing['min']:>7.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Money Thing benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="number of transactions per synthetic user")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="benchmarks to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-seconds", type=float, default=60,
+                        help="skip a benchmark at larger sizes once a run takes longer than this")
+    parser.add_argument("--output", help="json file to write (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files")
+    args = parser.parse_args(argv)
+
+    if args.compare is not None:
+        compare_results(*args.compare)
+        return
+
+    results = run_benchmarks(sorted(args.sizes), args.only or list(BENCHMARKS), args.repeat, args.max_seconds)
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = RESULTS_DIR / f"{(results['commit'] or 'uncommitted')[:10]}.json"
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import random
+import datetime
+import src.utils as utils
+from src.sql_database import SQLDatabase
+
+VENDOR_WORDS = ["Lidl", "Tesco", "Aldi", "Asda", "Boots", "Greggs", "Shell", "Argos", "Currys", "Costa"]
+PRODUCT_WORDS = ["MILK", "BREAD", "CHEESE", "APPLES", "PASTA", "RICE", "BEANS", "COFFEE", "TEA", "EGGS",
+                 "BUTTER", "YOGURT", "CHICKEN", "ONIONS", "CRISPS", "JUICE", "SOAP", "BATTERIES"]
+CATEGORY_WORDS = ["Food", "Travel", "Bills", "Fun", "Health", "Home", "Clothes", "Gifts"]
+
+
+def get_next_id(db: SQLDatabase, table: str) -> int:
+    """
+    the id AUTOINCREMENT will give the next row, rows inserted in one go get consecutive ids from here
+    """
+    row = db.execute_sql(
+        "SELECT seq FROM sqlite_sequence WHERE name = ?;", (table, ), do_log=False
+    ).fetchone()
+    return 1 if row is None else row[0]+1
+
+def insert_rows(db: SQLDatabase, table: str, columns: list[str], rows: list[tuple], now: str) -> list[int]:
+    """
+    Bulk inserts rows along with their MetaData rows, inside the caller's transaction
+    :return: the new ids, in the same order as rows
+    """
+    first_meta_data_id = get_next_id(db, "MetaData")
+    db.cursor.executemany(
+        "INSERT INTO MetaData (created_timestamp, edited_timestamp, row_deleted, user_id) VALUES (?, ?, 0, ?);",
+        [(now, now, db.user_id)]*len(rows)
+    )
+    first_id = get_next_id(db, table)
+    db.cursor.executemany(
+        f"INSERT INTO {table} ({', '.join(columns)}, meta_data_id) VALUES ({', '.join('?'*(len(columns)+1))});",
+        [row + (first_meta_data_id+i, ) for i, row in enumerate(rows)]
+    )
+    return list(range(first_id, first_id+len(rows)))
+
+
+def generate_user_data(db: SQLDatabase, num_transactions: int, seed=0, today=None) -> dict:
+    """
+    Fills the db with a synthetic user for db.user_id: nested categories, vendors with locations,
+    products, money stores, transactions with spending items, transfers and monthly snapshots.
+    Transactions are spread over the two years before today.
+    :return: number of rows created per table
+    """
+    rng = random.Random(seed)
+    if today is None:
+        today = datetime.date(2025, 11, 1)
+    now = datetime.datetime.now().isoformat()
+
+    def random_date():
+        return utils.date_to_string(today - datetime.timedelta(days=rng.randrange(730)))
+
+    with db.transaction():
+        root_ids = insert_rows(db, "Categories", ["name", "importance", "parent_category_id"],
+                               [(name, rng.randint(1, 5), None) for name in CATEGORY_WORDS], now)
+        child_ids = insert_rows(db, "Categories", ["name", "importance", "parent_category_id"], [
+            (f"{CATEGORY_WORDS[i]} {n}", rng.randint(1, 5), root_id)
+            for i, root_id in enumerate(root_ids) for n in range(3)
+        ], now)
+        leaf_ids = insert_rows(db, "Categories", ["name", "importance", "parent_category_id"], [
+            (f"Sub {child_id}-{n}", rng.randint(1, 5), child_id)
+            for child_id in child_ids for n in range(2)
+        ], now)
+        category_ids = root_ids + child_ids + leaf_ids
+
+        num_vendors = max(10, num_transactions // 100)
+        vendor_ids = insert_rows(db, "Vendors", ["name", "default_category_id", "default_location_id"], [
+            (f"{VENDOR_WORDS[i % len(VENDOR_WORDS)]} {i}", rng.choice(category_ids), None)
+            for i in range(num_vendors)
+        ], now)
+        location_rows = [(f"Street {n}", vendor_id) for vendor_id in vendor_ids for n in range(2)]
+        location_ids = insert_rows(db, "ShopLocations", ["shop_location", "vendor_id"], location_rows, now)
+
+        num_products = max(50, num_transactions // 5)
+        product_rows = [
+            (f"{rng.choice(PRODUCT_WORDS)} {rng.choice(PRODUCT_WORDS)} {i}", round(rng.uniform(0.3, 12), 2),
+             rng.choice(vendor_ids), rng.choice(category_ids), None)
+            for i in range(num_products)
+        ]
+        product_ids = insert_rows(db, "Products", ["name", "price", "vendor_id", "category_id", "description"],
+                                  product_rows, now)
+
+        money_store_ids = insert_rows(db, "MoneyStores", ["name", "creation_date"], [
+            (name, utils.date_to_string(today - datetime.timedelta(days=800)))
+            for name in ["Current Account", "Savings", "Cash"]
+        ], now)
+
+        transaction_rows = []
+        for i in range(num_transactions):
+            location_index = rng.randrange(len(location_ids))
+            has_items = rng.random() < 0.7
+            transaction_rows.append((
+                random_date(),
+                f"{rng.randint(1, 12):02d}:{rng.randint(0, 59):02d}PM",
+                None if has_items else round(rng.uniform(1, 200), 2),
+                rng.random() < 0.1,
+                rng.choice(money_store_ids),
+                location_rows[location_index][1],
+                location_ids[location_index],
+                rng.choice(category_ids),
+                None if rng.random() < 0.5 else f"synthetic transaction {i}"
+            ))
+        transaction_ids = insert_rows(db, "Transactions", [
+            "date", "time", "override_money", "is_income", "money_store_id",
+            "vendor_id", "shop_location_id", "category_id", "description"
+        ], transaction_rows, now)
+
+        spending_item_rows = []
+        for transaction_id, row in zip(transaction_ids, transaction_rows):
+            if row[2] is not None:
+                continue
+            for _ in range(rng.randint(1, 5)):
+                product_index = rng.randrange(len(product_ids))
+                spending_item_rows.append((
+                    transaction_id,
+                    product_ids[product_index],
+                    None if rng.random() < 0.8 else round(rng.uniform(0.3, 12), 2),
+                    product_rows[product_index][1],
+                    rng.randint(1, 3)
+                ))
+        insert_rows(db, "SpendingItems", [
+            "transaction_id", "product_id", "override_price", "parent_price", "num_purchased"
+        ], spending_item_rows, now)
+
+        transfer_rows = [
+            (*rng.sample(money_store_ids, 2), random_date(), None, round(rng.uniform(5, 500), 2))
+            for _ in range(max(5, num_transactions // 50))
+        ]
+        insert_rows(db, "InternalTransfers", [
+            "source_store_id", "target_store_id", "date", "time", "money_transferred"
+        ], transfer_rows, now)
+
+        snapshot_rows = [
+            (money_store_id, utils.date_to_string(today - datetime.timedelta(days=30*month)), None,
+             round(rng.uniform(100, 5000), 2))
+            for money_store_id in money_store_ids for month in range(24)
+        ]
+        insert_rows(db, "StoreSnapshots", [
+            "money_store_id", "snapshot_date", "snapshot_time", "money_stored"
+        ], snapshot_rows, now)
+
+    return {
+        "Categories": len(category_ids),
+        "Vendors": len(vendor_ids),
+        "ShopLocations": len(location_ids),
+        "Products": len(product_ids),
+        "MoneyStores": len(money_store_ids),
+        "Transactions": len(transaction_ids),
+        "SpendingItems": len(spending_item_rows),
+        "InternalTransfers": len(transfer_rows),
+        "StoreSnapshots": len(snapshot_rows)
+    }
+
+
+def make_statement_pages(num_rows: int, seed=0, rows_per_page=40) -> list[list[list[dict]]]:
+    """
+    Word layouts shaped like extract_pdf_text's HSBC output, for benchmarking the parser without a pdf
+    """
+    rng = random.Random(seed)
+    pages = []
+    balance = 1000.0
+    for page_start in range(0, num_rows, rows_per_page):
+        page = [[
+            {"text": "01 Jan 25", "x_pos": 0},
+            {"text": "BALANCEBROUGHTFORWARD", "x_pos": 135},
+            {"text": f"{balance:,.2f}", "x_pos": 510}
+        ]]
+        for i in range(page_start, min(page_start+rows_per_page, num_rows)):
+            money = round(rng.uniform(1, 200), 2)
+            paid_in = rng.random() < 0.1
+            balance += money if paid_in else -money
+            page.append([
+                {"text": f"{rng.randint(1, 28):02d} Jan 25", "x_pos": 0},
+                {"text": "DD", "x_pos": 110},
+                {"text": f"{rng.choice(VENDOR_WORDS).upper()} {i % 50}", "x_pos": 135},
+                {"text": f"{money:,.2f}", "x_pos": 440 if paid_in else 350},
+            ])
+        page.append([{"text": "BALANCECARRIEDFORWARD", "x_pos": 135}])
+        pages.append(page)
+    return pages
+
+
+def make_lidl_receipt_text(num_items: int, seed=0) -> str:
+    rng = random.Random(seed)
+    lines = ["Lidl Plus", "£100 of Lidl Vouchers."]
+    total = 0
+    for i in range(num_items):
+        price = round(rng.uniform(0.3, 6), 2)
+        total += price
+        lines.append(f"{rng.choice(PRODUCT_WORDS)} {rng.choice(PRODUCT_WORDS)} {price:.2f} A")
+    lines.append(f"TOTAL {total:.2f}")
+    lines.append("*CUSTOMER COPY*")
+    lines.append("Date: 12/05/25 Time: 14:03:22")
+    return "\n".join(lines)
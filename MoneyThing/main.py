@@ -1,7 +1,8 @@
 import streamlit as st
-import src.utils as utils
 import src.streamlit_utils as st_utils
-from src.authentication import st_auth_ui, logout, change_password_ui, change_username_ui, load_users
+import src.tracing as tracing
+from src.backup_maker import start_backup_service
+from src.authentication import st_auth_ui, logout, get_current_user, change_password_ui, change_username_ui
 from page.voucher_shop import voucher_shop_ui
 from page.transactions_page import transactions_page_ui
 from page.vendors_page import edit_vendors_page_ui
@@ -14,6 +15,15 @@ import pandas as pd
 
 pd.set_option('display.max_rows', 5000, 'display.max_columns', 10, 'display.expand_frame_repr', False)
 
+
+@st.cache_resource
+def start_background_services():
+    # cached for the server process, so reruns and reloads of this script don't start another backup service
+    return start_backup_service()
+
+
+start_background_services()
+
 st.set_page_config(
     page_title="Home - Money Thing",
     page_icon="📈",
@@ -22,7 +32,7 @@ st.set_page_config(
 )
 
 def run_if_auth(func):
-    if utils.is_authenticated():
+    if st_utils.is_authenticated():
         func()
     else:
         st.switch_page(pages_dict["account"])
@@ -37,11 +47,13 @@ def load_page(page_key):
 
 def make_page(page_func, check_auth=True):
     page_key = str(page_func)
+    tracing.start_trace(page_func.__name__)
     load_page(page_key)
-    if check_auth:
-        run_if_auth(page_func)
-    else:
-        page_func()
+    with tracing.span(page_func.__name__):
+        if check_auth:
+            run_if_auth(page_func)
+        else:
+            page_func()
     st_utils.store_to_ui_cache(page_key)
 
 def Account():
@@ -110,25 +122,23 @@ pages_info = {
 if __name__ == "__main__":
     pg = st.navigation(pages_info)
     pg.run()
+    trace = tracing.finish_trace()
     if st.session_state.get("authenticated", False):
+        st_utils.tracing_panel_ui(trace)
 
         st.sidebar.markdown(f"Your Tokens: 🪙{st.session_state.get('current_user_tokens', '?')}")
         if st.sidebar.button("Logout"):
             logout()
             st.rerun()
-        users_df = load_users()
-        user_row = users_df[users_df["user_id"] == st.session_state["current_user_id"]].iloc[0]
         if st.sidebar.button("Change Password"):
-            change_password_ui(user_row)
+            change_password_ui(get_current_user())
         if st.sidebar.button("Change Username"):
-            used_usernames = list(users_df["username"])
-            change_username_ui(user_row, used_usernames)
+            change_username_ui(get_current_user())
 
 
 
 # TODO: HIGH PRIORITY
 #  add products page
-#  add vendor merging back to vendor menu
 #  improve edit money store menu
 #  re-add merging transactions
 #  make internal transfers editable in transactions menu
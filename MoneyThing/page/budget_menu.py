@@ -3,10 +3,11 @@ import src.utils as utils
 import datetime
 
 from src.db_manager import DatabaseManager
+import src.streamlit_utils as st_utils
 
 
 def budget_menu_ui():
-    db_manager = DatabaseManager()
+    db_manager = DatabaseManager(st_utils.get_user_context())
     st.markdown("# Budgeting")
 
     view, create = st.columns([1,1])
@@ -1,6 +1,6 @@
-import src.utils as utils
 import streamlit as st
 from src.db_manager import DatabaseManager
+import src.streamlit_utils as st_utils
 from src.logger import log
 import math
 
@@ -102,7 +102,7 @@ def clear_selection():
 
 
 def save_category(category_id, name, importance, parent_name):
-    db_manager = DatabaseManager()
+    db_manager = DatabaseManager(st_utils.get_user_context())
     parent_category_id = db_manager.categories.get_id_from_value("name", parent_name)
     save_data = {
         "name": name,
@@ -134,7 +134,7 @@ def update_category(db_manager, category_id, save_data):
     )
 
 def delete_category(category_id):
-    db_manager = DatabaseManager()
+    db_manager = DatabaseManager(st_utils.get_user_context())
     db_manager.db.delete(
         db_manager.categories.TABLE,
         "category_id",
@@ -144,14 +144,14 @@ def delete_category(category_id):
     clear_selection()
 
 def categories_page_ui():
-    utils.block_if_no_auth()
+    st_utils.block_if_no_auth()
     st.set_page_config(page_title="Categories - Money Thing", page_icon="📈", layout="wide")
     log("Loading page 2: Edit Vendors")
 
     if "selected_category" not in st.session_state:
         st.session_state["selected_category"] = None
 
-    db_manager = DatabaseManager()
+    db_manager = DatabaseManager(st_utils.get_user_context())
 
     trees = CategoryTree.generate_category_trees(db_manager)
 
@@ -1,16 +1,16 @@
 import streamlit as st
 from src.db_manager import DatabaseManager
 from src.sql_database import SQLDatabase
+import src.change_log as change_log
 import src.streamlit_utils as st_utils
 from src.logger import log
-import src.utils as utils
 
 
 @st.fragment
 def user_input_sql():
     if st.session_state.get("current_user_id", 0) != 1:
         return
-    db = SQLDatabase()
+    db = SQLDatabase(st_utils.get_user_context())
 
     if "cache_sql_input" not in st.session_state:
         st.session_state["cache_sql_input"] = set(
@@ -50,15 +50,22 @@ def user_input_sql():
             st.write("SQL Executed Successfully!")
             if sql_statement.lower().startswith("select"):
                 st.write(output)
+            else:
+                st.session_state["undo_sql_change_range"] = db.last_user_sql_change_range
 
             st.session_state["cache_sql_input"].add(sql_statement)
         else:
             st.write("SQL Failed to Execute")
             st.write(output)
 
+    if st.session_state.get("undo_sql_change_range") is not None and st.button("Undo Last SQL"):
+        num_changes = change_log.undo_range(db, *st.session_state["undo_sql_change_range"])
+        st.session_state["undo_sql_change_range"] = None
+        st.write(f"Reverted {num_changes} changes")
+
 @st.fragment
 def products_table_ui():
-    db_manager = DatabaseManager()
+    db_manager = DatabaseManager(st_utils.get_user_context())
     if db_manager.save_products_df_changes(
         st_utils.data_editor(
             db_manager.get_products_display_df(),
@@ -75,7 +82,7 @@ def products_table_ui():
 
 @st.fragment
 def vendors_table_ui():
-    db_manager = DatabaseManager()
+    db_manager = DatabaseManager(st_utils.get_user_context())
     if db_manager.save_vendors_df_changes(
         st_utils.data_editor(
             db_manager.get_vendors_display_df(),
@@ -88,7 +95,7 @@ def vendors_table_ui():
 
 @st.fragment
 def locations_table_ui():
-    db_manager = DatabaseManager()
+    db_manager = DatabaseManager(st_utils.get_user_context())
     if db_manager.save_locations_df_changes(
         st_utils.data_editor(
             db_manager.get_locations_display_df(),
@@ -102,7 +109,7 @@ def locations_table_ui():
 
 @st.fragment
 def categories_table_ui():
-    db_manager = DatabaseManager()
+    db_manager = DatabaseManager(st_utils.get_user_context())
     if db_manager.save_categories_df_changes(
         st_utils.data_editor(
             db_manager.get_categories_display_df(),
@@ -118,7 +125,7 @@ def categories_table_ui():
 
 @st.fragment
 def money_stores_table_ui():
-    db_manager = DatabaseManager()
+    db_manager = DatabaseManager(st_utils.get_user_context())
     if db_manager.save_money_stores_df_changes(
         st_utils.data_editor(
             db_manager.get_money_stores_display_df(),
@@ -131,7 +138,7 @@ def money_stores_table_ui():
 
 @st.fragment
 def snapshot_table_ui():
-    db_manager = DatabaseManager()
+    db_manager = DatabaseManager(st_utils.get_user_context())
     if db_manager.save_store_snapshots_df_changes(
         st_utils.data_editor(
             db_manager.get_store_snapshots_display_df(),
@@ -147,7 +154,7 @@ def snapshot_table_ui():
 
 @st.fragment
 def internal_transfers_table_ui():
-    db_manager = DatabaseManager()
+    db_manager = DatabaseManager(st_utils.get_user_context())
     if db_manager.save_internal_transfers_df_changes(
         st_utils.data_editor(
             db_manager.get_internal_transfers_display_df(),
@@ -163,7 +170,7 @@ def internal_transfers_table_ui():
 
 @st.fragment
 def transactions_table_ui():
-    db_manager = DatabaseManager()
+    db_manager = DatabaseManager(st_utils.get_user_context())
     if db_manager.save_transactions_df_changes(
         st_utils.data_editor(
             db_manager.get_transactions_display_df(),
@@ -184,7 +191,7 @@ def transactions_table_ui():
 
 @st.fragment
 def spending_items_table_ui():
-    db_manager = DatabaseManager()
+    db_manager = DatabaseManager(st_utils.get_user_context())
     if db_manager.save_spending_items_df_changes(
         st_utils.data_editor(
             db_manager.get_spending_items_display_df(),
@@ -203,7 +210,7 @@ def spending_items_table_ui():
         st.rerun()
 
 def database_view_page_ui():
-    utils.block_if_no_auth()
+    st_utils.block_if_no_auth()
     st.set_page_config(page_title="Database - Money Thing", page_icon="📈", layout="wide")
     log("Loading page 3: Database View")
 
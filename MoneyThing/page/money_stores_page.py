@@ -1,4 +1,3 @@
-import src.utils as utils
 import src.streamlit_utils as st_utils
 from src.db_manager import DatabaseManager
 from src.add_to_db import add_money_store, add_internal_transfer
@@ -7,11 +6,11 @@ import streamlit as st
 from src.logger import log
 
 def money_stores_page_ui():
-    utils.block_if_no_auth()
+    st_utils.block_if_no_auth()
     st.set_page_config(page_title="Money Store - Money Thing", page_icon="📈", layout="wide")
     log("Loading page 4: Money Stores")
 
-    db_manager = DatabaseManager()
+    db_manager = DatabaseManager(st_utils.get_user_context())
 
     money_tab, data_tab = st.tabs(["Money Tracker", "View Data"])
 
@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
-import src.utils as utils
 from src.db_manager import DatabaseManager
+import src.streamlit_utils as st_utils
 from src.logger import log
 from datetime import datetime, timedelta
 import plotly.express as px
@@ -374,13 +374,13 @@ def spending_view_page_ui():
     """
     Main UI for the spending view page.
     """
-    utils.block_if_no_auth()
+    st_utils.block_if_no_auth()
     st.set_page_config(page_title="Spending View - Money Thing", page_icon="💳", layout="wide")
     log("Loading Spending View page")
     
     st.markdown("# Spending View")
     
-    db_manager = DatabaseManager()
+    db_manager = DatabaseManager(st_utils.get_user_context())
     categories_df = db_manager.categories.db_data
     
     # Filter out categories with no name
@@ -1,14 +1,15 @@
 import streamlit as st
 from src.db_manager import DatabaseManager
+import src.streamlit_utils as st_utils
 from src.st_transaction_input import transaction_input_tab
-from src.pdf_reader import upload_pdf
-from src.receipt_reader import upload_lidl_receipt
+from src.pdf_reader import import_statements
+from src.receipt_reader import import_receipts
 from src.logger import log
 import src.utils as utils
 
 
 def view_transaction(transaction_id):
-    db_manager = DatabaseManager()
+    db_manager = DatabaseManager(st_utils.get_user_context())
     row = db_manager.transactions.get_db_row(transaction_id)
     st.session_state["transaction_viewer_date"] = {
         "depth": "specific",
@@ -21,11 +22,11 @@ def view_transaction(transaction_id):
     }
 
 def transactions_page_ui():
-    utils.block_if_no_auth()
+    st_utils.block_if_no_auth()
     st.set_page_config(page_title="Transactions - Money Thing", page_icon="📈", layout="wide")
     log("Loading page 1: Input Transactions")
 
-    db_manager = DatabaseManager()
+    db_manager = DatabaseManager(st_utils.get_user_context())
 
     st.markdown("# Add/Edit Transactions")
 
@@ -35,7 +36,7 @@ def transactions_page_ui():
         transaction_input_tab(db_manager)
 
     with upload_tab:
-        upload_type = st.selectbox("File Type", ["Lidl Digital Receipt", "HSBC Bank Statement"])
+        upload_type = st.selectbox("File Type", ["Digital Receipt", "HSBC Bank Statement"])
 
 
         if upload_type == "HSBC Bank Statement":
@@ -46,32 +47,40 @@ def transactions_page_ui():
             files = st.file_uploader("Upload HSBC Statements", accept_multiple_files=True, type=['pdf'])
 
             if st.button("Store data to database"):
-                if len(files) >= 5:
-                    progress_bar = st.progress(1, text="Uploading Files")
-                for i,file in enumerate(files):
-                    upload_pdf(file, db_manager, money_store)
-                    if len(files) >= 5:
-                        progress_bar.progress((i+1)/len(files))
+                progress_bar = st.progress(0, text="Reading Statements")
+
+                def update_progress(num_parsed, num_files):
+                    progress_bar.progress(
+                        num_parsed/num_files,
+                        text=f"Read {num_parsed}/{num_files} Statements"
+                    )
+
+                import_statements(files, db_manager, money_store, update_progress)
+                progress_bar.progress(1.0, text="Saved to Database")
                 st.toast("Upload Complete!", icon="✔️")
         else:
             st.markdown("## Upload Digital Receipt")
 
             money_store = st.radio("Money Store Used", options=db_manager.get_all_money_stores())
 
-            files = st.file_uploader("Upload Lidl Receipts", accept_multiple_files=True, type=['png', 'jpg', 'jpeg', 'bmp'])
+            files = st.file_uploader("Upload Receipts", accept_multiple_files=True, type=['png', 'jpg', 'jpeg', 'bmp'])
 
             if st.button("Store data to database"):
-                if len(files)>=2:
-                    progress_bar = st.progress(1, text="Uploading Receipts")
+                progress_bar = st.progress(0, text="Reading Receipts")
 
-                st.session_state["view_new_uploaded_transactions"] = []
+                def update_progress(num_read, num_files):
+                    progress_bar.progress(
+                        num_read/num_files,
+                        text=f"Read {num_read}/{num_files} Receipts"
+                    )
 
-                for i, file in enumerate(files):
-                    print("loading file", file)
-                    transaction_id = upload_lidl_receipt(file, db_manager, money_store)
-                    st.session_state["view_new_uploaded_transactions"].append(transaction_id)
-                    if len(files) >= 2:
-                        progress_bar.progress((i + 1) / len(files))
+                new_transactions, errors = import_receipts(
+                    files, db_manager, money_store, update_progress
+                )
+                st.session_state["view_new_uploaded_transactions"] = new_transactions
+                progress_bar.progress(1.0, text="Saved to Database")
+                for file_name, error in errors.items():
+                    st.error(f"Could not read {file_name}: {error}")
                 st.toast("Upload Complete!", icon="✔️")
 
 
@@ -6,56 +6,6 @@ import src.streamlit_utils as st_utils
 from src.st_transaction_input import find_transaction_value
 from src.logger import log
 
-def merge_vendors(db_manager, edit_vendor_id, target_vendor_id, target_location):
-    # convert shop locations to link to new vendor id + create new shop location
-    target_location_id = None
-    if target_location is not None:
-        target_location_id = db_manager.shop_locations.get_id_from_value("shop_location", target_location)
-
-        if target_location_id is None:
-            target_location_id = db_manager.db.create_row(
-                db_manager.shop_locations.TABLE,
-                {"shop_location": target_location,
-                 "vendor_id": target_vendor_id}
-            )
-        db_manager.db.update_row(
-            db_manager.shop_locations.TABLE,
-            {"vendor_id": target_vendor_id},
-            "shop_location_id",
-            target_location_id
-        )
-
-    # update transactions to new vendor id
-
-    transaction_changes = {
-        "vendor_id": target_vendor_id,
-    }
-    if target_location_id is not None:
-        transaction_changes["shop_location_id"] = target_location_id
-    db_manager.db.update_row(
-        db_manager.transactions.TABLE,
-        transaction_changes,
-        "vendor_id",
-        edit_vendor_id
-    )
-
-    # update products to link to new vendor id
-
-    db_manager.db.update_row(
-        db_manager.products.TABLE,
-        {"vendor_id": target_vendor_id},
-        "vendor_id",
-        edit_vendor_id
-    )
-
-    # delete old vendor
-
-    db_manager.db.delete(
-        db_manager.vendors.TABLE,
-        "vendor_id",
-        edit_vendor_id
-    )
-
 def vendor_list_ui(db_manager):
 
     state = st.session_state["vendors_state"]
@@ -176,46 +126,38 @@ def edit_vendor_ui(db_manager):
 
 
     list_vendor_locations_ui(db_manager, adding_vendor)
-    return
-
 
+    if st.session_state["selected_vendor_id"] is not None:
+        merge_vendors_ui(db_manager, st.session_state["selected_vendor_id"])
 
-    if edit_vendor_id is not None:
-        merge_vendor = st.toggle("Merge ")
+def merge_vendors_ui(db_manager, target_vendor_id):
+    target_row = db_manager.vendors.get_db_row(target_vendor_id)
+    if target_row is None:
+        return
+    target_name = target_row["name"]
 
-        if not merge_vendor:
-            st.markdown("### Rename Vendor")
-
-            new_vendor_name = st.text_input(
-                "Rename Vendor",
-                value=edit_vendor_name
-            )
-
-            if st.button("Rename"):
-                db_manager.vendors.rename_vendors(db_manager.db, edit_vendor_id, new_vendor_name)
-                st.toast(f"Renamed To {new_vendor_name}")
-        else:
-            st.markdown("### Merge into other vendor")
-
-            target_vendor = st.selectbox(
-                "Target Vendor",
-                options=db_manager.get_all_vendor_names(),
-                index=None,
-                key="target_vendor_input"
-            )
-
-            target_location = st.selectbox(
-                "Target Location",
-                options=db_manager.get_shop_locations(target_vendor),
-                accept_new_options=True,
-                index=None
-            )
-
-            target_vendor_id = db_manager.vendors.get_id_from_value("name", target_vendor)
+    container = st.container(border=True)
+    container.markdown("### Merge Vendors Into This One")
+    source_names = container.multiselect(
+        "Vendors to Merge",
+        options=[name for name in db_manager.get_all_vendor_names() if name != target_name],
+        key="merge_vendor_names_input"
+    )
+    target_location = container.selectbox(
+        "Set Their Transactions' Location",
+        options=db_manager.get_shop_locations(target_name),
+        accept_new_options=True,
+        index=None,
+        key="merge_target_location_input"
+    )
 
-            if st.button("Merge", disabled=(target_vendor_id is None)):
-                merge_vendors(db_manager, edit_vendor_id, target_vendor_id, target_location)
-                st.toast(f"Merged {edit_vendor_name} into {target_vendor}")
+    if container.button("Merge", disabled=(len(source_names) == 0), use_container_width=True):
+        source_ids = db_manager.vendors.db_data[
+            db_manager.vendors.db_data["name"].isin(source_names)
+        ]["vendor_id"]
+        db_manager.merge_vendors(source_ids, target_vendor_id, target_location)
+        st.toast(f"Merged {', '.join(source_names)} into {target_name}", icon="✔️")
+        st.rerun()
 
 
 def list_vendor_locations_ui(db_manager, adding_vendor):
@@ -255,11 +197,11 @@ def list_vendor_locations_ui(db_manager, adding_vendor):
 
 
 def edit_vendors_page_ui():
-    utils.block_if_no_auth()
+    st_utils.block_if_no_auth()
     st.set_page_config(page_title="Vendors - Money Thing", page_icon="📈", layout="wide")
     log("Loading page 2: Edit Vendors")
 
-    db_manager = DatabaseManager()
+    db_manager = DatabaseManager(st_utils.get_user_context())
 
     if "vendors_state" not in st.session_state:
         st.session_state["vendors_state"] = {
@@ -1,9 +1,11 @@
 import streamlit as st
 from src.db_manager import DatabaseManager
+import src.streamlit_utils as st_utils
+from src.authentication import set_tokens
 import random, datetime
 
 def voucher_shop_ui():
-    db_manager = DatabaseManager()
+    db_manager = DatabaseManager(st_utils.get_user_context())
 
     vendors = db_manager.get_all_vendor_names()
     if vendors == []:
@@ -50,10 +52,8 @@ def buy_voucher(i, db_manager):
     voucher = st.session_state["stored_vouchers"][i]
     current_tokens = st.session_state["current_user_tokens"]
     if current_tokens >= voucher["price"]:
-        db_manager.db.execute_sql(
-            f"UPDATE Users SET tokens={st.session_state["current_user_tokens"]} WHERE user_id={db_manager.db.user_id}"
-        )
         st.session_state["current_user_tokens"] -= voucher["price"]
+        set_tokens(db_manager.db.user_id, st.session_state["current_user_tokens"])
         del voucher["price"]
         voucher["expire_date"] = datetime.date.today()+datetime.timedelta(days=7)
         db_manager.db.create_row("Vouchers", voucher)
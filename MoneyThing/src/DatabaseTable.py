@@ -1,5 +1,6 @@
 import pandas as pd
 import src.utils as utils
+import src.tracing as tracing
 from src.logger import log
 
 class DatabaseTable:
@@ -33,28 +34,43 @@ class DatabaseTable:
             )
 
         self.created_ids = set()
-        self.db_data = self.update_foreign_data(self.db_data)
+        self.db_data = self.traced_update_foreign_data(self.db_data)
+
+    def traced_update_foreign_data(self, db_data):
+        with tracing.span(f"update_foreign_data {self.TABLE}"):
+            return self.update_foreign_data(db_data)
 
     def save_changes(self, updated_df, db):
+        with tracing.span(f"save_changes {self.TABLE}"):
+            return self._save_changes(updated_df, db)
+
+    def _save_changes(self, updated_df, db):
         updated_df = updated_df[self.COLUMNS]
         primary_key = self.COLUMNS[0]
         table_edited = False
-
-        for i, updated_row in updated_df.iterrows():
-            if utils.isNone(updated_row[primary_key]):
-                self.save_row_added(updated_row, db)
-                table_edited = True
-            elif updated_row[primary_key] in self.db_data[self.COLUMNS][primary_key].values:
-                table_edited = self.save_row_changes(
-                    self.get_db_row(updated_row[primary_key])[self.COLUMNS],
-                    updated_row,
-                    db
-                ) or table_edited
-
-        for i, original_row in self.db_data[self.COLUMNS].iterrows():
-            if original_row[primary_key] not in updated_df[primary_key].values:
-                self.save_row_remove(original_row[primary_key], db)
-                table_edited = True
+        original_rows = {
+            original_row[primary_key]: original_row
+            for i, original_row in self.db_data[self.COLUMNS].iterrows()
+        }
+        row_changes = []
+
+        with db.transaction():
+            for i, updated_row in updated_df.iterrows():
+                if utils.isNone(updated_row[primary_key]):
+                    self.save_row_added(updated_row, db)
+                    table_edited = True
+                elif updated_row[primary_key] in original_rows:
+                    changes = self.get_row_changes(original_rows[updated_row[primary_key]], updated_row)
+                    if changes is not None:
+                        row_changes.append((updated_row[primary_key], changes))
+                        table_edited = True
+            db.update_rows(self.TABLE, primary_key, row_changes)
+
+            updated_ids = set(updated_df[primary_key].values)
+            for original_id in original_rows:
+                if original_id not in updated_ids:
+                    self.save_row_remove(original_id, db)
+                    table_edited = True
 
         return table_edited
 
@@ -92,17 +108,14 @@ class DatabaseTable:
     def get_filtered_df(self, column, value):
         return utils.filter_df(self.db_data, column, value)
 
-    def save_row_changes(self, original_row, updated_row, db) -> bool:
-        if not DatabaseTable.row_equals(original_row, updated_row):
-            log(f"Updating Row on {self.TABLE} = {dict(original_row)} -> {dict(updated_row)}")
-            db.update_row(
-                self.TABLE,
-                utils.get_row_differences(original_row, updated_row),
-                self.COLUMNS[0],
-                updated_row[self.COLUMNS[0]]
-            )
-            return True
-        return False
+    def get_row_changes(self, original_row, updated_row) -> dict | None:
+        """
+        :return: the changed columns and their new values, None if the row is unchanged
+        """
+        if DatabaseTable.row_equals(original_row, updated_row):
+            return None
+        log(f"Updating Row on {self.TABLE} = {dict(original_row)} -> {dict(updated_row)}")
+        return utils.get_row_differences(original_row, updated_row)
 
     def list_all_in_column(self, column):
         return sorted(filter(
@@ -196,6 +209,6 @@ class DatabaseTable:
                     inner_join["right_on"]+"_y"
                 ]
 
-        return self.update_foreign_data(
+        return self.traced_update_foreign_data(
             renamed_df[self.COLUMNS],
         )
\ No newline at end of file
@@ -1,14 +1,20 @@
 import pandas as pd
 import math
 from src.logger import log
-import streamlit as st
 
 import src.utils as utils
 
 class AddingTransaction:
-    def __init__(self, db_manager):
-        if not "adding_spending_df" in st.session_state:
-            st.session_state["adding_spending_df"] = pd.DataFrame(
+    def __init__(self, db_manager, state=None):
+        """
+        :param state: dict the in progress transaction is kept in between calls,
+            the UI passes st.session_state so it survives reruns, imports use a fresh dict
+        """
+        if state is None:
+            state = {}
+        self.state = state
+        if not "adding_spending_df" in self.state:
+            self.state["adding_spending_df"] = pd.DataFrame(
                 columns=[
                     "temp_item_id",
                     "parent_product_id",
@@ -18,11 +24,11 @@ class AddingTransaction:
                     "num_purchased"
                 ]
             )
-        if not "adding_spending_display_df" in st.session_state:
-            st.session_state["adding_spending_display_df"] = None
+        if not "adding_spending_display_df" in self.state:
+            self.state["adding_spending_display_df"] = None
 
-        self.spending_df = st.session_state["adding_spending_df"]
-        self.display_df = st.session_state["adding_spending_display_df"]
+        self.spending_df = self.state["adding_spending_df"]
+        self.display_df = self.state["adding_spending_display_df"]
         self.db_manager = db_manager
 
         self.spending_time = None
@@ -79,8 +85,17 @@ class AddingTransaction:
             else:
                 self.money_store_id = filtered_money_stores.iloc[0]["money_store_id"]
 
-    def add_product(self, product_string, override_price=None):
+    def add_product(self, product_string, override_price=None, match_similar=False):
+        """
+        :param match_similar: when the string isn't an exact product label, fuzzy match it against
+            the vendor's product names before creating a new product, used for OCR'd receipt lines
+        """
         product_id = self.db_manager.products.get_product_id_from_product_string(product_string)
+        if product_id is None and match_similar:
+            vendor_id = self.db_manager.vendors.get_id_from_value("name", self.vendor_name)
+            product_id, score = self.db_manager.products.match_product(product_string, vendor_id)
+            if product_id is not None:
+                log(f"Matched receipt line {product_string} to product {product_id}, score {score:.2f}")
         if product_id is None:
             self.spending_df.loc[len(self.spending_df)] = {
                 "temp_item_id": self.generate_temp_item_id(),
@@ -99,7 +114,7 @@ class AddingTransaction:
                 "override_price": override_price,
                 "num_purchased": 1
             }
-        st.session_state["adding_spending_df"] = self.spending_df
+        self.state["adding_spending_df"] = self.spending_df
 
     def generate_temp_item_id(self):
         if len(self.spending_df)>0:
@@ -107,7 +122,7 @@ class AddingTransaction:
         return 0
 
     def refresh_display_df(self):
-        df = st.session_state["adding_spending_df"].merge(
+        df = self.state["adding_spending_df"].merge(
             self.db_manager.products.db_data,
             left_on="parent_product_id",
             right_on="product_id",
@@ -130,7 +145,7 @@ class AddingTransaction:
             lambda parent, new: parent if not utils.isNone(parent) else new
         )
         self.display_df = df[["ID", "Name", "Price Per", "Num Purchased"]]
-        st.session_state["adding_spending_display_df"] = self.display_df
+        self.state["adding_spending_display_df"] = self.display_df
 
     def to_display_df(self):
         if self.display_df is None:
@@ -227,7 +242,7 @@ class AddingTransaction:
             "category_id": self.category_id,
             "description": self.description
         }
-        transaction_id = st.session_state.get("editing_transaction_id", -1)
+        transaction_id = self.state.get("editing_transaction_id", -1)
         if transaction_id == -1:
             transaction_id = self.db_manager.db.create_row(
                 self.db_manager.transactions.TABLE,
@@ -265,9 +280,7 @@ class AddingTransaction:
             )
             self.spending_df.loc[i, "parent_product_id"] = product_id
             product_data["product_id"] = product_id
-            self.db_manager.products.db_data.loc[
-                len(self.db_manager.products.db_data)
-            ] = product_data
+            self.db_manager.products.add_product_row(product_data)
 
 
         ## Add to Spending Items
@@ -1,15 +1,14 @@
 import streamlit as st
 from src.sql_database import SQLDatabase
+from src.user_directory import get_user_directory
+import src.streamlit_utils as st_utils
 from src.logger import log
-import pandas as pd
-import bcrypt
-from src.backup_maker import make_backup
+import math
+from src.passwords import hash_password, check_password, needs_rehash, get_login_wait, record_login
 
 def st_auth_ui():
-    users_df = load_users()
-
     if st.session_state["authenticated"]:
-        logged_in_ui(users_df)
+        logged_in_ui()
         return
 
     _, middle, _ = st.columns([0.3,0.4,0.3])
@@ -20,14 +19,26 @@ def st_auth_ui():
     with middle.container(border=True):
         if st.session_state["auth_page"] == "login":
             if st.session_state["authenticated"]:
-                logged_in_ui(users_df)
+                logged_in_ui()
             else:
-                login_ui(users_df)
+                login_ui()
         else:
-            register_ui(users_df)
+            register_ui()
+
+def get_current_user() -> dict:
+    """
+    :return: the logged in user's row, a session whose user no longer exists (deleted, or moved while sharding)
+        is logged out and the page rerun
+    """
+    user_row = get_user_directory().get_user(st.session_state["current_user_id"])
+    if user_row is None:
+        log(f"Logging out a session for missing user {st.session_state['current_user_id']}", level="warning")
+        logout()
+        st.rerun()
+    return user_row
 
-def logged_in_ui(users_df):
-    user_row = users_df[users_df["user_id"] == st.session_state["current_user_id"]].iloc[0]
+def logged_in_ui():
+    user_row = get_current_user()
     st.markdown(f"# Hello {user_row['username']}!")
 
     vouchers_container = st.container(border=True)
@@ -35,7 +46,7 @@ def logged_in_ui(users_df):
     top_bar[0].markdown("## Vouchers")
     top_bar[1].markdown(f"### Tokens: 🪙{st.session_state.get('current_user_tokens', '?')}")
 
-    sql = SQLDatabase()
+    sql = SQLDatabase(st_utils.get_user_context())
     vouchers = sql.execute_sql("""
     SELECT *
     FROM Vouchers
@@ -76,17 +87,19 @@ def change_password_ui(user_row):
             st.rerun()
 
 @st.dialog("Change Username")
-def change_username_ui(user_row, used_usernames):
+def change_username_ui(user_row):
     new_username = st.text_input("New Username")
     if new_username != "":
-        if new_username.lower() in map(lambda name: name.lower(), used_usernames):
+        if get_user_directory().get_user_by_username(new_username) is not None:
             st.markdown("Username Already Used")
         elif st.button("Change Username"):
-            st.toast("Username Changed!", icon="✔️")
-            change_username(user_row["user_id"], new_username)
-            st.rerun()
+            if change_username(user_row["user_id"], new_username):
+                st.toast("Username Changed!", icon="✔️")
+                st.rerun()
+            else:
+                st.markdown("Username Already Used")
 
-def login_ui(users_df):
+def login_ui():
     left, right = st.columns([0.6, 0.4], vertical_alignment="center")
 
     left.markdown("### Login")
@@ -96,18 +109,22 @@ def login_ui(users_df):
     username = st.text_input("Username", key="login_username_input")
     password = st.text_input("Password", type="password", key="login_password_input")
     if st.button("Login", use_container_width=True):
-        user_id = login(users_df, username, password)
-        if user_id is None:
+        ip_address = st_utils.get_ip_address()
+        wait = get_login_wait(username, ip_address)
+        user_id = None if wait > 0 else login(username, password, ip_address)
+        if wait > 0:
+            st.toast(f"Too many failed logins, try again in {math.ceil(wait/60)} minutes", icon="⛔")
+        elif user_id is None:
             st.toast("Incorrect Username or password", icon="⛔")
         else:
             st.toast("Logged in successfully!", icon="✔️")
             log(f"Logging In with User ID: {user_id}")
             st.session_state["authenticated"] = True
             st.session_state["current_user_id"] = user_id
-            st.session_state["current_user_tokens"] = users_df[users_df["user_id"]==user_id].iloc[0]["tokens"]
+            st.session_state["current_user_tokens"] = get_user_directory().get_user(user_id)["tokens"]
             st.rerun()
 
-def register_ui(users_df):
+def register_ui():
     left, right = st.columns([0.6, 0.4], vertical_alignment="center")
 
     left.markdown("### Register")
@@ -122,87 +139,66 @@ def register_ui(users_df):
             st.toast("Passwords must be the same", icon="⛔")
         elif username is None or username == "":
             st.toast("Username must be at least 1 character", icon="⛔")
-        elif username.lower() in map(lambda string: string.lower(), users_df["username"].values):
+        elif get_user_directory().get_user_by_username(username) is not None:
+            st.toast("Username already in use, please choose another", icon="⛔")
+        elif register_user(username, password1) is None:
             st.toast("Username already in use, please choose another", icon="⛔")
         else:
-            register_user(username, password1)
             st.session_state["auth_page"] = "login"
             st.toast("Account Registered", icon="✔️")
             st.rerun()
 
-def load_users():
-    db = SQLDatabase()
-    db.create_tables()
-
-    cursor = db.execute_sql(
-        "SELECT * FROM Users",
-        do_log=False
-    )
-    users = cursor.fetchall()
-    users_df = pd.DataFrame(
-        users,
-        columns=[
-            "user_id",
-            "username",
-            "password_hash",
-            "tokens"
-        ]
-
-    )
-
-    return users_df
-
-def register_user(username, password):
-    db = SQLDatabase()
-    db.add_user(
+def register_user(username, password) -> int | None:
+    """
+    :return: the new user's id, None if the username is taken
+    """
+    return get_user_directory().add_user(
         username,
         hash_password(password)
     )
 
 def change_password(user_id, new_password):
-    db = SQLDatabase()
-    db.update_row(
-        "Users",
+    get_user_directory().update_user(
+        user_id,
         {
             "password_hash": hash_password(new_password)
-        },
-        "user_id",
-        user_id
+        }
     )
 
-def change_username(user_id, new_username):
-    db = SQLDatabase()
-    db.update_row(
-        "Users",
+def change_username(user_id, new_username) -> bool:
+    """
+    :return: False if the username is taken
+    """
+    return get_user_directory().update_user(
+        user_id,
         {
             "username": new_username
-        },
-        "user_id",
-        user_id
+        }
     )
 
-def hash_password(password):
-    password_hash = bcrypt.hashpw(
-        password.encode(),
-        bcrypt.gensalt()
-    ).decode()
-    return password_hash
-
-def check_password(password, password_hash):
-    return bcrypt.checkpw(
-        password.encode(),
-        password_hash.encode()
+def set_tokens(user_id, tokens):
+    get_user_directory().update_user(
+        user_id,
+        {
+            "tokens": int(tokens)
+        }
     )
 
-def login(user_df, username, password):
-    filtered_df = user_df[user_df["username"].str.lower() == username.lower()]
-    if len(filtered_df) == 0:
+def login(username, password, ip_address=None):
+    """
+    :return: the user's id, None if the login failed or is being throttled
+    """
+    if get_login_wait(username, ip_address) > 0:
+        return None
+    user = get_user_directory().get_user_by_username(username)
+    success = user is not None and check_password(password, user["password_hash"])
+    record_login(username, ip_address, success)
+    if not success:
         return None
-    row = filtered_df.iloc[0]
-    password_hash = row["password_hash"]
-    if check_password(password, password_hash):
-        return int(row["user_id"])
-    return None
+    if needs_rehash(user["password_hash"]):
+        log(f"Rehashing password for user {user['user_id']} at the current cost")
+        change_password(user["user_id"], password)
+    return int(user["user_id"])
 
 def logout():
     log("Logged Out")
@@ -1,19 +1,211 @@
-import shutil
+import sqlite3 as sql
 import datetime
-from pathlib import Path
+import gzip
 import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+import src.schema as schema
+from src.logger import log
+from src.user_context import UserContext, DATABASE_PATH
+
+BACKUP_DIR = "backups"
+BACKUP_PREFIX = "database-backup-"
+BACKUP_TIME_FORMAT = "%Y.%m.%d-%H.%M.%S"
+# pages copied per step of the backup api, writers can get the lock between steps
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.005
+BACKUP_INTERVAL_SECONDS = 60 * 60
+KEEP_HOURLY = 24
+KEEP_DAILY = 7
+KEEP_WEEKLY = 8
+
+_service_thread = None
+_service_lock = threading.Lock()
+
+
+def copy_database(source_path, target_path, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP):
+    """
+    consistent copy of a live database with sqlite's backup api, copying a few pages at a time
+    """
+    source = sql.connect(source_path)
+    target = sql.connect(target_path)
+    try:
+        with target:
+            source.backup(target, pages=pages, sleep=sleep)
+    finally:
+        target.close()
+        source.close()
+
+def make_backup(db_path=DATABASE_PATH, backup_dir=BACKUP_DIR, compress=False) -> Path:
+    backup_path = Path(backup_dir)
+    os.makedirs(backup_path, exist_ok=True)
+
+    today = datetime.datetime.today().strftime(BACKUP_TIME_FORMAT)
+    target = backup_path / f"{BACKUP_PREFIX}{today}.db"
+    if compress:
+        target = target.with_suffix(".db.gz")
+
+    # written under a temporary name so a half written backup is never picked up
+    temp_path = backup_path / f".{target.name}.tmp"
+    if compress:
+        copy_path = backup_path / f".{today}.db.tmp"
+        copy_database(db_path, copy_path)
+        with open(copy_path, "rb") as source, gzip.open(temp_path, "wb") as dest:
+            shutil.copyfileobj(source, dest)
+        os.remove(copy_path)
+    else:
+        copy_database(db_path, temp_path)
+    os.replace(temp_path, target)
+
+    log(f"Backed up {db_path} to {target}")
+    return target
+
+def get_backup_dirs(db_path=DATABASE_PATH, backup_dir=BACKUP_DIR) -> list[tuple[str, Path]]:
+    """
+    :return: (database file, its backup directory) for every file of the deployment,
+    each shard backs up into its own sub directory when sharded
+    """
+    context = UserContext(db_path=db_path)
+    if not context.sharded:
+        return [(db_path, Path(backup_dir))]
+    return [(path, Path(backup_dir) / Path(path).stem) for path in context.list_database_paths()]
+
+def backup_all(db_path=DATABASE_PATH, backup_dir=BACKUP_DIR, compress=False, retention=True) -> list[Path]:
+    """
+    backs up every file of the deployment, then applies retention to each backup directory
+    :return: the new backups
+    """
+    backups = []
+    for path, file_backup_dir in get_backup_dirs(db_path, backup_dir):
+        backups.append(make_backup(path, file_backup_dir, compress))
+        if retention:
+            apply_retention(file_backup_dir)
+    return backups
+
+
+def get_backup_time(path: Path) -> datetime.datetime | None:
+    name = path.name
+    if not name.startswith(BACKUP_PREFIX):
+        return None
+    stamp = name.removeprefix(BACKUP_PREFIX).split(".db", 1)[0]
+    try:
+        return datetime.datetime.strptime(stamp, BACKUP_TIME_FORMAT)
+    except ValueError:
+        return None
+
+def list_backups(backup_dir=BACKUP_DIR) -> list[tuple[datetime.datetime, Path]]:
+    """
+    :return: (backup time, path) newest first
+    """
+    backup_path = Path(backup_dir)
+    if not backup_path.is_dir():
+        return []
+    backups = []
+    for path in backup_path.iterdir():
+        backup_time = get_backup_time(path)
+        if backup_time is not None:
+            backups.append((backup_time, path))
+    return sorted(backups, reverse=True)
+
+def apply_retention(backup_dir=BACKUP_DIR, keep_hourly=KEEP_HOURLY, keep_daily=KEEP_DAILY,
+                    keep_weekly=KEEP_WEEKLY) -> list[Path]:
+    """
+    Keeps the newest backup from each of the latest keep_hourly hours, keep_daily days and keep_weekly weeks
+    that have backups, deletes the rest
+    :return: the deleted backups
+    """
+    bucket_rules = [
+        (keep_hourly, lambda t: t.strftime("%Y%m%d%H")),
+        (keep_daily, lambda t: t.strftime("%Y%m%d")),
+        (keep_weekly, lambda t: "%d-%02d" % t.isocalendar()[:2]),
+    ]
+    keep = set()
+    backups = list_backups(backup_dir)
+    for limit, get_bucket in bucket_rules:
+        seen_buckets = set()
+        for backup_time, path in backups:
+            bucket = get_bucket(backup_time)
+            if bucket in seen_buckets:
+                continue
+            if len(seen_buckets) >= limit:
+                break
+            seen_buckets.add(bucket)
+            keep.add(path)
+
+    deleted = []
+    for backup_time, path in backups:
+        if path not in keep:
+            os.remove(path)
+            deleted.append(path)
+    if len(deleted) > 0:
+        log(f"Removed {len(deleted)} old backups")
+    return deleted
+
+def restore_backup(backup_path, db_path=DATABASE_PATH):
+    """
+    Copies a backup over the database with the backup api, so open connections see the restored data
+    """
+    backup_path = Path(backup_path)
+    if backup_path.suffix == ".gz":
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_path = Path(temp_dir) / "restore.db"
+            with gzip.open(backup_path, "rb") as source, open(temp_path, "wb") as dest:
+                shutil.copyfileobj(source, dest)
+            copy_database(temp_path, db_path)
+    else:
+        copy_database(backup_path, db_path)
+    schema.forget_schema(db_path)
+    log(f"Restored {db_path} from {backup_path}", level="warning")
+
 
-def make_backup():
-    base_path = Path()
-    backups = Path("backups")
-    backup_path = base_path / backups
+def get_backup_delay(interval_seconds, db_path=DATABASE_PATH, backup_dir=BACKUP_DIR) -> float:
+    """
+    :return: seconds until every file's newest backup is interval_seconds old, 0 if one has none
+    """
+    now = datetime.datetime.now()
+    delay = interval_seconds
+    for path, file_backup_dir in get_backup_dirs(db_path, backup_dir):
+        backups = list_backups(file_backup_dir)
+        if len(backups) == 0:
+            return 0
+        newest_time, newest_path = backups[0]
+        delay = min(delay, interval_seconds - (now - newest_time).total_seconds())
+    return max(delay, 0)
 
-    if not os.path.exists(backup_path):
-        os.mkdir(backup_path)
+def run_backup_service(interval_seconds, db_path, backup_dir, compress, stop_event):
+    # a restarted server waits out the interval since the last backup, rather than backing up straight away
+    delay = get_backup_delay(interval_seconds, db_path, backup_dir)
+    if delay > 0:
+        log(f"Recent backup found, next background backup in {delay/60:.0f} minutes")
+    while not stop_event.wait(delay):
+        try:
+            backup_all(db_path, backup_dir, compress)
+        except Exception as e:
+            log(f"Background backup failed: {e}", level="exception")
+        delay = interval_seconds
 
-    today = datetime.datetime.today().strftime("%Y.%m.%d-%H.%M.%S")
+def start_backup_service(interval_seconds=BACKUP_INTERVAL_SECONDS, db_path=DATABASE_PATH,
+                         backup_dir=BACKUP_DIR, compress=True) -> threading.Event:
+    """
+    starts backing up in a daemon thread, once per process
+    :return: event that stops the service when set
+    """
+    global _service_thread
+    with _service_lock:
+        if _service_thread is None:
+            stop_event = threading.Event()
+            _service_thread = threading.Thread(
+                target=run_backup_service,
+                args=(interval_seconds, db_path, backup_dir, compress, stop_event),
+                name="backup-service",
+                daemon=True
+            )
+            _service_thread.stop_event = stop_event
+            _service_thread.start()
+        return _service_thread.stop_event
 
-    shutil.copy2("database.db", backup_path / f"database-backup-{today}.db")
 
 if __name__ == "__main__":
-    make_backup()
\ No newline at end of file
+    make_backup()
@@ -0,0 +1,238 @@
+import json
+from src.logger import log
+
+CHANGE_LOGGED_TABLES = [
+    "Products",
+    "Categories",
+    "Vendors",
+    "ShopLocations",
+    "Transactions",
+    "SpendingItems",
+    "MoneyStores",
+    "StoreSnapshots",
+    "InternalTransfers",
+    "Vouchers",
+    "Budgets",
+    "MetaData",
+    "Users",
+]
+# never copied into the change log
+UNLOGGED_COLUMNS = {
+    "Users": {"password_hash"},
+}
+TIMESTAMP_SQL = "strftime('%Y-%m-%dT%H:%M:%f', 'now')"
+
+
+def get_table_columns(cursor, table) -> tuple[str, list[str]]:
+    """
+    :return: (primary key column, other columns) read from the schema
+    """
+    table_info = cursor.execute(f"PRAGMA table_info({table});").fetchall()
+    primary_key = next(info[1] for info in table_info if info[5] == 1)
+    return primary_key, [info[1] for info in table_info if info[5] != 1]
+
+def get_user_id_sql(table, row) -> str:
+    if table in ("MetaData", "Users"):
+        return f"{row}.user_id"
+    return f"(SELECT user_id FROM MetaData WHERE meta_data_id = {row}.meta_data_id)"
+
+def create_change_log(cursor, tables=CHANGE_LOGGED_TABLES):
+    """
+    Creates the ChangeLog table and the triggers that fill it, generated from the current schema.
+    Triggers run inside the statement that fires them, so the log is always written in the same transaction.
+    One row is logged per changed column on update, and the whole row as json on delete.
+    :param tables: the tables in this database to log, a subset of CHANGE_LOGGED_TABLES
+    """
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ChangeLog(
+            change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT,
+            row_id INTEGER,
+            column_name TEXT,
+            old_value,
+            new_value,
+            operation TEXT,
+            changed_at TEXT,
+            user_id INTEGER
+        );
+        """
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_change_log_row ON ChangeLog(table_name, row_id);"
+    )
+    for table in tables:
+        primary_key, columns = get_table_columns(cursor, table)
+        columns = [column for column in columns if column not in UNLOGGED_COLUMNS.get(table, set())]
+        for column in columns:
+            cursor.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS change_log_{table}_{column}
+                AFTER UPDATE OF {column} ON {table}
+                WHEN OLD.{column} IS NOT NEW.{column}
+                BEGIN
+                    INSERT INTO ChangeLog
+                    (table_name, row_id, column_name, old_value, new_value, operation, changed_at, user_id)
+                    VALUES
+                    ('{table}', OLD.{primary_key}, '{column}', OLD.{column}, NEW.{column}, 'update',
+                     {TIMESTAMP_SQL}, {get_user_id_sql(table, "OLD")});
+                END;
+                """
+            )
+        row_json = ", ".join(f"'{column}', OLD.{column}" for column in [primary_key]+columns)
+        cursor.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS change_log_{table}_delete
+            AFTER DELETE ON {table}
+            BEGIN
+                INSERT INTO ChangeLog
+                (table_name, row_id, column_name, old_value, new_value, operation, changed_at, user_id)
+                VALUES
+                ('{table}', OLD.{primary_key}, NULL, json_object({row_json}), NULL, 'delete',
+                 {TIMESTAMP_SQL}, {get_user_id_sql(table, "OLD")});
+            END;
+            """
+        )
+
+
+def get_latest_change_id(db) -> int:
+    return db.execute_sql("SELECT COALESCE(MAX(change_id), 0) FROM ChangeLog;", do_log=False).fetchone()[0]
+
+def get_row_history(db, table, row_id) -> list[tuple]:
+    """
+    :return: (change_id, column_name, old_value, new_value, operation, changed_at, user_id) oldest first
+    """
+    return db.execute_sql(
+        """
+        SELECT change_id, column_name, old_value, new_value, operation, changed_at, user_id
+        FROM ChangeLog
+        WHERE table_name = ? AND row_id = ?
+        ORDER BY change_id;
+        """,
+        (table, row_id),
+        False
+    ).fetchall()
+
+def undo_changes(db, changes) -> int:
+    """
+    Reverts logged changes newest first, in one transaction.
+    The reverts are logged themselves, so an undo can be undone.
+    :param changes: (change_id, table_name, row_id, column_name, old_value, operation) rows
+    :return: number of changes reverted
+    """
+    schemas = {}
+    with db.transaction():
+        for change_id, table, row_id, column, old_value, operation in sorted(changes, reverse=True):
+            if table not in CHANGE_LOGGED_TABLES:
+                raise ValueError(f"Table {table} is not change logged")
+            if table not in schemas:
+                schemas[table] = get_table_columns(db.cursor, table)
+            primary_key, columns = schemas[table]
+
+            if operation == "update":
+                if column not in columns:
+                    raise ValueError(f"Unknown column {table}.{column}")
+                db.execute_sql(
+                    f"UPDATE {table} SET {column} = ? WHERE {primary_key} = ?;",
+                    (old_value, row_id)
+                )
+            elif operation == "delete":
+                row = {
+                    key: value for key, value in json.loads(old_value).items()
+                    if key == primary_key or key in columns
+                }
+                db.execute_sql(
+                    f"INSERT OR REPLACE INTO {table} ({', '.join(row.keys())}) VALUES ({', '.join('?'*len(row))});",
+                    tuple(row.values())
+                )
+    log(f"Reverted {len(changes)} logged changes")
+    return len(changes)
+
+def undo_after(db, change_id, table=None, user_id=None) -> int:
+    """
+    Reverts every change logged after change_id
+    :param table: only revert changes to this table
+    :param user_id: only revert changes to this user's rows
+    """
+    sql_statement = """
+        SELECT change_id, table_name, row_id, column_name, old_value, operation
+        FROM ChangeLog
+        WHERE change_id > ?
+    """
+    values = [change_id]
+    if table is not None:
+        sql_statement += " AND table_name = ?"
+        values.append(table)
+    if user_id is not None:
+        sql_statement += " AND user_id = ?"
+        values.append(user_id)
+    return undo_changes(db, db.execute_sql(sql_statement+";", tuple(values), False).fetchall())
+
+def undo_range(db, first_id, last_id) -> int:
+    """
+    Reverts the changes logged after first_id, up to and including last_id,
+    e.g. SQLDatabase.last_user_sql_change_range to roll back a bad run_user_sql statement
+    """
+    return undo_changes(db, db.execute_sql(
+        """
+        SELECT change_id, table_name, row_id, column_name, old_value, operation
+        FROM ChangeLog
+        WHERE change_id > ? AND change_id <= ?;
+        """,
+        (first_id, last_id),
+        False
+    ).fetchall())
+
+def restore_row(db, table, row_id, change_id) -> int:
+    """
+    Puts a row, and its MetaData row (so soft deletes are undone too), back to how they were at change_id
+    """
+    primary_key, columns = get_table_columns(db.cursor, table)
+    changes = db.execute_sql(
+        """
+        SELECT change_id, table_name, row_id, column_name, old_value, operation
+        FROM ChangeLog
+        WHERE change_id > ? AND table_name = ? AND row_id = ?;
+        """,
+        (change_id, table, row_id),
+        False
+    ).fetchall()
+    if "meta_data_id" in columns:
+        meta_data_id = db.execute_sql(
+            f"SELECT meta_data_id FROM {table} WHERE {primary_key} = ?;", (row_id, ), False
+        ).fetchone()
+        if meta_data_id is not None:
+            changes += db.execute_sql(
+                """
+                SELECT change_id, table_name, row_id, column_name, old_value, operation
+                FROM ChangeLog
+                WHERE change_id > ? AND table_name = 'MetaData' AND row_id = ?;
+                """,
+                (change_id, meta_data_id[0]),
+                False
+            ).fetchall()
+    return undo_changes(db, changes)
+
+def restore_transaction(db, transaction_id, change_id) -> int:
+    """
+    restore_row for a transaction and every spending item that has belonged to it
+    """
+    spending_item_ids = db.execute_sql(
+        """
+        SELECT spending_item_id FROM SpendingItems WHERE transaction_id = ?
+        UNION
+        SELECT row_id FROM ChangeLog
+        WHERE table_name = 'SpendingItems' AND column_name = 'transaction_id' AND old_value = ?
+        UNION
+        SELECT row_id FROM ChangeLog
+        WHERE table_name = 'SpendingItems' AND operation = 'delete'
+        AND json_extract(old_value, '$.transaction_id') = ?;
+        """,
+        (transaction_id, transaction_id, transaction_id),
+        False
+    ).fetchall()
+    with db.transaction():
+        num_changes = restore_row(db, "Transactions", transaction_id, change_id)
+        for (spending_item_id, ) in spending_item_ids:
+            num_changes += restore_row(db, "SpendingItems", spending_item_id, change_id)
+    return num_changes
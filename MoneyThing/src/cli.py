@@ -0,0 +1,263 @@
+import argparse
+import importlib.util
+import os
+import sys
+from pathlib import Path
+from src.user_context import UserContext, DATABASE_PATH
+from src.sql_database import SQLDatabase
+from src.db_manager import DatabaseManager
+from src.user_directory import get_user_directory
+from src.backup_maker import make_backup, apply_retention, restore_backup, get_backup_dirs
+import src.change_log as change_log
+import src.compaction as compaction
+import src.sharding as sharding
+
+STATEMENT_EXTENSIONS = {".pdf"}
+RECEIPT_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp"}
+EXPORT_TABLES = [
+    "money_stores",
+    "store_snapshots",
+    "internal_transfers",
+    "vendors",
+    "shop_locations",
+    "categories",
+    "products",
+    "transactions",
+    "spending_items"
+]
+
+
+def report(message):
+    print(message, file=sys.stderr, flush=True)
+
+def make_progress_reporter(action, noun):
+    def progress_callback(num_done, total):
+        report(f"{action} {num_done}/{total} {noun}")
+    return progress_callback
+
+def list_files(directory, extensions) -> list[Path]:
+    directory = Path(directory)
+    if not directory.is_dir():
+        raise SystemExit(f"Not a directory: {directory}")
+    return sorted(
+        path for path in directory.iterdir()
+        if path.is_file() and path.suffix.lower() in extensions
+    )
+
+def resolve_user_id(db_path, user) -> int:
+    """
+    :param user: a user id, or a username (case insensitive)
+    """
+    if user is None:
+        raise SystemExit("This command needs --user")
+    if str(user).isdigit():
+        return int(user)
+    user_row = get_user_directory(UserContext(db_path=db_path)).get_user_by_username(user)
+    if user_row is None:
+        raise SystemExit(f"Unknown user: {user}")
+    return user_row["user_id"]
+
+def get_db_manager(args) -> DatabaseManager:
+    return DatabaseManager(UserContext(resolve_user_id(args.db, args.user), args.db))
+
+def get_database(args) -> SQLDatabase:
+    """
+    the --user's database, the user's shard when sharded, or without --user the shared or auth database
+    """
+    user_id = None if args.user is None else resolve_user_id(args.db, args.user)
+    return SQLDatabase(UserContext(user_id, args.db))
+
+def list_database_files(args) -> list[str]:
+    """
+    the files a maintenance command acts on, when sharded the --user's shard, or every shard and the auth database
+    """
+    context = UserContext(db_path=args.db)
+    if context.sharded and args.user is not None:
+        return [context.get_shard_path(resolve_user_id(args.db, args.user))]
+    return context.list_database_paths()
+
+def open_database_file(path) -> SQLDatabase:
+    return SQLDatabase(UserContext(db_path=path, sharded=False))
+
+
+def import_statements_command(args):
+    from src.pdf_reader import parse_statements, store_transactions_df, store_snapshot
+
+    files = list_files(args.directory, STATEMENT_EXTENSIONS)
+    report(f"Found {len(files)} statements in {args.directory}")
+    db_manager = get_db_manager(args)
+    parsed = parse_statements(files, make_progress_reporter("Parsed", "statements"), args.workers)
+
+    total_rows = 0
+    for i, (file, (transactions_df, snapshot_info)) in enumerate(zip(files, parsed), 1):
+        with db_manager.db.transaction():
+            num_rows = store_transactions_df(transactions_df, None, db_manager, args.money_store)
+            if snapshot_info is not None:
+                store_snapshot(snapshot_info, db_manager, args.money_store)
+        total_rows += num_rows
+        report(f"Stored {i}/{len(files)} statements: {file.name} ({num_rows} new transactions)")
+    report(f"Imported {total_rows} transactions")
+
+def import_receipts_command(args):
+    from src.receipt_reader import read_receipts, store_receipts, get_file_name
+
+    files = list_files(args.directory, RECEIPT_EXTENSIONS)
+    report(f"Found {len(files)} receipts in {args.directory}")
+    db_manager = get_db_manager(args)
+    parsed_receipts, errors = read_receipts(files, make_progress_reporter("Read", "receipts"), args.workers)
+
+    def report_stored(file, transaction_id):
+        report(f"Stored receipt {get_file_name(file)} (transaction {transaction_id})")
+
+    num_stored = len(store_receipts(parsed_receipts, db_manager, args.money_store, errors, report_stored))
+
+    for file_name, error in errors.items():
+        report(f"Failed {file_name}: {error}")
+    report(f"Imported {num_stored} receipts, {len(errors)} failed")
+    if len(errors) > 0:
+        raise SystemExit(1)
+
+def export_command(args):
+    if args.format == "parquet":
+        if importlib.util.find_spec("pyarrow") is None:
+            raise SystemExit("Parquet export needs pyarrow, install it or use --format csv")
+
+    db_manager = get_db_manager(args)
+    output_dir = Path(args.output)
+    os.makedirs(output_dir, exist_ok=True)
+    for table_name in EXPORT_TABLES:
+        table = getattr(db_manager, table_name)
+        df = table.db_data[table.COLUMNS]
+        path = output_dir / f"{table.TABLE}.{args.format}"
+        if args.format == "parquet":
+            df.to_parquet(path, index=False)
+        else:
+            df.to_csv(path, index=False)
+        report(f"Exported {len(df)} rows to {path}")
+
+def vacuum_command(args):
+    for path in list_database_files(args):
+        size_before = os.path.getsize(path)
+        db = open_database_file(path)
+        db.execute_sql("VACUUM;")
+        db.execute_sql("ANALYZE;")
+        report(f"Vacuumed {path}: {size_before/1024:.0f}KB -> {os.path.getsize(path)/1024:.0f}KB")
+
+def compact_command(args):
+    for path in list_database_files(args):
+        if path == UserContext(db_path=args.db).get_auth_path():
+            continue
+        size_before = os.path.getsize(path)
+        removed = compaction.compact(open_database_file(path), args.archive, args.days)
+        for table, num_rows in removed.items():
+            if num_rows > 0:
+                report(f"Removed {num_rows} rows from {table}")
+        report(f"Compacted {path}: {size_before/1024:.0f}KB -> {os.path.getsize(path)/1024:.0f}KB")
+
+def backup_command(args):
+    for path, backup_dir in get_backup_dirs(args.db, args.backup_dir):
+        backup_path = make_backup(path, backup_dir, args.compress)
+        report(f"Backed up {path} to {backup_path}")
+        if not args.keep_all:
+            deleted = apply_retention(backup_dir)
+            report(f"Removed {len(deleted)} old backups")
+
+def restore_command(args):
+    if not Path(args.backup).is_file():
+        raise SystemExit(f"No backup at {args.backup}")
+    db_path = get_database(args).context.get_database_path()
+    # the current state is backed up first, so a restore can itself be undone
+    backup_dir = dict(get_backup_dirs(args.db, args.backup_dir)).get(db_path, args.backup_dir)
+    path = make_backup(db_path, backup_dir, compress=True)
+    report(f"Saved current database to {path}")
+    restore_backup(args.backup, db_path)
+    report(f"Restored {db_path} from {args.backup}")
+
+def shard_command(args):
+    copied = sharding.split_database(args.db, args.output)
+    for user_id, num_rows in copied.items():
+        report(f"Copied {num_rows} rows " + ("of users" if user_id == 0 else f"for user {user_id}"))
+    report("Set MONEYTHING_STORAGE=sharded to use the split databases")
+
+def history_command(args):
+    db = get_database(args)
+    for change_id, column, old_value, new_value, operation, changed_at, user_id in change_log.get_row_history(
+            db, args.table, args.row_id):
+        if operation == "delete":
+            report(f"{change_id} {changed_at} user {user_id}: deleted {old_value}")
+        else:
+            report(f"{change_id} {changed_at} user {user_id}: {column} {old_value!r} -> {new_value!r}")
+
+def undo_command(args):
+    db = get_database(args)
+    if args.transaction is not None:
+        num_changes = change_log.restore_transaction(db, args.transaction, args.after)
+    else:
+        num_changes = change_log.undo_after(db, args.after, args.table, db.user_id)
+    report(f"Reverted {num_changes} changes made after change {args.after}")
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="moneything", description="Money Thing batch tools")
+    parser.add_argument("--db", default=DATABASE_PATH, help="database file (default: %(default)s)")
+    parser.add_argument("--user", help="user id or username the command acts for")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    statements = commands.add_parser("import-statements", help="import every pdf bank statement in a directory")
+    statements.add_argument("directory")
+    statements.add_argument("--money-store", help="money store the statements belong to")
+    statements.add_argument("--workers", type=int, help="parser processes (default: cpu count)")
+    statements.set_defaults(func=import_statements_command)
+
+    receipts = commands.add_parser("import-receipts", help="import every receipt image in a directory")
+    receipts.add_argument("directory")
+    receipts.add_argument("--money-store", help="money store the receipts were paid from")
+    receipts.add_argument("--workers", type=int, help="OCR threads (default: cpu count)")
+    receipts.set_defaults(func=import_receipts_command)
+
+    export = commands.add_parser("export", help="export the user's tables")
+    export.add_argument("--format", choices=["parquet", "csv"], default="csv")
+    export.add_argument("--output", default="export", help="output directory (default: %(default)s)")
+    export.set_defaults(func=export_command)
+
+    vacuum = commands.add_parser("vacuum", help="rebuild the database file and refresh query planner stats")
+    vacuum.set_defaults(func=vacuum_command)
+
+    compact = commands.add_parser("compact", help="archive long deleted rows, drop orphaned meta data, then vacuum")
+    compact.add_argument("--days", type=int, default=compaction.ARCHIVE_AFTER_DAYS,
+                         help="archive rows deleted more than this many days ago (default: %(default)s)")
+    compact.add_argument("--archive", default=compaction.ARCHIVE_PATH,
+                         help="archive database file (default: %(default)s)")
+    compact.set_defaults(func=compact_command)
+
+    backup = commands.add_parser("backup", help="copy the database into the backups directory")
+    backup.add_argument("--backup-dir", default="backups")
+    backup.add_argument("--compress", action="store_true", help="gzip the backup")
+    backup.add_argument("--keep-all", action="store_true", help="skip the hourly/daily/weekly retention")
+    backup.set_defaults(func=backup_command)
+
+    restore = commands.add_parser("restore", help="replace the database with a backup")
+    restore.add_argument("backup", help="backup file, .db or .db.gz")
+    restore.add_argument("--backup-dir", default="backups")
+    restore.set_defaults(func=restore_command)
+
+    shard = commands.add_parser("shard", help="split the shared database into an auth database and a file per user")
+    shard.add_argument("--output", help="path the split databases are put next to (default: --db)")
+    shard.set_defaults(func=shard_command)
+
+    history = commands.add_parser("history", help="list the logged changes to a row")
+    history.add_argument("table")
+    history.add_argument("row_id", type=int)
+    history.set_defaults(func=history_command)
+
+    undo = commands.add_parser("undo", help="revert logged changes made after a change id")
+    undo.add_argument("--after", type=int, required=True, help="last change id to keep")
+    undo.add_argument("--table", help="only revert changes to this table")
+    undo.add_argument("--transaction", type=int, help="only restore this transaction and its spending items")
+    undo.set_defaults(func=undo_command)
+
+    return parser
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    args.func(args)
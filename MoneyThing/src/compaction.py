@@ -0,0 +1,133 @@
+import datetime
+import src.change_log as change_log
+from src.logger import log
+
+ARCHIVE_PATH = "archive.db"
+ARCHIVE_AFTER_DAYS = 30
+# orphans younger than this may belong to a create_row that is still running on another connection
+ORPHAN_GRACE = datetime.timedelta(hours=1)
+
+
+def get_meta_data_tables(db) -> list[str]:
+    """
+    :return: every table whose rows own a MetaData row
+    """
+    tables = db.execute_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%';", do_log=False
+    ).fetchall()
+    return [
+        table for (table, ) in tables
+        if table != "MetaData" and "meta_data_id" in change_log.get_table_columns(db.cursor, table)[1]
+    ]
+
+def create_archive_table(db, table) -> list[str]:
+    """
+    Makes archive.table match the live table's columns, adding any added to the live table since
+    :return: the live table's columns
+    """
+    primary_key, columns = change_log.get_table_columns(db.cursor, table)
+    columns = [primary_key] + columns
+    db.cursor.execute(f"CREATE TABLE IF NOT EXISTS archive.{table} AS SELECT * FROM main.{table} WHERE 0;")
+    archived_columns = [info[1] for info in db.cursor.execute(f"PRAGMA archive.table_info({table});")]
+    for column in columns:
+        if column not in archived_columns:
+            db.cursor.execute(f"ALTER TABLE archive.{table} ADD COLUMN {column};")
+    return columns
+
+def archive_deleted_rows(db, archive_path=ARCHIVE_PATH, older_than_days=ARCHIVE_AFTER_DAYS) -> dict:
+    """
+    Moves rows soft deleted more than older_than_days ago, and their MetaData rows, into the archive database,
+    and drops orphaned MetaData rows. Everything is moved in one transaction.
+    Archived transactions keep their fingerprints in ArchivedFingerprints, so they aren't imported again.
+    The deletes are left out of the ChangeLog, the archive holds the rows instead.
+    :return: number of rows removed from each table
+    """
+    now = datetime.datetime.now()
+    cutoff = (now - datetime.timedelta(days=older_than_days)).isoformat()
+    orphan_cutoff = (now - ORPHAN_GRACE).isoformat()
+    tables = get_meta_data_tables(db)
+    removed = {}
+
+    db.cursor.execute("ATTACH DATABASE ? AS archive;", (str(archive_path), ))
+    try:
+        # immediate, so no other connection can log a change between reading change_id and the ChangeLog delete
+        with db.transaction(immediate=True):
+            change_id = change_log.get_latest_change_id(db)
+            db.execute_sql(
+                """
+                CREATE TEMP TABLE IF NOT EXISTS ArchivedMetaData(meta_data_id INTEGER PRIMARY KEY);
+                """,
+                do_log=False
+            )
+            db.execute_sql("DELETE FROM temp.ArchivedMetaData;", do_log=False)
+            # deleted when the ChangeLog last logged row_deleted changing, in utc like every ChangeLog time,
+            # edited_timestamp is only used for rows deleted before the ChangeLog existed, see schema migration 3
+            db.execute_sql(
+                f"""
+                INSERT INTO temp.ArchivedMetaData
+                SELECT meta_data_id FROM main.MetaData
+                WHERE row_deleted = 1 AND COALESCE(
+                    (
+                        SELECT MAX(changed_at) FROM main.ChangeLog
+                        WHERE table_name = 'MetaData' AND row_id = MetaData.meta_data_id
+                        AND column_name = 'row_deleted'
+                    ) < strftime('%Y-%m-%dT%H:%M:%f', 'now', ?),
+                    edited_timestamp < ?
+                );
+                """,
+                (f"-{int(older_than_days)} days", cutoff)
+            )
+            db.execute_sql(
+                """
+                INSERT OR IGNORE INTO main.ArchivedFingerprints (fingerprint, user_id)
+                SELECT Transactions.fingerprint, MetaData.user_id
+                FROM main.Transactions
+                JOIN main.MetaData ON Transactions.meta_data_id = MetaData.meta_data_id
+                WHERE Transactions.fingerprint IS NOT NULL
+                AND Transactions.meta_data_id IN (SELECT meta_data_id FROM temp.ArchivedMetaData);
+                """
+            )
+
+            for table in tables + ["MetaData"]:
+                columns = ", ".join(create_archive_table(db, table))
+                db.execute_sql(
+                    f"""
+                    INSERT INTO archive.{table} ({columns})
+                    SELECT {columns} FROM main.{table}
+                    WHERE meta_data_id IN (SELECT meta_data_id FROM temp.ArchivedMetaData);
+                    """
+                )
+                removed[table] = db.execute_sql(
+                    f"""
+                    DELETE FROM main.{table}
+                    WHERE meta_data_id IN (SELECT meta_data_id FROM temp.ArchivedMetaData);
+                    """
+                ).rowcount
+
+            removed["orphaned MetaData"] = db.execute_sql(
+                f"""
+                DELETE FROM main.MetaData
+                WHERE created_timestamp < ?
+                {"".join(
+                    f"AND NOT EXISTS (SELECT 1 FROM main.{table} WHERE {table}.meta_data_id = MetaData.meta_data_id) "
+                    for table in tables
+                )};
+                """,
+                (orphan_cutoff, )
+            ).rowcount
+            db.execute_sql("DELETE FROM main.ChangeLog WHERE change_id > ?;", (change_id, ))
+            db.execute_sql("DROP TABLE temp.ArchivedMetaData;", do_log=False)
+    finally:
+        db.cursor.execute("DETACH DATABASE archive;")
+
+    log(f"Archived soft deleted rows to {archive_path}:", removed)
+    return removed
+
+def compact(db, archive_path=ARCHIVE_PATH, older_than_days=ARCHIVE_AFTER_DAYS) -> dict:
+    """
+    archive_deleted_rows, then rebuilds the file and refreshes the query planner's stats
+    """
+    removed = archive_deleted_rows(db, archive_path, older_than_days)
+    db.execute_sql("VACUUM;")
+    db.execute_sql("ANALYZE;")
+    return removed
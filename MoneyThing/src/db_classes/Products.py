@@ -1,5 +1,6 @@
 from src.DatabaseTable import DatabaseTable
 import src.utils as utils
+from src.product_matcher import ProductMatcher
 
 class Products(DatabaseTable):
     TABLE = "Products"
@@ -26,6 +27,8 @@ class Products(DatabaseTable):
             (vendors, "vendor_id", "name", "shop_name")
         )
         super().__init__(select_call, self.COLUMNS)
+        self.product_string_ids = None
+        self.matcher = None
 
     def list_products_from_shop(self, shop_name):
         return sorted([
@@ -38,10 +41,41 @@ class Products(DatabaseTable):
         return f"{row['name']} - £{row['price']:.2f}"
 
     def get_product_id_from_product_string(self, string):
-        for i, row in self.db_data.iterrows():
-            if self.get_product_string(row) == string:
-                return row["product_id"]
-        return None
+        if self.product_string_ids is None:
+            self.product_string_ids = {}
+            for i, row in self.db_data.iterrows():
+                if not utils.isNone(row["name"]) and not utils.isNone(row["price"]):
+                    self.product_string_ids.setdefault(self.get_product_string(row), row["product_id"])
+        return self.product_string_ids.get(string, None)
+
+    def save_changes(self, updated_df, db):
+        table_edited = super().save_changes(updated_df, db)
+        # edited names and prices would otherwise still be matched by their old values
+        self.product_string_ids = None
+        self.matcher = None
+        return table_edited
+
+    def get_matcher(self) -> ProductMatcher:
+        if self.matcher is None:
+            self.matcher = ProductMatcher().build(self.db_data)
+        return self.matcher
+
+    def match_product(self, name, vendor_id=None):
+        """
+        fuzzy matches a product name, e.g. an OCR'd receipt line, against the vendor's products
+        :return: (product id or None, match score)
+        """
+        return self.get_matcher().match(name, vendor_id)
+
+    def add_product_row(self, product_data: dict):
+        """
+        appends a newly created product to db_data, keeping the lookup indexes in sync
+        """
+        self.db_data.loc[len(self.db_data)] = product_data
+        if self.product_string_ids is not None and not utils.isNone(product_data.get("price")):
+            self.product_string_ids.setdefault(self.get_product_string(product_data), product_data["product_id"])
+        if self.matcher is not None:
+            self.matcher.add(product_data["product_id"], product_data["name"], product_data.get("vendor_id"))
 
     def to_display_df(self):
         return super().to_display_df(
@@ -26,7 +26,7 @@ class SpendingItems(DatabaseTable):
             (products, "product_id", "name", "product_name")
         )
         super().__init__(select_call, self.COLUMNS)
-        self.db_data = self.update_foreign_data(self.db_data)
+        self.db_data = self.traced_update_foreign_data(self.db_data)
 
     def update_foreign_data(self, db_data):
         db_data = super().update_foreign_data(db_data)
@@ -37,6 +37,12 @@ class SpendingItems(DatabaseTable):
 
         return utils.force_int_ids(db_data)
 
+    def get_transaction_totals(self):
+        """
+        :return: series of summed display_price, indexed by transaction_id
+        """
+        return self.db_data.groupby("transaction_id")["display_price"].sum()
+
     def from_display_df(self, display_df):
         display_df["override_price"] = display_df["Spent"].combine(
             display_df["Base Price"],
@@ -1,6 +1,7 @@
 from src.DatabaseTable import DatabaseTable
 import src.utils as utils
 import pandas as pd
+import hashlib
 
 class Transactions(DatabaseTable):
     TABLE = "Transactions"
@@ -45,3 +46,56 @@ class Transactions(DatabaseTable):
         renamed_df["time"] = renamed_df["time"].apply(utils.conform_time_string)
 
         return renamed_df
+
+    @staticmethod
+    def make_fingerprints(df, user_id) -> pd.Series:
+        """
+        content hash of each row, stored on imported transactions so re-imports can be skipped
+        identical rows within df are told apart by how many times they have already appeared
+
+        :param df: columns date, vendor_name, description, override_money, is_income, money_store_id
+        :return: series of hex digests aligned with df
+        """
+        if len(df) == 0:
+            return pd.Series(index=df.index, dtype=object)
+
+        def clean(value):
+            return "" if utils.isNone(value) else str(value)
+
+        parts = pd.DataFrame({
+            "date": df["date"].map(clean),
+            "vendor_name": df["vendor_name"].map(clean),
+            "description": df["description"].map(clean),
+            "override_money": df["override_money"].map(
+                lambda value: "" if utils.isNone(value) else f"{float(value):.2f}"),
+            "is_income": df["is_income"].map(
+                lambda value: "" if utils.isNone(value) else str(int(bool(value)))),
+            "money_store_id": df["money_store_id"].map(
+                lambda value: "" if utils.isNone(value) else str(int(value))),
+        }, index=df.index)
+        occurrence = parts.groupby(list(parts.columns)).cumcount().astype(str)
+        keys = str(user_id) + "|" + parts.agg("|".join, axis=1) + "|" + occurrence
+
+        return keys.map(lambda key: hashlib.sha1(key.encode()).hexdigest())
+
+    def get_known_fingerprints(self, db) -> set[str]:
+        """
+        fingerprints of every imported row, including deleted ones as the unique index still holds them
+        and archived ones from ArchivedFingerprints, plus fingerprints of rows stored before fingerprints existed
+        """
+        stored = db.execute_sql(
+            f"""
+            SELECT {self.TABLE}.fingerprint
+            FROM {self.TABLE}
+            JOIN MetaData ON {self.TABLE}.meta_data_id = MetaData.meta_data_id
+            WHERE MetaData.user_id = ? AND {self.TABLE}.fingerprint IS NOT NULL
+            UNION
+            SELECT fingerprint FROM ArchivedFingerprints
+            WHERE user_id = ?;
+            """,
+            (db.user_id, db.user_id),
+            False
+        ).fetchall()
+        known = {row[0] for row in stored}
+        known.update(self.make_fingerprints(self.db_data, db.user_id))
+        return known
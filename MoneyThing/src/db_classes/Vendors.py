@@ -1,3 +1,4 @@
+import pandas as pd
 from src.DatabaseTable import DatabaseTable
 import src.utils as utils
 
@@ -35,4 +36,26 @@ class Vendors(DatabaseTable):
                 {"name": new_name},
                 "vendor_id",
                 current_id
-            )
\ No newline at end of file
+            )
+
+    def get_or_create_ids(self, db, names) -> dict:
+        """
+        :return: map of vendor name to vendor_id, creating any vendors that don't exist yet
+        """
+        vendor_ids = {}
+        for name, vendor_id in zip(self.db_data["name"], self.db_data["vendor_id"]):
+            if not utils.isNone(name) and name not in vendor_ids:
+                vendor_ids[name] = vendor_id
+
+        new_rows = []
+        for name in set(names):
+            if utils.isNone(name) or name in vendor_ids:
+                continue
+            vendor_ids[name] = db.create_row(self.TABLE, {"name": name})
+            new_rows.append({
+                "vendor_id": vendor_ids[name],
+                "name": name
+            })
+        if len(new_rows) > 0:
+            self.db_data = pd.concat([self.db_data, pd.DataFrame(new_rows)], ignore_index=True)
+        return vendor_ids
@@ -1,4 +1,9 @@
+import datetime
+import json
 from src.sql_database import SQLDatabase
+from src.user_context import UserContext
+import src.tracing as tracing
+from src.logger import log
 
 from src.db_classes.Categories import Categories
 from src.db_classes.Products import Products
@@ -12,24 +17,143 @@ from src.db_classes.InternalTransfers import InternalTransfers
 
 
 class DatabaseManager:
-    def __init__(self):
-        self.db = SQLDatabase()
-        self.db.create_tables()
-
-
-        self.money_stores = self.db.load_table(MoneyStores)
-        self.store_snapshots = self.db.load_table(StoreSnapshots, self.money_stores)
-        self.internal_transfers = self.db.load_table(InternalTransfers, self.money_stores)
-        self.vendors = self.db.load_table(Vendors)
-        self.shop_locations = self.db.load_table(ShopLocations, self.vendors)
-        self.categories = self.db.load_table(Categories)
-        self.products = self.db.load_table(Products, self.vendors, self.categories)
-        self.transactions = self.db.load_table(Transactions,
-            self.money_stores, self.vendors, self.shop_locations, self.categories)
-        self.spending_items = self.db.load_table(SpendingItems, self.products)
+    # (attribute, table class, attributes it joins foreign data from), in load order
+    TABLES = [
+        ("money_stores", MoneyStores, []),
+        ("store_snapshots", StoreSnapshots, ["money_stores"]),
+        ("internal_transfers", InternalTransfers, ["money_stores"]),
+        ("vendors", Vendors, []),
+        ("shop_locations", ShopLocations, ["vendors"]),
+        ("categories", Categories, []),
+        ("products", Products, ["vendors", "categories"]),
+        ("transactions", Transactions, ["money_stores", "vendors", "shop_locations", "categories"]),
+        ("spending_items", SpendingItems, ["products"]),
+    ]
+
+    @tracing.traced("DatabaseManager.__init__")
+    def __init__(self, context: UserContext | None = None):
+        self.context = context
+        self.db = SQLDatabase(context)
+
+        for name, table_class, dependencies in self.TABLES:
+            setattr(self, name, self.db.load_table(table_class, *[getattr(self, d) for d in dependencies]))
 
     def reconnect_db(self):
-        self.db = SQLDatabase()
+        self.db = SQLDatabase(self.context)
+
+    @tracing.traced("DatabaseManager.reload_tables")
+    def reload_tables(self, *names) -> list[str]:
+        """
+        Reloads the named tables, and every table joining foreign data from one that was reloaded
+        :param names: attributes, e.g. "vendors"
+        :return: the reloaded attributes
+        """
+        reloaded = []
+        for name, table_class, dependencies in self.TABLES:
+            if name in names or any(dependency in reloaded for dependency in dependencies):
+                setattr(self, name, self.db.load_table(table_class, *[getattr(self, d) for d in dependencies]))
+                reloaded.append(name)
+        return reloaded
+
+    def merge_vendors(self, source_vendor_ids, target_vendor_id, target_location=None) -> dict:
+        """
+        Merges vendors into one in a single transaction: their transactions, products and shop locations
+        are moved to the target, it takes any default category or location it lacks, then they are deleted
+        :param source_vendor_ids: the vendors to merge away
+        :param target_location: shop location name every moved transaction is set to, created if needed
+        :return: number of rows moved per table
+        """
+        source_ids = [int(id_) for id_ in source_vendor_ids if int(id_) != int(target_vendor_id)]
+        if len(source_ids) == 0:
+            return {}
+        target_vendor_id = int(target_vendor_id)
+        sources = json.dumps(source_ids)
+        user_rows = "meta_data_id IN (SELECT meta_data_id FROM MetaData WHERE user_id = ? AND row_deleted = 0)"
+        source_rows = f"vendor_id IN (SELECT value FROM json_each(?)) AND {user_rows}"
+        now = datetime.datetime.now().isoformat()
+        moved = {}
+
+        with self.db.transaction():
+            target_location_id = None
+            if target_location is not None:
+                row = self.db.execute_sql(
+                    f"""
+                    SELECT shop_location_id FROM ShopLocations
+                    WHERE shop_location = ? AND (vendor_id = ? OR vendor_id IN (SELECT value FROM json_each(?)))
+                    AND {user_rows}
+                    ORDER BY vendor_id = ? DESC
+                    LIMIT 1;
+                    """,
+                    (target_location, target_vendor_id, sources, self.db.user_id, target_vendor_id)
+                ).fetchone()
+                if row is None:
+                    target_location_id = self.db.create_row(
+                        "ShopLocations", {"shop_location": target_location, "vendor_id": target_vendor_id}
+                    )
+                else:
+                    target_location_id = row[0]
+
+            self.db.execute_sql(
+                f"""
+                UPDATE MetaData SET edited_timestamp = ?
+                WHERE meta_data_id IN (
+                    SELECT meta_data_id FROM Transactions WHERE {source_rows}
+                    UNION ALL SELECT meta_data_id FROM Products WHERE {source_rows}
+                    UNION ALL SELECT meta_data_id FROM ShopLocations WHERE {source_rows}
+                    UNION ALL SELECT meta_data_id FROM Vendors WHERE vendor_id = ?
+                );
+                """,
+                (now, sources, self.db.user_id, sources, self.db.user_id, sources, self.db.user_id, target_vendor_id)
+            )
+            moved["Transactions"] = self.db.execute_sql(
+                f"""
+                UPDATE Transactions
+                SET vendor_id = ?, shop_location_id = COALESCE(?, shop_location_id)
+                WHERE {source_rows};
+                """,
+                (target_vendor_id, target_location_id, sources, self.db.user_id)
+            ).rowcount
+            moved["Products"] = self.db.execute_sql(
+                f"UPDATE Products SET vendor_id = ? WHERE {source_rows};",
+                (target_vendor_id, sources, self.db.user_id)
+            ).rowcount
+            moved["ShopLocations"] = self.db.execute_sql(
+                f"UPDATE ShopLocations SET vendor_id = ? WHERE {source_rows};",
+                (target_vendor_id, sources, self.db.user_id)
+            ).rowcount
+            if target_location_id is not None:
+                self.db.execute_sql(
+                    "UPDATE ShopLocations SET vendor_id = ? WHERE shop_location_id = ?;",
+                    (target_vendor_id, target_location_id)
+                )
+            self.db.execute_sql(
+                f"""
+                UPDATE Vendors
+                SET default_category_id = COALESCE(default_category_id, (
+                        SELECT default_category_id FROM Vendors
+                        WHERE {source_rows} AND default_category_id IS NOT NULL
+                        LIMIT 1
+                    )),
+                    default_location_id = COALESCE(default_location_id, (
+                        SELECT default_location_id FROM Vendors
+                        WHERE {source_rows} AND default_location_id IS NOT NULL
+                        LIMIT 1
+                    ))
+                WHERE vendor_id = ?;
+                """,
+                (sources, self.db.user_id, sources, self.db.user_id, target_vendor_id)
+            )
+            moved["Vendors"] = self.db.execute_sql(
+                f"""
+                UPDATE MetaData SET row_deleted = 1, edited_timestamp = ?
+                WHERE meta_data_id IN (SELECT meta_data_id FROM Vendors WHERE {source_rows});
+                """,
+                (now, sources, self.db.user_id)
+            ).rowcount
+
+        log(f"Merged vendors {source_ids} into {target_vendor_id}:", moved)
+        self.reload_tables("vendors", "shop_locations", "products", "transactions")
+        return moved
 
     def save_df_changes(self, obj, edited_df) -> bool:
         return obj.save_changes(
@@ -1,43 +1,125 @@
 import logging
-import streamlit as st
-import datetime
+import logging.handlers
+import atexit
+import copy
 import os
+import queue
+import threading
+from contextlib import contextmanager
+
+LOG_PATH = "logs/moneything.log"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+# e.g. MONEYTHING_LOG_LEVEL=DEBUG to include every SQL statement
+LOG_LEVEL = os.environ.get("MONEYTHING_LOG_LEVEL", "INFO").upper()
+
+LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+    "critical": logging.CRITICAL,
+    "exception": logging.ERROR,
+}
+
+logger = logging.getLogger("moneything")
+_configured = False
+_file_handler = None
+_setup_lock = threading.Lock()
+
+
+class LazyMessage:
+    """
+    joins the parts of a log call only when a handler formats the record
+    """
+    __slots__ = ("parts", )
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    def __str__(self):
+        return " ".join([str(m) for m in self.parts])
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queues records as they are, the stock prepare formats them on the calling thread.
+    Only for a queue read in this process, so the listener thread does the formatting
+    """
+    def prepare(self, record):
+        return copy.copy(record)
+
+
+def configure_logger(handler):
+    logger.addHandler(handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
 
 
 def setup_log():
-    if "logger_obj" not in st.session_state:
-        st.session_state["logger_obj"] = logging.getLogger(__name__)
-        now = datetime.datetime.now().strftime("%Y.%m.%d-%H.%M.%S")
-        path = f"logs/{now}"
-        num = 1
+    """
+    Configures logging once per process. Records go through a queue,
+    and a listener thread writes them to a size rotated file, so callers never wait on disk.
+    """
+    global _configured, _file_handler
+    if _configured:
+        return
+    with _setup_lock:
+        if _configured:
+            return
+        os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            LOG_PATH,
+            maxBytes=LOG_MAX_BYTES,
+            backupCount=LOG_BACKUP_COUNT,
+            encoding="utf-8"
+        )
+        file_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
 
-        def make_path(base, n):
-            if n == 1:
-                return f"{path}.log"
-            return f"{path}-({n}).log"
-        while os.path.exists(make_path(path, num)):
-            num+=1
-        path = make_path(path, num)
+        log_queue = queue.SimpleQueue()
+        configure_logger(LocalQueueHandler(log_queue))
 
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        st.session_state["logger_filename"] = path
+        listener = logging.handlers.QueueListener(log_queue, file_handler)
+        listener.start()
+        atexit.register(listener.stop)
+        _file_handler = file_handler
+        _configured = True
 
-    logging.basicConfig(
-        filename=st.session_state["logger_filename"],
-        filemode="a",
-        level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(message)s"
-    )
 
+def setup_worker_log(worker_queue):
+    """
+    Process pool initializer, the worker sends its records to the parent's log file instead of opening
+    its own, as several processes rotating the same file would race
+    :param worker_queue: from worker_logging
+    """
+    global _configured
+    with _setup_lock:
+        # the stock handler formats the record first, so it can be pickled to the parent
+        configure_logger(logging.handlers.QueueHandler(worker_queue))
+        _configured = True
+
+
+@contextmanager
+def worker_logging(mp_context):
+    """
+    Writes records sent by process pool workers to this process's log file while the block runs
+    :param mp_context: the pool's multiprocessing context
+    :return: (initializer, initargs) to give the pool
+    """
+    setup_log()
+    worker_queue = mp_context.Queue()
+    listener = logging.handlers.QueueListener(worker_queue, _file_handler)
+    listener.start()
+    try:
+        yield setup_worker_log, (worker_queue, )
+    finally:
+        listener.stop()
+        worker_queue.close()
 
 
 def log(*message, level="info"):
-    message = " ".join([str(m) for m in message])
     setup_log()
-    match level:
-        case "info": logging.info(message)
-        case "warning": logging.warning(message)
-        case "error": logging.error(message)
-        case "critical": logging.critical(message)
-        case "exception": logging.exception(message)
-        case _: logging.info(message)
+    level_no = LEVELS.get(level, logging.INFO)
+    if not logger.isEnabledFor(level_no):
+        return
+    logger.log(level_no, LazyMessage(message), exc_info=(level == "exception"))
@@ -0,0 +1,135 @@
+import sqlite3 as sql
+import hashlib
+import json
+import datetime
+import threading
+from src.logger import log
+
+OCR_CACHE_PATH = "ocr_cache.db"
+OCR_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+
+class OCRCache:
+    """
+    Receipt OCR results keyed by the sha256 of the image bytes, so re-uploaded receipts skip tesseract.
+    Parsed items are stored alongside the text with the version of the parser that made them,
+    when the parser changes the cached text is parsed again instead of re-running OCR.
+    Least recently used entries are evicted once the cache grows past max_bytes.
+    """
+    def __init__(self, path=OCR_CACHE_PATH, max_bytes=OCR_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.connection = sql.connect(path, check_same_thread=False)
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ReceiptOCR(
+                image_hash TEXT PRIMARY KEY,
+                ocr_text TEXT,
+                parsed_json TEXT,
+                parser_version TEXT,
+                size_bytes INTEGER,
+                last_used TEXT
+            );
+            """
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS idx_receipt_ocr_last_used ON ReceiptOCR(last_used);"
+        )
+        self.connection.commit()
+
+    @staticmethod
+    def hash_image(image_bytes: bytes) -> str:
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    @staticmethod
+    def now() -> str:
+        return datetime.datetime.now().isoformat()
+
+    def get_text(self, image_hash) -> str | None:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT ocr_text FROM ReceiptOCR WHERE image_hash = ?;",
+                (image_hash, )
+            ).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                "UPDATE ReceiptOCR SET last_used = ? WHERE image_hash = ?;",
+                (self.now(), image_hash)
+            )
+            self.connection.commit()
+            return row[0]
+
+    def put_text(self, image_hash, ocr_text):
+        with self.lock:
+            self.connection.execute(
+                """
+                INSERT INTO ReceiptOCR (image_hash, ocr_text, size_bytes, last_used)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(image_hash) DO UPDATE SET
+                    ocr_text = excluded.ocr_text,
+                    parsed_json = NULL,
+                    parser_version = NULL,
+                    size_bytes = excluded.size_bytes,
+                    last_used = excluded.last_used;
+                """,
+                (image_hash, ocr_text, len(ocr_text.encode()), self.now())
+            )
+            self.evict()
+            self.connection.commit()
+
+    def get_parsed(self, image_hash, parser_version) -> dict | None:
+        """
+        :return: the cached parse result, or None if it is missing or was made by a different parser version
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT parsed_json, parser_version FROM ReceiptOCR WHERE image_hash = ?;",
+                (image_hash, )
+            ).fetchone()
+        if row is None or row[0] is None or row[1] != str(parser_version):
+            return None
+        return json.loads(row[0])
+
+    def put_parsed(self, image_hash, parser_version, parsed: dict):
+        parsed_json = json.dumps(parsed)
+        with self.lock:
+            self.connection.execute(
+                """
+                UPDATE ReceiptOCR
+                SET parsed_json = ?, parser_version = ?, size_bytes = LENGTH(CAST(ocr_text AS BLOB)) + ?
+                WHERE image_hash = ?;
+                """,
+                (parsed_json, str(parser_version), len(parsed_json.encode()), image_hash)
+            )
+            self.evict()
+            self.connection.commit()
+
+    def evict(self):
+        total_bytes = self.connection.execute(
+            "SELECT COALESCE(SUM(size_bytes), 0) FROM ReceiptOCR;"
+        ).fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+
+        removed = 0
+        for image_hash, size_bytes in self.connection.execute(
+            "SELECT image_hash, size_bytes FROM ReceiptOCR ORDER BY last_used ASC;"
+        ).fetchall():
+            if total_bytes <= self.max_bytes:
+                break
+            self.connection.execute("DELETE FROM ReceiptOCR WHERE image_hash = ?;", (image_hash, ))
+            total_bytes -= size_bytes
+            removed += 1
+        log(f"Evicted {removed} receipts from the OCR cache")
+
+
+_ocr_cache = None
+_ocr_cache_lock = threading.Lock()
+
+def get_ocr_cache() -> OCRCache:
+    global _ocr_cache
+    with _ocr_cache_lock:
+        if _ocr_cache is None:
+            _ocr_cache = OCRCache()
+        return _ocr_cache
@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from src.logger import log
+
+# e.g. MONEYTHING_BCRYPT_ROUNDS=13, existing hashes are upgraded as their users log in
+BCRYPT_ROUNDS = int(os.environ.get("MONEYTHING_BCRYPT_ROUNDS", 12))
+# at most this many hashes run at once, however many logins arrive together
+HASH_WORKERS = int(os.environ.get("MONEYTHING_HASH_WORKERS", 2))
+MAX_USERNAME_FAILURES = 5
+# across every client, higher so failures spread over many addresses still hit a limit,
+# without one client being able to lock the real user out
+MAX_GLOBAL_USERNAME_FAILURES = 50
+MAX_IP_FAILURES = 20
+FAILURE_WINDOW_SECONDS = 15 * 60
+# keys with the oldest failures are forgotten past this, so a flood of usernames can't grow memory without limit
+MAX_THROTTLE_KEYS = 10000
+
+_hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+
+
+def hash_password(password, rounds=BCRYPT_ROUNDS) -> str:
+    """
+    hashes on the bounded bcrypt pool, bcrypt releases the GIL so the server keeps serving other sessions
+    """
+    return _hash_executor.submit(
+        lambda: bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+    ).result()
+
+def check_password(password, password_hash) -> bool:
+    return _hash_executor.submit(
+        lambda: bcrypt.checkpw(password.encode(), password_hash.encode())
+    ).result()
+
+def get_rounds(password_hash) -> int | None:
+    """
+    :return: the cost factor of a bcrypt hash, e.g. 12 for "$2b$12$..."
+    """
+    try:
+        return int(password_hash.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+def needs_rehash(password_hash, rounds=BCRYPT_ROUNDS) -> bool:
+    return get_rounds(password_hash) != rounds
+
+
+class LoginThrottle:
+    """
+    Counts failed logins per key (a (username, ip address) pair or an ip address) over a sliding window,
+    and blocks the key once it has too many, before any hashing is done.
+    Keys are kept in order of their latest failure, so expired ones are swept from the front
+    """
+    def __init__(self, max_failures, window_seconds=FAILURE_WINDOW_SECONDS, max_keys=MAX_THROTTLE_KEYS):
+        self.max_failures = max_failures
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        self.failures = {}
+
+    def prune(self, key, now) -> deque:
+        failures = self.failures.get(key)
+        if failures is None:
+            return deque()
+        while len(failures) > 0 and failures[0] <= now - self.window_seconds:
+            failures.popleft()
+        if len(failures) == 0:
+            del self.failures[key]
+        return failures
+
+    def get_wait(self, key) -> float:
+        """
+        :return: seconds until the key may try again, 0 if it isn't blocked
+        """
+        if key is None:
+            return 0
+        now = time.monotonic()
+        with self.lock:
+            failures = self.prune(key, now)
+            if len(failures) < self.max_failures:
+                return 0
+            return failures[-self.max_failures] + self.window_seconds - now
+
+    def sweep(self, now):
+        """
+        drops keys whose latest failure has left the window, then the oldest keys past max_keys
+        """
+        while len(self.failures) > 0:
+            key = next(iter(self.failures))
+            if len(self.failures) <= self.max_keys and self.failures[key][-1] > now - self.window_seconds:
+                break
+            del self.failures[key]
+
+    def record_failure(self, key):
+        if key is None:
+            return
+        now = time.monotonic()
+        with self.lock:
+            failures = self.failures.pop(key, deque())
+            failures.append(now)
+            self.failures[key] = failures
+            self.sweep(now)
+
+    def reset(self, key):
+        with self.lock:
+            self.failures.pop(key, None)
+
+
+# keyed on the client too, so failing logins from elsewhere can't lock a known user out
+username_throttle = LoginThrottle(MAX_USERNAME_FAILURES)
+global_username_throttle = LoginThrottle(MAX_GLOBAL_USERNAME_FAILURES)
+ip_throttle = LoginThrottle(MAX_IP_FAILURES)
+
+def get_username_key(username, ip_address) -> tuple:
+    return username.lower(), ip_address
+
+def get_login_wait(username, ip_address=None) -> float:
+    """
+    :return: seconds the login has to wait, 0 if it can be tried now
+    """
+    return max(
+        username_throttle.get_wait(get_username_key(username, ip_address)),
+        global_username_throttle.get_wait(username.lower()),
+        ip_throttle.get_wait(ip_address)
+    )
+
+def record_login(username, ip_address, success):
+    key = get_username_key(username, ip_address)
+    if success:
+        # the global count isn't reset, or a distributed guesser would get fresh tries each time the user logs in
+        username_throttle.reset(key)
+        return
+    username_throttle.record_failure(key)
+    global_username_throttle.record_failure(username.lower())
+    ip_throttle.record_failure(ip_address)
+    if username_throttle.get_wait(key) > 0:
+        log(f"Throttling logins for a username from one client after {MAX_USERNAME_FAILURES} failures", level="warning")
+    if global_username_throttle.get_wait(username.lower()) > 0:
+        log(f"Throttling logins for a username after {MAX_GLOBAL_USERNAME_FAILURES} failures", level="warning")
@@ -1,14 +1,21 @@
 import pdfplumber
 import pandas as pd
-import numpy as np
-import streamlit as st
+import io
+import os
+import multiprocessing
+from typing import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import src.utils as utils
-from src.db_manager import DatabaseManager
-from src.adding_transaction import AddingTransaction
+from src.logger import worker_logging
+from src.db_classes.Transactions import Transactions
+from src.statement_parsers import STATEMENT_PARSERS, HSBCStatementParser, StatementLayout, parse_statement_pages
 pd.set_option('display.max_columns', None)
 
-def extract_pdf_text(path) -> list[list[list[dict]]]:
-    pages = []
+def extract_pdf_text(path) -> Iterator[list[list[dict]]]:
+    """
+    Yields each page as a list of lines, each line being a list of words.
+    Pages are read one at a time and closed once yielded, so memory stays flat for long statements.
+    """
     with pdfplumber.open(path) as pdf:
         for page in pdf.pages:
             word_dict = page.extract_words()
@@ -20,11 +27,11 @@ def extract_pdf_text(path) -> list[list[list[dict]]]:
                     current_y_pos = int(word["top"])
                 page_info[-1].append({
                     "text": word["text"],
-                    "x_pos": int(word["x0"])
+                    "x_pos": int(word["x0"]),
+                    "x_end_pos": int(word["x1"])
                 })
-            pages.append(page_info)
-
-    return pages
+            page.close()
+            yield page_info
 
 def extract_table(data: list[list[dict]], columns: list[tuple[str, int]]) -> pd.DataFrame:
     """
@@ -33,131 +40,66 @@ def extract_table(data: list[list[dict]], columns: list[tuple[str, int]]) -> pd.
     :param columns: list of column info, each item is [column title, x pos of far left of column]
     :return: dataframe storing the table
     """
-    df_data = []
-    for line in data:
-        new_row = {column: [] for column, cutoff in columns}
-        for word in line:
-            column_index = len(columns)-1
-            while word["x_pos"] < columns[column_index][1] and column_index>0:
-                column_index-=1
-            new_row[columns[column_index][0]].append(word["text"])
-        df_data.append({
-            column: " ".join(words)
-            for column, words in new_row.items()
-        })
-
-    return pd.DataFrame(df_data, columns = [col[0] for col in columns])
-
-def extract_hsbc_statement(pages: list[list[list[dict]]]):
-    transaction_rows = []
-    initial_balance_text = None
-    for page in pages:
-        at_transactions = False
-        for line in page:
-            text = " ".join([word["text"] for word in line])
-
-            if "BALANCECARRIEDFORWARD" in text:
-                at_transactions = False
-            if at_transactions:
-                transaction_rows.append(line)
-            if "BALANCEBROUGHTFORWARD" in text:
-                at_transactions = True
-                if initial_balance_text is None:
-                    initial_balance_text = text
-
-    table_df = extract_table(
-        transaction_rows,
-        [
-            ("date", 0),
-            ("type", 110),
-            ("name", 135),
-            ("paid_out", 350),
-            ("paid_in", 440),
-            ("balance", 510)
-        ]
+    layout = StatementLayout(columns)
+    return pd.DataFrame(
+        [layout.split_line(line) for line in data],
+        columns=layout.names
+    )
+
+def extract_hsbc_statement(pages: Iterable[list[list[dict]]]):
+    return STATEMENT_PARSERS[HSBCStatementParser.BANK].parse(pages)
+
+def store_transactions_df(transactions_df, snapshot_info, db_manager, money_store=None):
+    db = db_manager.db
+    money_store_id = get_money_store_id(db_manager, money_store)
+
+    rows_df = pd.DataFrame({
+        "date": transactions_df["date"].map(utils.date_to_string),
+        "vendor_name": transactions_df["name"],
+        "description": transactions_df["description"],
+        "override_money": transactions_df["money"],
+        "is_income": transactions_df["is_income"],
+        "money_store_id": money_store_id,
+    })
+    rows_df["fingerprint"] = Transactions.make_fingerprints(rows_df, db.user_id)
+    known_fingerprints = db_manager.transactions.get_known_fingerprints(db)
+    new_rows_df = rows_df[~rows_df["fingerprint"].isin(known_fingerprints)]
+
+    with db.transaction():
+        vendor_ids = db_manager.vendors.get_or_create_ids(db, new_rows_df["vendor_name"])
+        for row in new_rows_df.itertuples(index=False):
+            db.create_row(
+                db_manager.transactions.TABLE,
+                {
+                    "date": row.date,
+                    "override_money": None if utils.isNone(row.override_money) else row.override_money,
+                    "is_income": None if utils.isNone(row.is_income) else row.is_income,
+                    "money_store_id": money_store_id,
+                    "vendor_id": vendor_ids.get(row.vendor_name, None),
+                    "description": None if utils.isNone(row.description) else row.description,
+                    "fingerprint": row.fingerprint
+                }
+            )
+
+        if snapshot_info is not None:
+            store_snapshot(snapshot_info, db_manager, money_store)
+
+    return len(new_rows_df)
+
+def get_money_store_id(db_manager, money_store):
+    if money_store is None:
+        return None
+    return db_manager.money_stores.get_id_from_value("name", money_store)
+
+def store_snapshot(snapshot_info, db_manager, money_store=None):
+    db_manager.db.create_row(
+        db_manager.store_snapshots.TABLE,
+        {
+            "money_store_id": get_money_store_id(db_manager, money_store),
+            "snapshot_date": utils.date_to_string(snapshot_info["date"]),
+            "money_stored": snapshot_info["balance"]
+        }
     )
-    combined_df = pd.DataFrame(columns=list(table_df.columns)+["description", "money", "is_income"])
-    for i, row in table_df.iterrows():
-        if row["type"] != "":
-            combined_df.loc[len(combined_df)] = row.copy()
-        else:
-            try:
-                combined_df.loc[len(combined_df)-1, "description"] += " "+row["name"]
-            except (KeyError, TypeError):
-                combined_df.loc[len(combined_df) - 1, "description"] = row["name"]
-            combined_df.loc[len(combined_df)-1,
-                ["paid_out", "paid_in", "balance"]
-            ] = row[
-                ["paid_out", "paid_in", "balance"]
-            ]
-
-
-    combined_df["date"] = combined_df["date"].replace("", np.nan).ffill()
-    combined_df["date"] = combined_df["date"].apply(utils.string_to_date)
-
-    for i, row in combined_df.iterrows():
-        if row["paid_in"] != "":
-            combined_df.loc[i, "money"] = float(str(row["paid_in"]).replace(",", ""))
-            combined_df.loc[i, "is_income"] = True
-        elif row["paid_out"] != "":
-            combined_df.loc[i, "money"] = float(str(row["paid_out"]).replace(",", ""))
-            combined_df.loc[i, "is_income"] = False
-
-    transaction_df = combined_df.rename({
-        "name": "vendor",
-    })[["date", "name", "description", "money", "is_income"]]
-
-    snapshot_info = None
-    if initial_balance_text is not None:
-        split_text = initial_balance_text.split()
-        try:
-            date_str = split_text[0]+" "+split_text[1]+" "+split_text[2]
-            balance_str = split_text[-1]
-            snapshot_info = {
-                "date": utils.string_to_date(date_str),
-                "balance": float(balance_str.replace(",", ""))
-            }
-        except:
-            pass
-
-    return transaction_df, snapshot_info
-
-def store_transactions_df(transactions_df, snapshot_info, db_manager=None, money_store=None):
-    if db_manager is None:
-        db_manager = DatabaseManager()
-    for i, row in transactions_df.iterrows():
-        adding = AddingTransaction(db_manager)
-        adding.set_spending_date(row["date"])
-        adding.set_vendor_name(row["name"])
-        adding.set_description(row["description"])
-        adding.set_override_money(row["money"])
-        adding.set_is_income(row["is_income"])
-        adding.set_money_store_used(money_store)
-
-        same_transactions = db_manager.transactions.get_filtered_df(
-            ["date", "vendor_name", "description", "override_money", "is_income"],
-            [
-                utils.date_to_string(row["date"]),
-                row["name"],
-                row["description"],
-                row["money"],
-                row["is_income"]
-            ]
-        )
-        if len(same_transactions) == 0:
-            adding.add_transaction_to_db()
-
-    if snapshot_info is not None:
-        adding = AddingTransaction(db_manager)
-        adding.set_money_store_used(money_store)
-        db_manager.db.create_row(
-            db_manager.store_snapshots.TABLE,
-            {
-                "money_store_id": adding.money_store_id,
-                "snapshot_date": utils.date_to_string(snapshot_info["date"]),
-                "money_stored": snapshot_info["balance"]
-            }
-        )
 
 def upload_pdf(file, db_manager, money_store=None):
     # if not str(file).endswith(".pdf"):
@@ -165,10 +107,91 @@ def upload_pdf(file, db_manager, money_store=None):
     #     return
 
     statement_pages = extract_pdf_text(file)
-    transactions_df, initial_balance = extract_hsbc_statement(statement_pages)
+    transactions_df, initial_balance = parse_statement_pages(statement_pages)
 
     store_transactions_df(transactions_df, initial_balance, db_manager, money_store)
 
+def parse_statement(data: bytes):
+    """
+    Process pool worker, parses a single statement from its raw pdf bytes
+    :return: (transactions_df, snapshot_info)
+    """
+    return parse_statement_pages(extract_pdf_text(io.BytesIO(data)))
+
+def combine_statement_dfs(transaction_dfs: list[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenates statements, dropping rows that appear in more than one statement.
+    Repeated identical rows within the same statement are kept, as they are separate transactions.
+    """
+    key_columns = ["date", "name", "description", "money", "is_income"]
+    numbered_dfs = []
+    for df in transaction_dfs:
+        df = df.copy()
+        df["occurrence"] = df.groupby(key_columns, dropna=False).cumcount()
+        numbered_dfs.append(df)
+    if len(numbered_dfs) == 0:
+        return pd.DataFrame(columns=key_columns)
+
+    combined = pd.concat(numbered_dfs, ignore_index=True)
+    return combined.drop_duplicates(
+        subset=key_columns+["occurrence"]
+    ).drop(columns="occurrence").reset_index(drop=True)
+
+def parse_statements(files, progress_callback=None, max_workers=None) -> list[tuple[pd.DataFrame, dict | None]]:
+    """
+    Parses statements in a process pool
+    :param files: paths or uploaded file objects
+    :param progress_callback: called with (files parsed, total files) as each statement finishes
+    :return: (transactions_df, snapshot_info) for each file, in the same order as files
+    """
+    if len(files) == 0:
+        return []
+    if max_workers is None:
+        max_workers = min(len(files), os.cpu_count() or 1)
+
+    parsed = [None]*len(files)
+    if max_workers <= 1:
+        for i, file in enumerate(files):
+            parsed[i] = parse_statement(utils.read_file_bytes(file))
+            if progress_callback is not None:
+                progress_callback(i+1, len(files))
+    else:
+        mp_context = multiprocessing.get_context("spawn")
+        with worker_logging(mp_context) as (initializer, initargs), ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=mp_context,
+            initializer=initializer,
+            initargs=initargs
+        ) as pool:
+            futures = {
+                pool.submit(parse_statement, utils.read_file_bytes(file)): i
+                for i, file in enumerate(files)
+            }
+            for num_done, future in enumerate(as_completed(futures), 1):
+                parsed[futures[future]] = future.result()
+                if progress_callback is not None:
+                    progress_callback(num_done, len(files))
+    return parsed
+
+def import_statements(files, db_manager, money_store=None, progress_callback=None, max_workers=None):
+    """
+    Parses statements in a process pool, then stores all of them in a single db transaction
+    :param files: paths or uploaded file objects
+    :param progress_callback: called with (files parsed, total files) as each statement finishes
+    :return: number of statements imported
+    """
+    if len(files) == 0:
+        return 0
+    parsed = parse_statements(files, progress_callback, max_workers)
+
+    transactions_df = combine_statement_dfs([df for df, snapshot_info in parsed])
+    with db_manager.db.transaction():
+        store_transactions_df(transactions_df, None, db_manager, money_store)
+        for df, snapshot_info in parsed:
+            if snapshot_info is not None:
+                store_snapshot(snapshot_info, db_manager, money_store)
+
+    return len(files)
 
 
 if __name__ == "__main__":
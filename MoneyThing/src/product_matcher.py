@@ -0,0 +1,101 @@
+import re
+from collections import defaultdict
+import src.utils as utils
+
+NORMALISE_PATTERN = re.compile(r"[^A-Z0-9]+")
+SIZE_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*(ML|L|KG|G)\b")
+# sizes are compared in ml or g, so 1L and 1000ML are the same size
+SIZE_UNITS = {"ML": ("ML", 1), "L": ("ML", 1000), "G": ("G", 1), "KG": ("G", 1000)}
+
+
+def normalise_name(name: str) -> str:
+    return NORMALISE_PATTERN.sub(" ", str(name).upper()).strip()
+
+def get_trigrams(name: str) -> set[str]:
+    padded = f"  {normalise_name(name)} "
+    return {padded[i:i+3] for i in range(len(padded)-2)}
+
+def get_sizes(name: str) -> frozenset[tuple[str, float]]:
+    """
+    :return: quantities in the name, e.g. {("ML", 2000.0)} for "Whole Milk 2L"
+    """
+    sizes = set()
+    for amount, unit in SIZE_PATTERN.findall(str(name).upper()):
+        base_unit, multiplier = SIZE_UNITS[unit]
+        sizes.add((base_unit, round(float(amount)*multiplier, 3)))
+    return frozenset(sizes)
+
+
+class ProductMatcher:
+    """
+    Trigram index over product names, split by vendor.
+    Matches are scored with the dice coefficient of the two names' trigram sets,
+    only products sharing at least one trigram with the query are scored.
+    Names that both give a size, e.g. 1L and 2L, never match unless the sizes are the same.
+    """
+    MATCH_THRESHOLD = 0.55
+
+    def __init__(self, threshold=MATCH_THRESHOLD):
+        self.threshold = threshold
+        # vendor_id -> trigram -> product ids
+        self.index = defaultdict(lambda: defaultdict(set))
+        # vendor_id -> normalised name -> product id
+        self.exact = defaultdict(dict)
+        self.trigram_counts = {}
+        self.sizes = {}
+
+    @staticmethod
+    def vendor_key(vendor_id):
+        return None if utils.isNone(vendor_id) else int(vendor_id)
+
+    def build(self, products_df):
+        for product_id, name, vendor_id in zip(products_df["product_id"], products_df["name"], products_df["vendor_id"]):
+            self.add(product_id, name, vendor_id)
+        return self
+
+    def add(self, product_id, name, vendor_id):
+        if utils.isNone(name) or utils.isNone(product_id):
+            return
+        vendor = self.vendor_key(vendor_id)
+        product_id = int(product_id)
+        trigrams = get_trigrams(name)
+        for trigram in trigrams:
+            self.index[vendor][trigram].add(product_id)
+        self.exact[vendor].setdefault(normalise_name(name), product_id)
+        self.trigram_counts[product_id] = len(trigrams)
+        self.sizes[product_id] = get_sizes(name)
+
+    def match(self, name, vendor_id=None) -> tuple[int | None, float]:
+        """
+        Searches the vendor's products, and products with no vendor
+        :return: (best product id, score) or (None, best score) if nothing reaches the threshold
+        """
+        vendors = {self.vendor_key(vendor_id), None}
+        normalised = normalise_name(name)
+        for vendor in vendors:
+            if normalised in self.exact.get(vendor, {}):
+                return self.exact[vendor][normalised], 1.0
+
+        trigrams = get_trigrams(name)
+        shared_counts = defaultdict(int)
+        for vendor in vendors:
+            vendor_index = self.index.get(vendor)
+            if vendor_index is None:
+                continue
+            for trigram in trigrams:
+                for product_id in vendor_index.get(trigram, ()):
+                    shared_counts[product_id] += 1
+
+        sizes = get_sizes(name)
+        best_id = None
+        best_score = 0.0
+        for product_id, shared in shared_counts.items():
+            if len(sizes) > 0 and len(self.sizes[product_id]) > 0 and sizes != self.sizes[product_id]:
+                continue
+            score = 2*shared / (len(trigrams) + self.trigram_counts[product_id])
+            if score > best_score:
+                best_id, best_score = product_id, score
+
+        if best_score < self.threshold:
+            return None, best_score
+        return best_id, best_score
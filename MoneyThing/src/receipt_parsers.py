@@ -0,0 +1,147 @@
+import re
+import pandas as pd
+import src.utils as utils
+from src.logger import log
+
+RECEIPT_PARSERS = {}
+
+WORD_PATTERN = re.compile(r"[A-Z]+")
+ITEM_LINE_PATTERN = re.compile(r"^(?P<name>.*\S)\s+£?(?P<price>-?\d+\.\d{2})(?:\s+[A-Z])?$")
+DATE_PATTERN = re.compile(r"\b\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}\b")
+TIME_PATTERN = re.compile(r"\b\d{1,2}:\d{2}(?::\d{2})?\b")
+
+
+def register_receipt_parser(parser_class):
+    """
+    class decorator, adds an instance of the parser to RECEIPT_PARSERS.
+    Parsers are tried in the order they are registered, the generic parser is used when none match.
+    """
+    parser = parser_class()
+    RECEIPT_PARSERS[parser.NAME] = parser
+    return parser_class
+
+
+def parse_item_lines(lines, total_names=("TOTAL", )) -> tuple[list[list], float]:
+    """
+    Reads "NAME PRICE" lines until a total line, negative prices are discounts on the previous item
+    :return: ([[name, price], ...], total)
+    """
+    items = []
+    total = 0
+    for text_row in lines:
+        match = ITEM_LINE_PATTERN.match(text_row.strip())
+        if match is None:
+            continue
+        name = match["name"].strip()
+        price = float(match["price"])
+
+        if price < 0:
+            if len(items) > 0:
+                items[-1][1] += price
+        elif name.upper() in total_names:
+            total = price
+            break
+        else:
+            items.append([name, price])
+    return items, total
+
+
+class ReceiptParser:
+    NAME = "NAME_NOT_DEFINED"
+    # vendor name the transaction is stored under, None leaves it for the user to fill in
+    VENDOR = None
+    # bump whenever parse changes, cached receipts are then parsed again from their OCR text
+    VERSION = 1
+    DETECT_PATTERN = None
+    KEYWORDS = frozenset()
+
+    def get_cache_version(self) -> str:
+        return f"{self.NAME}:{self.VERSION}"
+
+    def detect(self, text: str, words: set[str]) -> bool:
+        """
+        :param text: the receipt's OCR text
+        :param words: upper case words in the text
+        """
+        if self.DETECT_PATTERN is not None and self.DETECT_PATTERN.search(text) is not None:
+            return True
+        return not self.KEYWORDS.isdisjoint(words)
+
+    def find_date_time(self, text: str):
+        date_match = DATE_PATTERN.search(text)
+        time_match = TIME_PATTERN.search(text)
+        return (
+            None if date_match is None else utils.string_to_date(date_match[0]),
+            None if time_match is None else utils.string_to_time(time_match[0])
+        )
+
+    def parse(self, text: str) -> tuple[pd.DataFrame, float, object, object]:
+        """
+        :return: (items df with columns Item, Price, total, date, time)
+        """
+        items, total = parse_item_lines(text.split("\n"))
+        date, time = self.find_date_time(text)
+        return pd.DataFrame(items, columns=["Item", "Price"]), total, date, time
+
+
+@register_receipt_parser
+class LidlReceiptParser(ReceiptParser):
+    NAME = "lidl"
+    VENDOR = "Lidl"
+    DETECT_PATTERN = re.compile(r"Lidl Vouchers|Lidl Plus", re.IGNORECASE)
+    KEYWORDS = frozenset({"LIDL"})
+    ITEMS_START = "£100 of Lidl Vouchers."
+    ITEMS_END = "*CUSTOMER COPY*"
+    DATE_TIME_PATTERN = re.compile(r"Date:\s\d+/\d+/\d+\sTime:\s\d+:\d+:\d+")
+
+    def parse(self, text):
+        if self.ITEMS_START not in text:
+            raise ValueError("Lidl receipt item list not found")
+        item_text = text.split(self.ITEMS_START, 1)[1]
+        item_text = item_text.split(self.ITEMS_END, 1)[0]
+
+        items, total = parse_item_lines(item_text.split("\n"))
+        df = pd.DataFrame(items, columns=["Item", "Price"])
+
+        date_time_match = self.DATE_TIME_PATTERN.search(text)
+        if date_time_match is not None:
+            date_vals = date_time_match[0].split()
+            date = utils.string_to_date(date_vals[1])
+            time = utils.string_to_time(date_vals[3])
+        else:
+            date = None
+            time = None
+        return df, total, date, time
+
+
+class GenericReceiptParser(ReceiptParser):
+    NAME = "generic"
+
+
+GENERIC_RECEIPT_PARSER = GenericReceiptParser()
+
+
+def classify_receipt(text: str) -> ReceiptParser:
+    words = set(WORD_PATTERN.findall(text.upper()))
+    for parser in RECEIPT_PARSERS.values():
+        if parser.detect(text, words):
+            return parser
+    log("Receipt vendor not recognised, using the generic parser", level="warning")
+    return GENERIC_RECEIPT_PARSER
+
+
+def parse_receipt_text(text: str, parser: ReceiptParser | None = None):
+    """
+    :return: (parser used, (items df, total, date, time))
+    """
+    if parser is None:
+        parser = classify_receipt(text)
+    log(f"Parsing receipt with the {parser.NAME} parser")
+    df, total, date, time = parser.parse(text)
+
+    log("Loaded dataframe from uploaded receipt image: ")
+    log(df)
+    log(f"Total Price - £{total:.2f}")
+    log(f"Date - {utils.date_to_string(date)}")
+    log(f"Time - {utils.time_to_string(time)}")
+    return parser, (df, total, date, time)
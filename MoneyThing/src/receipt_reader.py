@@ -1,12 +1,19 @@
 from PIL import Image
 import pytesseract
-import re
+import io
+import os
 import sys
+import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from src.logger import log
 import pandas as pd
 import src.utils as utils
-import streamlit as st
 from src.adding_transaction import AddingTransaction
+from src.ocr_cache import get_ocr_cache
+from src.receipt_parsers import classify_receipt, parse_receipt_text
+
+RECEIPT_MAX_WIDTH = 1600
+RECEIPT_THRESHOLD = 180
 
 def init_pytesseract():
     if sys.platform == "win32":
@@ -15,90 +22,185 @@ def init_pytesseract():
         pytesseract.pytesseract.tesseract_cmd = path
 
 
-def extract_from_lidl_receipt(image_text):
-    text = image_text.split("£100 of Lidl Vouchers.", 1)[1]
-    text = text.split("*CUSTOMER COPY*", 1)[0]
-    log("Processing Receipt Text As ->")
-    log(image_text)
-    log("------------------------------")
-    items = []
-    total = 0
-    for text_row in text.split("\n"):
-        log(f"load receipt item row: {text_row}")
-        text_row = text_row.removesuffix(" A")
-        text_row = text_row.removesuffix(" B")
-        if text_row != "":
-            split = text_row.rsplit(" ", 1)
-            if len(split)!=2:
-                continue
-            name, price_str = split
-            try:
-                price = float(price_str)
-            except:
-                continue
-
-            if price<0:
-                items[-1][1] += price
-            else:
-                if name == "TOTAL":
-                    total = price
-                    break
-                items.append([name.strip(), price])
-
-    df = pd.DataFrame(items, columns=["Item", "Price"])
-    log("Loaded dataframe from uploaded receipt image: ")
-    log(df)
-
-    date_time_match = re.findall(r"Date:\s\d+/\d+/\d+\sTime:\s\d+:\d+:\d+", image_text)
-
-    if len(date_time_match)>0:
-        date_vals = date_time_match[0].split()
-        date = utils.string_to_date(date_vals[1])
-        time = utils.string_to_time(date_vals[3])
-    else:
-        date = None
-        time = None
-
-    log(f"Total Price - £{total:.2f}")
-    log(f"Date - {utils.date_to_string(date)}")
-    log(f"Time - {utils.time_to_string(time)}")
-
-    return df, total, date, time
-
-
-
-def upload_lidl_receipt(image_path, db_manager, money_store):
-    log(f"Uploading Receipt: {image_path} Into Money Store: {money_store}")
-    init_pytesseract()
-    img = Image.open(image_path)
-    text = pytesseract.image_to_string(img)
+def parse_receipt(image_text, image_hash=None):
+    """
+    Classifies the receipt and parses it, using the OCR cache's parsed result when it was made by the same parser version
+    :return: (parser used, (items df, total, date, time))
+    """
+    if image_hash is None:
+        return parse_receipt_text(image_text)
+
+    cache = get_ocr_cache()
+    parser = classify_receipt(image_text)
+    parsed = cache.get_parsed(image_hash, parser.get_cache_version())
+    if parsed is not None:
+        log(f"Using cached receipt parse: {image_hash}")
+        return parser, (
+            pd.DataFrame(parsed["items"], columns=["Item", "Price"]),
+            parsed["total"],
+            None if parsed["date"] is None else datetime.date.fromisoformat(parsed["date"]),
+            None if parsed["time"] is None else datetime.time.fromisoformat(parsed["time"])
+        )
+
+    parser, (df, total, date, time) = parse_receipt_text(image_text, parser)
+    cache.put_parsed(image_hash, parser.get_cache_version(), {
+        "items": df.values.tolist(),
+        "total": total,
+        "date": None if date is None else date.isoformat(),
+        "time": None if time is None else time.isoformat()
+    })
+    return parser, (df, total, date, time)
+
+
+def preprocess_receipt_image(img, max_width=RECEIPT_MAX_WIDTH, threshold=RECEIPT_THRESHOLD):
+    """
+    Greyscale, shrink to max_width and threshold to black and white, which makes tesseract a lot faster
+    """
+    img = img.convert("L")
+    if img.width > max_width:
+        img = img.resize(
+            (max_width, round(img.height * max_width / img.width)),
+            Image.Resampling.LANCZOS
+        )
+    return img.point(lambda pixel: 255 if pixel > threshold else 0)
+
+def ocr_receipt_image(image_bytes: bytes) -> str:
+    img = preprocess_receipt_image(Image.open(io.BytesIO(image_bytes)))
+    return pytesseract.image_to_string(img)
+
+def ocr_receipts(image_files, max_workers=None, progress_callback=None) -> list[tuple[str, str]]:
+    """
+    Runs tesseract on every receipt concurrently, each call is a separate tesseract process.
+    Receipts already in the OCR cache are not read again.
+    :param progress_callback: called with (receipts read, total receipts) as each receipt finishes
+    :return: (image hash, receipt text) in the same order as image_files
+    """
+    if len(image_files) == 0:
+        return []
+    cache = get_ocr_cache()
+
+    results = [None]*len(image_files)
+    uncached = {}
+    for i, image_file in enumerate(image_files):
+        image_bytes = utils.read_file_bytes(image_file)
+        image_hash = cache.hash_image(image_bytes)
+        text = cache.get_text(image_hash)
+        if text is None:
+            uncached[i] = (image_hash, image_bytes)
+        else:
+            results[i] = (image_hash, text)
+    num_done = len(image_files) - len(uncached)
+    log(f"OCR cache hits: {num_done}/{len(image_files)}")
+    if progress_callback is not None and num_done > 0:
+        progress_callback(num_done, len(image_files))
+    if len(uncached) == 0:
+        return results
 
-    vendor = "Lidl"
+    init_pytesseract()
+    if max_workers is None:
+        max_workers = min(len(uncached), os.cpu_count() or 1)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(ocr_receipt_image, image_bytes): i
+            for i, (image_hash, image_bytes) in uncached.items()
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            image_hash = uncached[i][0]
+            text = future.result()
+            cache.put_text(image_hash, text)
+            results[i] = (image_hash, text)
+            num_done += 1
+            if progress_callback is not None:
+                progress_callback(num_done, len(image_files))
+    return results
+
+def get_file_name(file) -> str:
+    return getattr(file, "name", str(file))
+
+def store_receipt(parser, parsed, db_manager, money_store):
+    item_data, override_money, date, time = parsed
 
-    del st.session_state["adding_spending_df"]
     adding_receipt = AddingTransaction(db_manager)
-    adding_receipt.set_vendor_name("Lidl")
+    adding_receipt.set_vendor_name(parser.VENDOR)
     adding_receipt.set_is_income(False)
     adding_receipt.set_money_store_used(money_store)
 
-    row = db_manager.vendors.get_filtered_df("name", vendor).iloc[0]
-    category = db_manager.categories.get_db_row(row["default_category_id"]).get("name", None)
-    location = db_manager.shop_locations.get_db_row(row["default_location_id"]).get("shop_location", None)
-
-    adding_receipt.set_spending_category(category)
-    adding_receipt.set_shop_location(location)
-
-    item_data, override_money, date, time = extract_from_lidl_receipt(text)
+    vendor_rows = db_manager.vendors.get_filtered_df("name", parser.VENDOR)
+    if len(vendor_rows) > 0:
+        row = vendor_rows.iloc[0]
+        category_row = db_manager.categories.get_db_row(row["default_category_id"])
+        location_row = db_manager.shop_locations.get_db_row(row["default_location_id"])
+        if category_row is not None:
+            adding_receipt.set_spending_category(category_row.get("name", None))
+        if location_row is not None:
+            adding_receipt.set_shop_location(location_row.get("shop_location", None))
 
     adding_receipt.set_override_money(override_money)
     adding_receipt.set_spending_date(date)
     adding_receipt.set_spending_time(time)
 
     for i, row in item_data.iterrows():
-        adding_receipt.add_product(row["Item"], row["Price"])
+        adding_receipt.add_product(row["Item"], row["Price"], match_similar=True)
 
     return adding_receipt.add_transaction_to_db()
 
-
-
-
+def read_receipts(image_files, progress_callback=None, max_workers=None) -> tuple[list[tuple], dict[str, str]]:
+    """
+    OCRs all receipts concurrently and parses each with the parser for its vendor
+    :return: ([(image_file, parser, parsed), ...] for receipts that parsed, file name -> error for the rest)
+    """
+    receipts = ocr_receipts(image_files, max_workers, progress_callback)
+
+    parsed_receipts = []
+    errors = {}
+    for image_file, (image_hash, text) in zip(image_files, receipts):
+        try:
+            parser, parsed = parse_receipt(text, image_hash)
+            parsed_receipts.append((image_file, parser, parsed))
+        except Exception as e:
+            log(f"Failed to parse receipt {get_file_name(image_file)}: {e}", level="error")
+            errors[get_file_name(image_file)] = str(e)
+    return parsed_receipts, errors
+
+def store_receipts(parsed_receipts, db_manager, money_store, errors, stored_callback=None) -> list[int]:
+    """
+    Stores each parsed receipt in its own db transaction, so one that fails is rolled back on its own
+    :param parsed_receipts: from read_receipts
+    :param errors: file name -> error, receipts that fail to store are added to it
+    :param stored_callback: called with (image file, transaction id) as each receipt is stored
+    :return: the new transaction ids
+    """
+    transaction_ids = []
+    for image_file, parser, parsed in parsed_receipts:
+        try:
+            with db_manager.db.transaction():
+                transaction_id = store_receipt(parser, parsed, db_manager, money_store)
+        except Exception as e:
+            log(f"Failed to store receipt {get_file_name(image_file)}: {e}", level="exception")
+            errors[get_file_name(image_file)] = str(e)
+            # the rolled back rows may already be cached in the loaded tables
+            db_manager.reload_tables("vendors", "categories")
+            continue
+        transaction_ids.append(transaction_id)
+        if stored_callback is not None:
+            stored_callback(image_file, transaction_id)
+    return transaction_ids
+
+def import_receipts(image_files, db_manager, money_store, progress_callback=None, max_workers=None) -> tuple[list[int], dict[str, str]]:
+    """
+    OCRs all receipts concurrently, parses each with the parser for its vendor,
+    then stores each receipt that parsed in its own db transaction
+    :return: (the new transaction ids, file name -> error for receipts that failed to parse or store)
+    """
+    log(f"Uploading {len(image_files)} Receipts Into Money Store: {money_store}")
+    parsed_receipts, errors = read_receipts(image_files, progress_callback, max_workers)
+    transaction_ids = store_receipts(parsed_receipts, db_manager, money_store, errors)
+    return transaction_ids, errors
+
+def upload_receipt(image_path, db_manager, money_store):
+    log(f"Uploading Receipt: {image_path} Into Money Store: {money_store}")
+    [(image_hash, text)] = ocr_receipts([image_path])
+    parser, parsed = parse_receipt(text, image_hash)
+    return store_receipt(parser, parsed, db_manager, money_store)
@@ -0,0 +1,83 @@
+import datetime
+import os
+import threading
+from src.logger import log
+
+SCHEMA_MIGRATIONS = {}
+
+_ready_paths = set()
+_schema_lock = threading.Lock()
+
+
+def migration(version):
+    """
+    registers a schema change, run once on each database file whose PRAGMA user_version is below version
+    """
+    def decorator(func):
+        SCHEMA_MIGRATIONS[version] = func
+        return func
+    return decorator
+
+
+@migration(1)
+def create_schema(db):
+    # databases made before user_version was tracked are brought up to date too,
+    # create_tables only adds what is missing
+    db.create_tables()
+
+
+@migration(2)
+def add_archived_fingerprints(db):
+    db.create_tables()
+
+
+@migration(3)
+def stamp_legacy_deletes(db):
+    # rows soft deleted before the ChangeLog existed have no delete time, so their retention starts now
+    if db.is_auth_database:
+        return
+    db.cursor.execute(
+        """
+        UPDATE MetaData SET edited_timestamp = ?
+        WHERE row_deleted = 1 AND meta_data_id NOT IN (
+            SELECT row_id FROM ChangeLog
+            WHERE table_name = 'MetaData' AND column_name = 'row_deleted' AND row_id IS NOT NULL
+        );
+        """,
+        (datetime.datetime.now().isoformat(), )
+    )
+
+
+def get_schema_version() -> int:
+    return max(SCHEMA_MIGRATIONS)
+
+def is_schema_ready(path) -> bool:
+    return os.path.abspath(path) in _ready_paths
+
+def ensure_schema(db):
+    """
+    Runs any migrations the database file is missing, the first time this process connects to it.
+    Later connections skip straight past, so page renders don't re-issue the schema.
+    """
+    path = os.path.abspath(db.context.get_database_path())
+    if path in _ready_paths:
+        return
+    with _schema_lock:
+        if path in _ready_paths:
+            return
+        version = db.cursor.execute("PRAGMA main.user_version;").fetchone()[0]
+        for migration_version in sorted(SCHEMA_MIGRATIONS):
+            if migration_version <= version:
+                continue
+            log(f"Migrating {path} to schema version {migration_version}")
+            SCHEMA_MIGRATIONS[migration_version](db)
+            db.cursor.execute(f"PRAGMA main.user_version = {int(migration_version)};")
+            db.connection.commit()
+        _ready_paths.add(path)
+
+def forget_schema(path):
+    """
+    makes the next connection to path check its schema again, e.g. after a restore replaced the file
+    """
+    with _schema_lock:
+        _ready_paths.discard(os.path.abspath(path))
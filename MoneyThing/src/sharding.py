@@ -0,0 +1,67 @@
+import os
+import src.change_log as change_log
+import src.compaction as compaction
+from src.user_context import UserContext
+from src.sql_database import SQLDatabase
+from src.logger import log
+
+
+def copy_table(db, table, where, values=tuple()) -> int:
+    """
+    copies the rows of source.table matching where into the same table of db, keeping their ids
+    :return: number of rows copied
+    """
+    primary_key, columns = change_log.get_table_columns(db.cursor, table)
+    source_columns = [info[1] for info in db.cursor.execute(f"PRAGMA source.table_info({table});")]
+    if len(source_columns) == 0:
+        return 0
+    columns = ", ".join(column for column in [primary_key] + columns if column in source_columns)
+    return db.execute_sql(
+        f"""
+        INSERT INTO main.{table} ({columns})
+        SELECT {columns} FROM source.{table}
+        WHERE {where};
+        """,
+        values
+    ).rowcount
+
+def split_database(source_path, db_path=None) -> dict:
+    """
+    Copies a shared database into the sharded layout: Users into the auth database,
+    and each user's rows, MetaData, ArchivedFingerprints and ChangeLog into their own shard. The source is left as it was.
+    :param db_path: where the sharded layout goes, the auth database and shards are put next to it
+    :return: rows copied per user id, 0 for the auth database
+    """
+    if db_path is None:
+        db_path = source_path
+    auth_db = SQLDatabase(UserContext(db_path=db_path, sharded=True))
+    existing_users = auth_db.execute_sql("SELECT COUNT(*) FROM Users;", do_log=False).fetchone()[0]
+    if existing_users > 0:
+        raise ValueError(f"{auth_db.context.get_auth_path()} already has users, refusing to split into it")
+
+    copied = {}
+    auth_db.cursor.execute("ATTACH DATABASE ? AS source;", (str(source_path), ))
+    with auth_db.transaction():
+        copied[0] = copy_table(auth_db, "Users", "1")
+    user_ids = [row[0] for row in auth_db.execute_sql("SELECT user_id FROM source.Users;", do_log=False)]
+    auth_db.cursor.execute("DETACH DATABASE source;")
+
+    for user_id in user_ids:
+        context = UserContext(user_id, db_path, sharded=True)
+        if os.path.exists(context.get_shard_path(user_id)):
+            raise ValueError(f"{context.get_shard_path(user_id)} already exists, refusing to split into it")
+        shard = SQLDatabase(context)
+        shard.cursor.execute("ATTACH DATABASE ? AS source;", (str(source_path), ))
+        num_rows = 0
+        with shard.transaction():
+            user_meta_data = "meta_data_id IN (SELECT meta_data_id FROM source.MetaData WHERE user_id = ?)"
+            for table in compaction.get_meta_data_tables(shard):
+                num_rows += copy_table(shard, table, user_meta_data, (user_id, ))
+            num_rows += copy_table(shard, "MetaData", "user_id = ?", (user_id, ))
+            num_rows += copy_table(shard, "ArchivedFingerprints", "user_id = ?", (user_id, ))
+            num_rows += copy_table(shard, "ChangeLog", "user_id = ? AND table_name != 'Users'", (user_id, ))
+        shard.cursor.execute("DETACH DATABASE source;")
+        copied[user_id] = num_rows
+        log(f"Split {num_rows} rows for user {user_id} into {context.get_shard_path(user_id)}")
+
+    return copied
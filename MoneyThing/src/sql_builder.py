@@ -0,0 +1,132 @@
+import os
+import threading
+
+# passed to sqlite3.connect as cached_statements, the compiled statements kept per connection.
+# the builder always produces the same text for the same shape, so repeated writes reuse them
+STATEMENT_CACHE_SIZE = int(os.environ.get("MONEYTHING_STATEMENT_CACHE_SIZE", 256))
+
+
+class SQLBuilder:
+    """
+    Statement text for the data layer's CRUD helpers, built once per (kind, table, columns) shape.
+    Table and column names are checked against the database's schema before they are put in a statement,
+    so identifiers from a DataFrame or a dict can't inject SQL.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.schemas = {}
+        self.statements = {}
+
+    def load_columns(self, cursor, table) -> set[str]:
+        columns = {info[1] for info in cursor.execute(f"PRAGMA table_info({table});")}
+        if len(columns) == 0:
+            raise ValueError(f"Unknown table {table!r}")
+        self.schemas[table] = columns
+        return columns
+
+    def check_columns(self, cursor, table, columns):
+        if not (isinstance(table, str) and table.isidentifier()):
+            raise ValueError(f"Invalid table name {table!r}")
+        known_columns = self.schemas.get(table)
+        if known_columns is None:
+            known_columns = self.load_columns(cursor, table)
+        unknown = [column for column in columns if column not in known_columns]
+        if len(unknown) > 0:
+            # a migration may have added them since the schema was read
+            known_columns = self.load_columns(cursor, table)
+            unknown = [column for column in unknown if column not in known_columns]
+        if len(unknown) > 0:
+            raise ValueError(f"Unknown columns for {table}: {unknown}")
+
+    def get_statement(self, cursor, kind, table, columns, build) -> str:
+        key = (kind, table, tuple(columns))
+        statement = self.statements.get(key)
+        if statement is None:
+            with self.lock:
+                self.check_columns(cursor, table, columns)
+                statement = build()
+                self.statements[key] = statement
+        return statement
+
+    def insert(self, cursor, table, columns) -> str:
+        """
+        :param columns: columns given values, in order, meta_data_id included
+        """
+        return self.get_statement(
+            cursor, "insert", table, columns,
+            lambda: f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?'*len(columns))});"
+        )
+
+    def update(self, cursor, table, columns, id_name) -> str:
+        """
+        :return: statement taking the column values, then the id
+        """
+        return self.get_statement(
+            cursor, "update", table, list(columns) + [id_name],
+            lambda: f"UPDATE {table} SET {', '.join(f'{column}=?' for column in columns)} WHERE {id_name}=?;"
+        )
+
+    def touch_meta_data(self, cursor, table, id_name) -> str:
+        """
+        :return: statement taking the edited timestamp, then the id
+        """
+        return self.get_statement(
+            cursor, "touch", table, [id_name, "meta_data_id"],
+            lambda: f"""
+                UPDATE MetaData
+                SET edited_timestamp = ?
+                WHERE meta_data_id = (
+                    SELECT meta_data_id FROM {table}
+                    WHERE {id_name}=?
+                );
+                """
+        )
+
+    def touch_meta_data_many(self, cursor, table, id_name) -> str:
+        """
+        :return: statement taking the edited timestamp, then a json list of ids
+        """
+        return self.get_statement(
+            cursor, "touch_many", table, [id_name, "meta_data_id"],
+            lambda: f"""
+                UPDATE MetaData
+                SET edited_timestamp = ?
+                WHERE meta_data_id IN (
+                    SELECT meta_data_id FROM {table}
+                    WHERE {id_name} IN (SELECT value FROM json_each(?))
+                );
+                """
+        )
+
+    def soft_delete(self, cursor, table, column) -> str:
+        """
+        :return: statement taking the edited timestamp, then the value rows are deleted by
+        """
+        return self.get_statement(
+            cursor, "delete", table, [column, "meta_data_id"],
+            lambda: f"""
+                UPDATE MetaData
+                SET row_deleted = 1, edited_timestamp = ?
+                WHERE meta_data_id IN (
+                    SELECT meta_data_id FROM {table}
+                    WHERE {column}=?
+                );
+                """
+        )
+
+    def select_user_rows(self, cursor, table, columns) -> str:
+        """
+        :return: statement taking the user id, selecting the user's rows that aren't deleted
+        """
+        return self.get_statement(
+            cursor, "select", table, list(columns) + ["meta_data_id"],
+            lambda: f"""
+                SELECT {", ".join(columns)}
+                FROM {table}
+                JOIN MetaData ON {table}.meta_data_id = MetaData.meta_data_id
+                WHERE MetaData.user_id = ? AND MetaData.row_deleted = 0;
+                """
+        )
+
+
+sql_builder = SQLBuilder()
@@ -1,26 +1,45 @@
 import sqlite3 as sql
 import math
+import json
+import os
 import datetime
 import numpy as np
+from contextlib import contextmanager
+import time
 import src.utils as utils
+import src.tracing as tracing
+import src.change_log as change_log
+import src.schema as schema
+from src.sql_builder import sql_builder, STATEMENT_CACHE_SIZE
 from src.logger import log
+from src.user_context import UserContext
 
 class SQLDatabase:
-    def __init__(self, has_user_id=True):
-        self.user_id = utils.get_user_id()
-        self.connection = sql.connect("database.db", check_same_thread=False)
+    def __init__(self, context: UserContext | None = None):
+        """
+        :param context: the user and database to use, defaults to no user on the default database
+        """
+        if context is None:
+            context = UserContext()
+        self.context = context
+        self.user_id = context.user_id
+        db_path = context.get_database_path()
+        if context.sharded:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.connection = sql.connect(db_path, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
         self.cursor = self.connection.cursor()
-
-    @staticmethod
-    def string_set(row):
-        items = list(row.items())
-        string_data = []
-        values = []
-        for key, val in items:
-            if val is not None:
-                string_data.append(f"{key}=?")
-                values.append(val)
-        return ", ".join(string_data), values
+        self.in_transaction = False
+        # change ids (first, last] logged by the last run_user_sql statement
+        self.last_user_sql_change_range = None
+        # a user's shard has no Users table, so unqualified queries on Users find the attached auth database
+        self.is_shard = context.sharded and self.user_id is not None
+        self.is_auth_database = context.sharded and self.user_id is None
+        if self.is_shard:
+            if not schema.is_schema_ready(context.get_auth_path()):
+                # bootstraps the auth database before it is attached
+                SQLDatabase(UserContext(db_path=context.db_path, sharded=True))
+            self.cursor.execute("ATTACH DATABASE ? AS auth;", (context.get_auth_path(), ))
+        schema.ensure_schema(self)
 
     @staticmethod
     def stringify(var) -> str:
@@ -59,30 +78,37 @@ class SQLDatabase:
         return self.cursor.lastrowid
 
 
+    def get_data_version(self) -> tuple:
+        """
+        cheap fingerprint of the user's data, changes whenever a row is created, edited or deleted.
+        The latest change id catches writes that don't touch MetaData, e.g. run_user_sql,
+        it counts every user's writes so it may change when this user's data hasn't
+        :return: (number of meta data rows, latest edited timestamp, latest change id)
+        """
+        return tuple(self.execute_sql(
+            """
+            SELECT COUNT(*), MAX(edited_timestamp), (SELECT COALESCE(MAX(change_id), 0) FROM ChangeLog)
+            FROM MetaData
+            WHERE user_id = ?;
+            """,
+            (self.user_id, ),
+            False
+        ).fetchone())
+
     def delete(self, table, variable, value):
         self.execute_sql(
-            f"""
-            UPDATE MetaData
-            SET row_deleted = 1
-            WHERE meta_data_id IN (
-                SELECT meta_data_id FROM {table}
-                WHERE {variable}=?
-            );
-            """,
-            (value, )
+            sql_builder.soft_delete(self.cursor, table, variable),
+            (datetime.datetime.now().isoformat(), value)
         )
+
     def create_row(self, table: str, data: dict) -> int:
         """
         :param table: name of the table
         :param data: dictionary of data to be saved, not including primary key of table
         :return: id of table
         """
+        sql_statement = sql_builder.insert(self.cursor, table, list(data.keys())+["meta_data_id"])
         meta_data_id = self.generate_meta_data()
-        len_data = len(data)
-        sql_statement = f"""
-            INSERT INTO {table} ({','.join(data.keys())}, meta_data_id)
-            VALUES ({', '.join('?'*(len_data+1))});
-            """
         self.execute_sql(
             sql_statement,
             tuple(list(data.values())+[meta_data_id])
@@ -98,27 +124,44 @@ class SQLDatabase:
         :param id_: the id value for this row, e.g. 5
         :return: None
         """
-        set_statement, values = SQLDatabase.string_set(data)
-        if set_statement != "":
+        data = {column: value for column, value in data.items() if value is not None}
+        if len(data) > 0:
             self.execute_sql(
-                f"""
-                UPDATE {table} SET {set_statement}
-                WHERE {id_name}=?;
-                """,
-                tuple(values+[id_])
+                sql_builder.update(self.cursor, table, list(data.keys()), id_name),
+                tuple(list(data.values())+[id_])
             )
             self.execute_sql(
-                f"""
-                UPDATE MetaData
-                SET edited_timestamp = ?
-                WHERE meta_data_id = (
-                    SELECT meta_data_id FROM {table}
-                    WHERE {id_name}=?
-                );
-                """,
+                sql_builder.touch_meta_data(self.cursor, table, id_name),
                 (datetime.datetime.now().isoformat(), id_)
             )
 
+    def update_rows(self, table: str, id_name: str, changes: list[tuple]) -> int:
+        """
+        Updates many rows in one transaction, one executemany per set of changed columns,
+        then touches all of their MetaData rows with a single statement
+        :param changes: (id, dictionary of data to update) for each row, None values are left as they are
+        :return: number of rows updated
+        """
+        rows_by_columns = {}
+        ids = []
+        for id_, data in changes:
+            data = {column: value for column, value in data.items() if value is not None}
+            if len(data) == 0:
+                continue
+            rows_by_columns.setdefault(tuple(data.keys()), []).append(tuple(data.values()) + (id_, ))
+            ids.append(utils.death_to_numpy(id_))
+        if len(ids) == 0:
+            return 0
+
+        with self.transaction():
+            for columns, rows in rows_by_columns.items():
+                self.execute_many_sql(sql_builder.update(self.cursor, table, list(columns), id_name), rows)
+            self.execute_sql(
+                sql_builder.touch_meta_data_many(self.cursor, table, id_name),
+                (datetime.datetime.now().isoformat(), json.dumps(ids))
+            )
+        return len(ids)
+
     def add_user(self, username, password_hash):
         self.execute_sql(
             """
@@ -129,27 +172,62 @@ class SQLDatabase:
         )
 
     def load_table(self, obj, *args):
-        return obj(
-            self.execute_sql(
-                f"""
-                SELECT {", ".join([col for col in obj.COLUMNS])}
-                FROM {obj.TABLE}
-                JOIN MetaData ON {obj.TABLE}.meta_data_id = MetaData.meta_data_id
-                WHERE MetaData.user_id = ? AND MetaData.row_deleted = 0;
-                """,
-                (str(self.user_id),),
-                False
-            ),
-            *args
-        )
+        with tracing.span(f"load_table {obj.TABLE}"):
+            table = obj(
+                self.execute_sql(
+                    sql_builder.select_user_rows(self.cursor, obj.TABLE, obj.COLUMNS),
+                    (str(self.user_id),),
+                    False
+                ),
+                *args
+            )
+            tracing.record_rows(len(table.db_data))
+        return table
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """
+        commits every statement executed inside the block together, or none of them on error
+        :param immediate: take the write lock at the start, so no other connection writes between its reads and writes
+        """
+        if self.in_transaction:
+            yield self
+            return
+        self.in_transaction = True
+        try:
+            if immediate:
+                if self.connection.in_transaction:
+                    self.connection.commit()
+                self.cursor.execute("BEGIN IMMEDIATE;")
+            yield self
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        finally:
+            self.in_transaction = False
 
     def execute_sql(self, sql_statement, values=tuple(), do_log=True):
         values = utils.death_to_numpy(values)
         if do_log:
-            log("Executing SQL statement with values ->", values)
-            log(sql_statement)
+            log("Executing SQL statement with values ->", values, "\n", sql_statement, level="debug")
+        start = time.perf_counter()
         return_val = self.cursor.execute(sql_statement, values)
-        self.connection.commit()
+        if not self.in_transaction:
+            self.connection.commit()
+        tracing.record_sql(time.perf_counter()-start, return_val.rowcount)
+
+        return return_val
+
+    def execute_many_sql(self, sql_statement, rows, do_log=True):
+        rows = [utils.death_to_numpy(values) for values in rows]
+        if do_log:
+            log(f"Executing SQL statement for {len(rows)} rows ->", "\n", sql_statement, level="debug")
+        start = time.perf_counter()
+        return_val = self.cursor.executemany(sql_statement, rows)
+        if not self.in_transaction:
+            self.connection.commit()
+        tracing.record_sql(time.perf_counter()-start, return_val.rowcount)
 
         return return_val
 
@@ -172,22 +250,58 @@ class SQLDatabase:
         log("Executing User SQL:", sql_statement)
         success = True
         try:
-            output = self.cursor.execute(sql_statement)
-            # if output.description is not None:
-            #     columns = [info[0] for info in output.description]
-            #     output = pd.DataFrame(
-            #         output.fetchall(),
-            #         columns=columns
-            #     )
-            #     output = output.drop("meta_data_id", axis=1)
-
-            self.connection.commit()
+            # the write lock is held throughout, so the changes logged in (before, after] are only this statement's,
+            # see change_log.undo_range
+            with self.transaction(immediate=True):
+                before = change_log.get_latest_change_id(self)
+                # its own cursor, reading the change ids afterwards would replace a select's rows
+                output = self.connection.cursor().execute(sql_statement)
+                # if output.description is not None:
+                #     columns = [info[0] for info in output.description]
+                #     output = pd.DataFrame(
+                #         output.fetchall(),
+                #         columns=columns
+                #     )
+                #     output = output.drop("meta_data_id", axis=1)
+                after = change_log.get_latest_change_id(self)
+            self.last_user_sql_change_range = (before, after)
+            log(f"User SQL logged changes {before+1} to {after}")
         except Exception as e:
             success = False
             output = e
         return output, success
 
+    def add_missing_column(self, table, column, column_type):
+        columns = [info[1] for info in self.cursor.execute(f"PRAGMA table_info({table});")]
+        if column not in columns:
+            self.cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type};")
+
+    def create_users_table(self):
+        self.cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS Users(
+                user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT, 
+                password_hash TEXT,
+                tokens INT
+            );
+            """
+        )
+        try:
+            self.cursor.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON Users(LOWER(username));"
+            )
+        except sql.IntegrityError:
+            log("Users has usernames that only differ by case, they can't be uniquely indexed", level="warning")
+
     def create_tables(self):
+        if self.is_auth_database:
+            self.create_users_table()
+            change_log.create_change_log(self.cursor, ["Users"])
+            self.connection.commit()
+            return
+        if not self.is_shard:
+            self.create_users_table()
         self.cursor.execute(
             """
             CREATE TABLE IF NOT EXISTS Products(
@@ -246,7 +360,24 @@ class SQLDatabase:
                 vendor_id INTEGER,
                 shop_location_id INTEGER,
                 category_id INTEGER,
-                description TEXT
+                description TEXT,
+                fingerprint TEXT
+            );
+            """
+        )
+        self.add_missing_column("Transactions", "fingerprint", "TEXT")
+        self.cursor.execute(
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_fingerprint
+            ON Transactions(fingerprint);
+            """
+        )
+        # fingerprints of transactions compaction has archived, so they still aren't imported again
+        self.cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ArchivedFingerprints(
+                fingerprint TEXT PRIMARY KEY,
+                user_id INTEGER
             );
             """
         )
@@ -310,16 +441,6 @@ class SQLDatabase:
             );
             """
         )
-        self.cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS Users(
-                user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT, 
-                password_hash TEXT,
-                tokens INT
-            );
-            """
-        )
         self.cursor.execute(
             """
             CREATE TABLE IF NOT EXISTS Vouchers(
@@ -343,4 +464,8 @@ class SQLDatabase:
             );
             """
         )
+        change_log.create_change_log(
+            self.cursor,
+            [table for table in change_log.CHANGE_LOGGED_TABLES if not (self.is_shard and table == "Users")]
+        )
         self.connection.commit()
\ No newline at end of file
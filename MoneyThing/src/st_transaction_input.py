@@ -1,7 +1,10 @@
 import streamlit as st
 from src.adding_transaction import AddingTransaction
+from src.transaction_date_index import TransactionDateIndex
+from src.usage_ranking import UsageRanking
 import src.utils as utils
 import src.streamlit_utils as st_utils
+from src.authentication import set_tokens
 import pandas as pd
 from src.logger import log
 import datetime
@@ -137,15 +140,18 @@ def transactions_edit_ui(db_manager):
 
 
     left_input, right_input = st.columns(2)
-    adding_spending = AddingTransaction(db_manager)
+    adding_spending = AddingTransaction(db_manager, st.session_state)
+    usage_rankings = get_usage_rankings(db_manager)
     adding_spending.set_vendor_name(
         left_input.selectbox(
-            "Vendor Name", db_manager.get_all_vendor_names(),
+            "Vendor Name", usage_rankings["vendor"].order(db_manager.get_all_vendor_names()),
             accept_new_options=True, index=None, key="vendor_input",
             on_change=vendor_selected, args=(db_manager, )
         )
     )
-    selected_shop_locations = db_manager.get_shop_locations(adding_spending.vendor_name)
+    selected_shop_locations = usage_rankings["location"].order(
+        db_manager.get_shop_locations(adding_spending.vendor_name)
+    )
     adding_spending.set_shop_location(
         right_input.selectbox(
             "Location Name", selected_shop_locations,
@@ -169,7 +175,7 @@ def transactions_edit_ui(db_manager):
     )
     adding_spending.set_spending_category(
         left_input.selectbox(
-            "Spending Category", db_manager.get_all_categories(),
+            "Spending Category", usage_rankings["category"].order(db_manager.get_all_categories()),
             index=None, key="category_input"
         )
     )
@@ -250,6 +256,7 @@ def transactions_edit_ui(db_manager):
         st.session_state["delete_transaction_inputs"] = True
         save_transaction_pop_up(adding_spending)
         adding_spending.add_transaction_to_db()
+        record_transaction_usage(db_manager, adding_spending)
         # st.rerun()
 
 @st.dialog("Transaction Complete")
@@ -271,9 +278,7 @@ def save_transaction_pop_up(adding_spending):
     st.markdown(f"You Spent £{adding_spending.override_money:.2f} at {adding_spending.vendor_name}!")
     st.markdown(f"The Spending Category was {category_name}, with a Token Conversion of {importance:.2f}")
 
-    adding_spending.db_manager.db.execute_sql(
-        f"UPDATE Users SET tokens={st.session_state["current_user_tokens"]} WHERE user_id={adding_spending.db_manager.db.user_id}"
-    )
+    set_tokens(adding_spending.db_manager.db.user_id, st.session_state["current_user_tokens"])
 
     if st.button("Roll Spinner"):
         width = 7
@@ -353,18 +358,44 @@ def internal_transfers_edit_ui(db_manager):
         st.markdown("please implement this save button")
 
 
+def get_usage_rankings(db_manager) -> dict[str, UsageRanking]:
+    data_version = db_manager.db.get_data_version()
+    rankings = st.session_state.get("usage_rankings", None)
+    if rankings is not None and rankings["data_version"] == data_version:
+        return rankings
+
+    transactions_df = db_manager.transactions.db_data
+    category_names = transactions_df["category_id"].map(
+        db_manager.categories.db_data.set_index("category_id")["name"]
+    )
+    rankings = {
+        "data_version": data_version,
+        "money_store": UsageRanking().build(transactions_df["money_store"], transactions_df["date"]),
+        "vendor": UsageRanking().build(transactions_df["vendor_name"], transactions_df["date"]),
+        "location": UsageRanking().build(transactions_df["shop_location"], transactions_df["date"]),
+        "category": UsageRanking().build(category_names, transactions_df["date"]),
+    }
+    st.session_state["usage_rankings"] = rankings
+    return rankings
+
+def record_transaction_usage(db_manager, adding_spending):
+    if st.session_state.get("editing_transaction_id", -1) != -1:
+        # edits can move usage between options, so let the next render rebuild
+        return
+    rankings = get_usage_rankings(db_manager)
+    date = utils.string_to_date(adding_spending.spending_date)
+    category = db_manager.categories.get_db_row(adding_spending.category_id)
+
+    rankings["money_store"].record_use(st.session_state.get("money_store_input", None), date)
+    rankings["vendor"].record_use(adding_spending.vendor_name, date)
+    rankings["location"].record_use(adding_spending.shop_location, date)
+    if category is not None:
+        rankings["category"].record_use(category["name"], date)
+    rankings["data_version"] = db_manager.db.get_data_version()
+
 def get_most_used_money_store(db_manager):
-    db = db_manager.transactions.db_data.copy()
-    db["date_obj"] = db["date"].apply(utils.string_to_date)
-    filtered_df = db.sort_values("date_obj", ascending=False)
-    money_stores = db_manager.money_stores.db_data
-    names = list(filtered_df["money_store_id"])
-    zipped = list(zip(money_stores["money_store_id"], money_stores["name"]))
-    zipped.sort(key=lambda item: names.count(item[0]))
-    return 0, sorted(filter(
-            lambda name: not utils.isNone(name),
-            set(map(lambda a: a[1], zipped))
-        ))
+    money_stores = db_manager.get_all_money_stores()
+    return 0, get_usage_rankings(db_manager)["money_store"].order(money_stores)
 
 def click_ui_nav_button(new_depth, new_timestamp=None, transaction_id=None, is_internal=None):
     st.session_state["transaction_viewer_date"]["depth"] = new_depth
@@ -410,15 +441,7 @@ def transactions_listing_ui(db_manager, state):
     else:
         transactions_info = get_transactions_info_years_months_days(db_manager, state)
 
-        ### TODO: clean this up
-        transactions_info_list = list(transactions_info.items())
-        if state["depth"] == "years":
-            transactions_info_list.sort(key=lambda x: x[0])
-        elif state["depth"] == "months":
-            transactions_info_list.sort(key=lambda x: utils.string_to_date(x[0].split()[0]))
-        elif state["depth"] == "days":
-            transactions_info_list.sort(key=lambda x: x[0])
-        for date, info_dict in transactions_info_list:
+        for date, info_dict in transactions_info.items():
             st.button(
                 f"{date} -> Income: £{info_dict['income']:.2f} Spending: £{info_dict['spending']:.2f}",
                 use_container_width=True,
@@ -577,7 +600,7 @@ def load_transaction_input(db_manager, transaction_id):
         "override_price",
         "num_purchased"
     ]]
-    adding_spending = AddingTransaction(db_manager)
+    adding_spending = AddingTransaction(db_manager, st.session_state)
     adding_spending.refresh_display_df()
 
 def clear_internal_transfer_input():
@@ -598,58 +621,58 @@ def load_internal_transfer_input(db_manager, internal_transfer_id):
     st.session_state["transfer_time_input"] = utils.string_to_time(noneify(row["time"]))
     st.session_state["internal_money_transferred_input"] = noneify(row["money_transferred"])
 
-def get_transactions_info_years_months_days(db_manager, state) -> dict[str, dict]:
-    transactions_df = get_transaction_and_transfer_df(db_manager)
-    if len(transactions_df) == 0:
-        return {}
-
-    depth_encoder = {
-        "years": {
-            "date_id_func": lambda obj: datetime.date(obj.year, 1, 1),
-            "filter_func": lambda _: True,
-            "format_date": "%Y"
-        },
-        "months": {
-            "date_id_func": lambda obj: datetime.date(obj.year, obj.month, 1),
-            "filter_func": lambda obj: obj.year == state["timestamp"].year,
-            "format_date": "%B"
-        },
-        "days": {
-            "date_id_func": lambda obj: datetime.date(obj.year, obj.month, obj.day),
-            "filter_func": lambda obj: (obj.year == state["timestamp"].year and obj.month == state["timestamp"].month),
-            "format_date": "%d %a"
-        },
-    }
-
-    type_info = depth_encoder[state["depth"]]
+def get_transaction_date_index(db_manager) -> TransactionDateIndex:
+    data_version = db_manager.db.get_data_version()
+    date_index = st.session_state.get("transaction_date_index", None)
+    if date_index is None:
+        date_index = TransactionDateIndex()
+        st.session_state["transaction_date_index"] = date_index
+
+    if date_index.data_version != data_version:
+        date_index.sync(
+            TransactionDateIndex.get_entries_df(
+                db_manager.transactions,
+                db_manager.internal_transfers,
+                db_manager.spending_items
+            ),
+            data_version
+        )
+    return date_index
 
-    if state["depth"] not in depth_encoder.keys():
+def get_transactions_info_years_months_days(db_manager, state) -> dict[str, dict]:
+    date_index = get_transaction_date_index(db_manager)
+
+    if state["depth"] == "years":
+        nodes = [
+            (datetime.date(year, 1, 1), node)
+            for year, node in date_index.get_years()
+        ]
+        format_date = "%Y"
+    elif state["depth"] == "months":
+        year = state["timestamp"].year
+        nodes = [
+            (datetime.date(year, month, 1), node)
+            for month, node in date_index.get_months(year)
+        ]
+        format_date = "%B"
+    elif state["depth"] == "days":
+        year, month = state["timestamp"].year, state["timestamp"].month
+        nodes = [
+            (datetime.date(year, month, day), node)
+            for day, node in date_index.get_days(year, month)
+        ]
+        format_date = "%d %a"
+    else:
         raise Exception(f"<get_transactions_info_years_months_days> function run when depth is not years, months or days: state.depth = {state['depth']}")
 
-    transactions_df["date_obj"] = transactions_df["date"].apply(utils.string_to_date)
-
-    # print(transactions_df)
-    transactions_df = transactions_df[transactions_df["date_obj"].apply(
-        lambda val:
-        False
-        if utils.isNone(val)
-        else type_info["filter_func"](val)
-    )]
-
-    transactions_df["date_id"] = transactions_df["date_obj"].apply(
-        lambda obj: (datetime.date.today() if obj is None else type_info["date_id_func"](obj))
-    )
-    output = {}
-    for date_id in transactions_df["date_id"].unique():
-        output[
-            date_id.strftime(type_info["format_date"])
-        ] = summarise_transactions(
-            db_manager,
-            transactions_df[transactions_df["date_id"] == date_id],
-            date_id
-        )
-
-    return output
+    return {
+        date_id.strftime(format_date): {
+            "income": node["income"],
+            "spending": node["spending"],
+            "timestamp": date_id,
+        }
+        for date_id, node in nodes
+    }
 
 def get_transactions_info_for_date(db_manager, state):
     transactions_df = get_transaction_and_transfer_df(db_manager)
@@ -657,20 +680,6 @@ def get_transactions_info_for_date(db_manager, state):
     return transactions_df[transactions_df["date_obj"] == state["timestamp"]]
 
 
-def summarise_transactions(db_manager, transactions_df, timestamp=None):
-    transactions_df = transactions_df.copy()
-    transactions_df["money_moved"] =  transactions_df.apply(
-        lambda row:
-        find_transaction_value(db_manager, row),
-        axis=1
-    )
-
-    return {
-        "income": sum(transactions_df[transactions_df["is_income"]==True]["money_moved"]),
-        "spending": sum(transactions_df[transactions_df["is_income"]==False]["money_moved"]),
-        "timestamp": timestamp,
-    }
-
 def find_transaction_value(db_manager, df_row) -> float:
     if not utils.isNone(df_row["override_money"]):
         return df_row["override_money"]
@@ -0,0 +1,273 @@
+import bisect
+from abc import ABC, abstractmethod
+import itertools
+import re
+from typing import Iterable, Iterator
+import pandas as pd
+import numpy as np
+import src.utils as utils
+from src.logger import log
+
+STATEMENT_PARSERS = {}
+
+
+def register_statement_parser(parser_class):
+    """
+    class decorator, adds an instance of the parser to STATEMENT_PARSERS.
+    Parsers are tried in the order they are registered.
+    """
+    parser = parser_class()
+    STATEMENT_PARSERS[parser.BANK] = parser
+    return parser_class
+
+
+HEADER_NORMALISE_PATTERN = re.compile(r"[^A-Z0-9]+")
+
+
+def normalise_header_text(text: str) -> str:
+    return HEADER_NORMALISE_PATTERN.sub("", text.upper())
+
+
+class StatementLayout:
+    """
+    Column layout of a statement table.
+    Boundaries are the x pos of the far left of each column, in column order.
+    They are detected from each page's header row when the layout has header keywords, and cached per
+    header signature, so a layout is only worked out once. The default offsets are used when no header is found.
+    """
+    def __init__(
+            self,
+            columns: list[tuple[str, int]],
+            header_keywords: dict[str, str] | None = None,
+            right_aligned: set[str] | None = None
+    ):
+        """
+        :param columns: list of (column title, default x pos of far left of column)
+        :param header_keywords: column title -> its header text, compared without case or spaces,
+            so "Paid out" matches words "Paid", "out" or "Paidout"
+        :param right_aligned: columns whose values are right aligned under their header,
+            their boundaries come from the header's right edge, as the left edge doesn't line up with the values
+        """
+        self.names = [column for column, cutoff in columns]
+        self.default_boundaries = [cutoff for column, cutoff in columns]
+        self.header_keywords = {
+            name: normalise_header_text(keyword) for name, keyword in (header_keywords or {}).items()
+        }
+        self.right_aligned = right_aligned or set()
+        self.boundary_cache = {}
+
+    def find_header(self, line: list[dict]) -> dict[str, tuple[int, int]] | None:
+        """
+        :return: column title -> (left x pos, right x pos) of its header text, None if line isn't the header row
+        """
+        texts = [normalise_header_text(word["text"]) for word in line]
+        found = {}
+        for name, keyword in self.header_keywords.items():
+            for start in range(len(line)):
+                joined = ""
+                for end in range(start, len(line)):
+                    joined += texts[end]
+                    if not keyword.startswith(joined):
+                        break
+                    if joined == keyword:
+                        found[name] = (line[start]["x_pos"], line[end].get("x_end_pos", line[end]["x_pos"]))
+                        break
+                if name in found:
+                    break
+            if name not in found:
+                return None
+        return found
+
+    def find_page_header(self, page: list[list[dict]]) -> dict[str, tuple[int, int]] | None:
+        if len(self.header_keywords) == 0:
+            return None
+        for line in page:
+            header = self.find_header(line)
+            if header is not None:
+                return header
+        return None
+
+    def get_boundaries(self, header: dict[str, tuple[int, int]] | None = None) -> list[int]:
+        if header is None:
+            return self.default_boundaries
+
+        cache_key = tuple(sorted(header.items()))
+        if cache_key not in self.boundary_cache:
+            self.boundary_cache[cache_key] = self.make_boundaries(header)
+        return self.boundary_cache[cache_key]
+
+    def make_boundaries(self, header: dict[str, tuple[int, int]]) -> list[int]:
+        right_names = [name for name in self.names if name in header and name in self.right_aligned]
+        boundaries = []
+        for name, default in zip(self.names, self.default_boundaries):
+            if name not in header:
+                # keeps its calibrated distance from the column before it
+                previous = (boundaries[-1] - self.default_boundaries[len(boundaries)-1]) if len(boundaries) > 0 else 0
+                boundaries.append(default + previous)
+            elif name not in self.right_aligned:
+                boundaries.append(header[name][0])
+            else:
+                # a right aligned column starts where the one before it ends, which for the first of them is
+                # taken as the same width as the gap to the next one
+                index = right_names.index(name)
+                if index > 0:
+                    boundaries.append(header[right_names[index-1]][1])
+                elif len(right_names) > 1:
+                    boundaries.append(2*header[name][1] - header[right_names[1]][1])
+                else:
+                    boundaries.append(default)
+        boundaries[0] = min(boundaries[0], 0)
+        if boundaries != sorted(boundaries):
+            log(f"Ignoring out of order statement header: {header}", level="warning")
+            return self.default_boundaries
+        return boundaries
+
+    def split_line(self, line: list[dict], boundaries: list[int] | None = None) -> dict[str, str]:
+        if boundaries is None:
+            boundaries = self.default_boundaries
+        new_row = {name: [] for name in self.names}
+        for word in line:
+            column_index = max(bisect.bisect_right(boundaries, word["x_pos"])-1, 0)
+            new_row[self.names[column_index]].append(word["text"])
+        return {
+            name: " ".join(words)
+            for name, words in new_row.items()
+        }
+
+
+class StatementParser(ABC):
+    BANK = "BANK_NOT_DEFINED"
+    DETECT_PATTERN = None
+    LAYOUT = None
+
+    def get_page_boundaries(self, page: list[list[dict]]) -> list[int]:
+        return self.LAYOUT.get_boundaries(self.LAYOUT.find_page_header(page))
+
+    def detect(self, first_page_text: str) -> bool:
+        return self.DETECT_PATTERN is not None and self.DETECT_PATTERN.search(first_page_text) is not None
+
+    @abstractmethod
+    def parse(self, pages: Iterable[list[list[dict]]]) -> tuple[pd.DataFrame, dict | None]:
+        """
+        :return: (transactions df with columns date, name, description, money, is_income, snapshot info)
+        """
+
+
+@register_statement_parser
+class HSBCStatementParser(StatementParser):
+    BANK = "hsbc"
+    DETECT_PATTERN = re.compile(r"HSBC|BALANCEBROUGHTFORWARD")
+    # "Payment type and details" heads both the type and name columns, so name keeps its calibrated offset from type
+    LAYOUT = StatementLayout(
+        [
+            ("date", 0),
+            ("type", 110),
+            ("name", 135),
+            ("paid_out", 350),
+            ("paid_in", 440),
+            ("balance", 510)
+        ],
+        header_keywords={
+            "date": "Date",
+            "type": "Payment type and details",
+            "paid_out": "Paid out",
+            "paid_in": "Paid in",
+            "balance": "Balance"
+        },
+        right_aligned={"paid_out", "paid_in", "balance"}
+    )
+
+    def iter_transaction_lines(self, pages: Iterable[list[list[dict]]], balance_texts: list[str]) -> Iterator[tuple[list[dict], list[int]]]:
+        """
+        Yields the lines between each page's brought forward and carried forward balances,
+        along with the column boundaries for that page
+        :param balance_texts: filled with the text of every brought forward line seen
+        """
+        for page in pages:
+            boundaries = self.get_page_boundaries(page)
+            at_transactions = False
+            for line in page:
+                text = " ".join([word["text"] for word in line])
+
+                if "BALANCECARRIEDFORWARD" in text:
+                    at_transactions = False
+                if at_transactions:
+                    yield line, boundaries
+                if "BALANCEBROUGHTFORWARD" in text:
+                    at_transactions = True
+                    balance_texts.append(text)
+
+    def parse(self, pages):
+        balance_texts = []
+        rows = []
+        for line, boundaries in self.iter_transaction_lines(pages, balance_texts):
+            row = self.LAYOUT.split_line(line, boundaries)
+            if row["type"] != "" or len(rows) == 0:
+                row["description"] = None
+                rows.append(row)
+            else:
+                # continuation of the previous transaction
+                previous = rows[-1]
+                if previous["description"] is None:
+                    previous["description"] = row["name"]
+                else:
+                    previous["description"] += " "+row["name"]
+                previous["paid_out"] = row["paid_out"]
+                previous["paid_in"] = row["paid_in"]
+                previous["balance"] = row["balance"]
+        initial_balance_text = balance_texts[0] if len(balance_texts) > 0 else None
+
+        combined_df = pd.DataFrame(
+            rows,
+            columns=self.LAYOUT.names+["description"]
+        )
+
+        combined_df["date"] = combined_df["date"].replace("", np.nan).ffill()
+        combined_df["date"] = combined_df["date"].apply(utils.string_to_date)
+
+        paid_in = combined_df["paid_in"] != ""
+        paid_out = (combined_df["paid_out"] != "") & ~paid_in
+        combined_df["money"] = np.nan
+        combined_df.loc[paid_in, "money"] = pd.to_numeric(
+            combined_df.loc[paid_in, "paid_in"].str.replace(",", ""), errors="coerce")
+        combined_df.loc[paid_out, "money"] = pd.to_numeric(
+            combined_df.loc[paid_out, "paid_out"].str.replace(",", ""), errors="coerce")
+        combined_df["is_income"] = pd.Series(np.nan, index=combined_df.index, dtype=object)
+        combined_df.loc[paid_in, "is_income"] = True
+        combined_df.loc[paid_out, "is_income"] = False
+
+        transaction_df = combined_df[["date", "name", "description", "money", "is_income"]]
+
+        snapshot_info = None
+        if initial_balance_text is not None:
+            split_text = initial_balance_text.split()
+            try:
+                date_str = split_text[0]+" "+split_text[1]+" "+split_text[2]
+                balance_str = split_text[-1]
+                snapshot_info = {
+                    "date": utils.string_to_date(date_str),
+                    "balance": float(balance_str.replace(",", ""))
+                }
+            except:
+                pass
+
+        return transaction_df, snapshot_info
+
+
+def detect_statement_parser(first_page: list[list[dict]]) -> StatementParser:
+    text = " ".join(word["text"] for line in first_page for word in line)
+    for parser in STATEMENT_PARSERS.values():
+        if parser.detect(text):
+            return parser
+    log("Statement layout not recognised, defaulting to HSBC", level="warning")
+    return STATEMENT_PARSERS[HSBCStatementParser.BANK]
+
+
+def parse_statement_pages(pages: Iterable[list[list[dict]]]) -> tuple[pd.DataFrame, dict | None]:
+    """
+    Picks a parser from the first page, then streams every page through it
+    """
+    pages = iter(pages)
+    first_page = next(pages, [])
+    parser = detect_statement_parser(first_page)
+    return parser.parse(itertools.chain([first_page], pages))
@@ -1,9 +1,39 @@
 import streamlit as st
+import json
+import pandas as pd
+import src.tracing as tracing
+from src.logger import log
+from src.user_context import UserContext
 from st_aggrid import AgGrid, GridOptionsBuilder
 from st_aggrid.shared import GridUpdateMode, DataReturnMode
 
 ITEMS_PER_PAGE = 15
 
+def is_authenticated() -> bool:
+    if "authenticated" not in st.session_state:
+        st.session_state["authenticated"] = False
+    return st.session_state["authenticated"]
+
+def block_if_no_auth():
+    if not is_authenticated():
+        log("Forcing user back to login page")
+        st.session_state["switch_page"] = "account"
+        st.rerun()
+
+def get_user_id():
+    if is_authenticated():
+        return st.session_state["current_user_id"]
+    return None
+
+def get_user_context() -> UserContext:
+    return UserContext(get_user_id())
+
+def get_ip_address() -> str | None:
+    """
+    :return: the client's address, None when it isn't known (e.g. running locally)
+    """
+    return st.context.ip_address
+
 def pages_manager_ui(state, df):
     num_items = len(df)
     total_pages = num_items//ITEMS_PER_PAGE+1
@@ -33,6 +63,31 @@ def pages_manager_ui(state, df):
     return df.iloc[ITEMS_PER_PAGE * (state["page"] - 1):ITEMS_PER_PAGE * state["page"]]
 
 
+def tracing_panel_ui(trace):
+    """
+    admin only sidebar panel with the timings of the last rerun
+    """
+    if get_user_id() != 1:
+        return
+    with st.sidebar.expander("Performance"):
+        if trace is not None:
+            total = trace.root
+            st.markdown(
+                f"**{trace.name}** {total.duration*1000:.0f}ms, "
+                f"{total.sql_count} SQL statements ({total.sql_time*1000:.0f}ms), {total.row_count} rows"
+            )
+            st.dataframe(
+                pd.DataFrame([span.to_dict() for span in trace.get_slowest_spans()]),
+                hide_index=True
+            )
+        st.download_button(
+            "Export Traces",
+            json.dumps(tracing.export_recent_traces(), indent=2),
+            file_name="traces.json",
+            mime="application/json"
+        )
+
+
 def double_run():
     if "has_rerun" not in st.session_state:
         st.session_state["has_rerun"] = False
@@ -0,0 +1,137 @@
+import functools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+MAX_KEPT_TRACES = 50
+
+_local = threading.local()
+recent_traces = deque(maxlen=MAX_KEPT_TRACES)
+
+
+class Span:
+    def __init__(self, name, depth):
+        self.name = name
+        self.depth = depth
+        self.start = time.perf_counter()
+        self.duration = None
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.row_count = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "depth": self.depth,
+            "duration_ms": None if self.duration is None else self.duration*1000,
+            "sql_count": self.sql_count,
+            "sql_time_ms": self.sql_time*1000,
+            "row_count": self.row_count
+        }
+
+
+class Trace:
+    """
+    Spans and SQL counts for one unit of work, e.g. a single Streamlit rerun
+    """
+    def __init__(self, name):
+        self.name = name
+        self.started_at = time.time()
+        self.root = Span(name, 0)
+        self.spans = []
+        self.stack = [self.root]
+
+    def finish(self):
+        self.root.duration = time.perf_counter() - self.root.start
+
+    def get_slowest_spans(self, limit=10) -> list[Span]:
+        return sorted(
+            (span for span in self.spans if span.duration is not None),
+            key=lambda span: span.duration,
+            reverse=True
+        )[:limit]
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "started_at": self.started_at,
+            "total": self.root.to_dict(),
+            "spans": [span.to_dict() for span in self.spans]
+        }
+
+
+def start_trace(name) -> Trace:
+    """
+    starts collecting spans for the current thread, replacing any unfinished trace
+    """
+    _local.trace = Trace(name)
+    return _local.trace
+
+def finish_trace() -> Trace | None:
+    trace = get_trace()
+    if trace is None:
+        return None
+    trace.finish()
+    recent_traces.append(trace)
+    _local.trace = None
+    return trace
+
+def get_trace() -> Trace | None:
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def span(name):
+    trace = get_trace()
+    if trace is None:
+        yield None
+        return
+    new_span = Span(name, len(trace.stack))
+    trace.spans.append(new_span)
+    trace.stack.append(new_span)
+    try:
+        yield new_span
+    finally:
+        new_span.duration = time.perf_counter() - new_span.start
+        trace.stack.pop()
+
+def traced(name=None):
+    """
+    decorator, runs the function inside a span named after it
+    """
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_sql(duration, row_count=0):
+    """
+    adds a statement to every open span
+    :param row_count: rows changed by the statement, or returned by it if known
+    """
+    trace = get_trace()
+    if trace is None:
+        return
+    for open_span in trace.stack:
+        open_span.sql_count += 1
+        open_span.sql_time += duration
+        open_span.row_count += max(row_count, 0)
+
+def record_rows(row_count):
+    """
+    adds rows read outside of record_sql, e.g. fetched by a select, to every open span
+    """
+    trace = get_trace()
+    if trace is None:
+        return
+    for open_span in trace.stack:
+        open_span.row_count += row_count
+
+def export_recent_traces() -> list[dict]:
+    return [trace.to_dict() for trace in list(recent_traces)]
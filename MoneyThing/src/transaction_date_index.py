@@ -0,0 +1,119 @@
+import pandas as pd
+import src.utils as utils
+
+
+class TransactionDateIndex:
+    """
+    year -> month -> day tree of transaction counts and income/spending totals
+
+    Each transaction's contribution to the tree is remembered, so when the data
+    changes only the rows that were added, edited or removed get re-applied.
+    """
+    def __init__(self):
+        self.tree = {}
+        self.entries = {}
+        self.data_version = None
+
+    @staticmethod
+    def make_node():
+        return {"count": 0, "income": 0.0, "spending": 0.0, "children": {}}
+
+    @staticmethod
+    def get_entries_df(transactions, internal_transfers, spending_items) -> pd.DataFrame:
+        """
+        :return: one row per transaction/transfer with columns key, date, is_income, value
+        """
+        item_totals = spending_items.get_transaction_totals()
+        transactions_df = transactions.db_data
+        override_money = transactions_df["override_money"]
+        values = override_money.where(
+            override_money.notna(),
+            transactions_df["transaction_id"].map(item_totals)
+        ).fillna(0)
+
+        entries = pd.DataFrame({
+            "key": "transaction-" + transactions_df["transaction_id"].astype(str),
+            "date": transactions_df["date"],
+            "is_income": transactions_df["is_income"],
+            "value": values
+        })
+        transfers_df = internal_transfers.db_data
+        transfer_entries = pd.DataFrame({
+            "key": "transfer-" + transfers_df["transfer_id"].astype(str),
+            "date": transfers_df["date"],
+            "is_income": None,
+            "value": 0.0
+        })
+        return pd.concat([entries, transfer_entries], ignore_index=True)
+
+    def sync(self, entries_df, data_version=None):
+        """
+        brings the tree up to date with entries_df, only re-applying entries that changed
+        """
+        # normalised as add_entry stores them, so a NaN is_income matches its stored None
+        current = {
+            key: (
+                None if utils.isNone(date) else date,
+                None if utils.isNone(is_income) else bool(is_income),
+                value
+            )
+            for key, date, is_income, value in zip(
+                entries_df["key"], entries_df["date"],
+                entries_df["is_income"], entries_df["value"]
+            )
+        }
+        for key in list(self.entries.keys()):
+            if key not in current:
+                self.remove_entry(key)
+
+        for key, (date_string, is_income, value) in current.items():
+            previous = self.entries.get(key)
+            if previous is not None and previous[0] == date_string \
+                    and previous[1] == is_income and previous[2] == value:
+                continue
+            if previous is not None:
+                self.remove_entry(key)
+            self.add_entry(key, date_string, is_income, value)
+
+        self.data_version = data_version
+
+    def add_entry(self, key, date_string, is_income, value):
+        date = utils.string_to_date(date_string)
+        if utils.isNone(is_income):
+            is_income = None
+        else:
+            is_income = bool(is_income)
+        self.entries[key] = (date_string, is_income, value, date)
+        if date is not None:
+            self.apply(date, is_income, value, 1)
+
+    def remove_entry(self, key):
+        date_string, is_income, value, date = self.entries.pop(key)
+        if date is not None:
+            self.apply(date, is_income, value, -1)
+
+    def apply(self, date, is_income, value, sign):
+        nodes = self.tree
+        for part in (date.year, date.month, date.day):
+            if part not in nodes:
+                nodes[part] = self.make_node()
+            node = nodes[part]
+            node["count"] += sign
+            if is_income is True:
+                node["income"] += sign * value
+            elif is_income is False:
+                node["spending"] += sign * value
+            if node["count"] <= 0:
+                del nodes[part]
+                return
+            nodes = node["children"]
+
+    def get_years(self) -> list[tuple]:
+        return sorted(self.tree.items())
+
+    def get_months(self, year) -> list[tuple]:
+        return sorted(self.tree.get(year, self.make_node())["children"].items())
+
+    def get_days(self, year, month) -> list[tuple]:
+        year_node = self.tree.get(year, self.make_node())
+        return sorted(year_node["children"].get(month, self.make_node())["children"].items())
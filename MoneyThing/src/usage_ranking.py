@@ -0,0 +1,45 @@
+import datetime
+import pandas as pd
+import src.utils as utils
+
+
+class UsageRanking:
+    """
+    Recency weighted usage counts, each use is worth 0.5 ** (age in days / half life)
+    """
+    HALF_LIFE_DAYS = 90
+
+    def __init__(self, half_life_days=HALF_LIFE_DAYS):
+        self.half_life_days = half_life_days
+        self.weights = {}
+
+    def get_weights(self, dates: pd.Series, today=None) -> pd.Series:
+        if today is None:
+            today = datetime.date.today()
+        ages = (pd.Timestamp(today) - utils.parse_date_series(dates)).dt.days
+        # undated uses count as one half life old
+        ages = ages.clip(lower=0).fillna(self.half_life_days)
+        return 0.5 ** (ages / self.half_life_days)
+
+    def build(self, keys: pd.Series, dates: pd.Series, today=None):
+        weights = self.get_weights(dates, today)
+        self.weights = weights.groupby(keys.values).sum().to_dict()
+        return self
+
+    def record_use(self, key, date=None):
+        if utils.isNone(key):
+            return
+        if date is None:
+            weight = 1
+        else:
+            weight = self.get_weights(pd.Series([utils.date_to_string(date)])).iloc[0]
+        self.weights[key] = self.weights.get(key, 0) + weight
+
+    def order(self, options) -> list:
+        """
+        :return: options sorted most used first, ties sorted alphabetically
+        """
+        return sorted(
+            options,
+            key=lambda option: (-self.weights.get(option, 0), option)
+        )
@@ -0,0 +1,57 @@
+import os
+
+DATABASE_PATH = "database.db"
+AUTH_DATABASE_NAME = "auth.db"
+SHARD_DIRECTORY_NAME = "users"
+# "shared" keeps every user in one database, "sharded" gives each user their own file,
+# with Users in an auth database, both next to the shared database's path. e.g. MONEYTHING_STORAGE=sharded
+STORAGE_MODE = os.environ.get("MONEYTHING_STORAGE", "shared").lower()
+
+
+class UserContext:
+    """
+    Who the data layer is acting for and which database it uses.
+    The Streamlit adapter builds one from the session, scripts and workers build their own.
+    """
+    def __init__(self, user_id=None, db_path=DATABASE_PATH, sharded=None):
+        """
+        :param user_id: the logged in user, None for queries that aren't user scoped (e.g. the Users table)
+        :param sharded: use the per user storage mode, defaults to MONEYTHING_STORAGE
+        """
+        self.user_id = user_id
+        self.db_path = db_path
+        self.sharded = (STORAGE_MODE == "sharded") if sharded is None else sharded
+
+    def get_auth_path(self) -> str:
+        return os.path.join(os.path.dirname(self.db_path), AUTH_DATABASE_NAME)
+
+    def get_shard_path(self, user_id) -> str:
+        return os.path.join(os.path.dirname(self.db_path), SHARD_DIRECTORY_NAME, f"user_{user_id}.db")
+
+    def get_database_path(self) -> str:
+        """
+        :return: the file to connect to, the user's shard or the auth database when sharded
+        """
+        if not self.sharded:
+            return self.db_path
+        if self.user_id is None:
+            return self.get_auth_path()
+        return self.get_shard_path(self.user_id)
+
+    def list_database_paths(self) -> list[str]:
+        """
+        :return: every database file of the deployment, e.g. for backups
+        """
+        if not self.sharded:
+            return [self.db_path]
+        shard_directory = os.path.join(os.path.dirname(self.db_path), SHARD_DIRECTORY_NAME)
+        shard_paths = []
+        if os.path.isdir(shard_directory):
+            shard_paths = sorted(
+                os.path.join(shard_directory, name) for name in os.listdir(shard_directory)
+                if name.startswith("user_") and name.endswith(".db")
+            )
+        return [self.get_auth_path()] + shard_paths
+
+    def __repr__(self):
+        return f"UserContext(user_id={self.user_id}, db_path={self.db_path!r}, sharded={self.sharded})"
@@ -0,0 +1,119 @@
+import sqlite3 as sql
+import threading
+from src.user_context import UserContext
+from src.sql_database import SQLDatabase
+from src.sql_builder import sql_builder
+from src.logger import log
+
+USER_COLUMNS = ["user_id", "username", "password_hash", "tokens"]
+
+
+class UserDirectory:
+    """
+    Users looked up by id or by lowercased username, each read once with an indexed query and then cached.
+    Every write to Users goes through here so the cached rows are dropped when they change.
+    """
+    def __init__(self, context: UserContext | None = None):
+        """
+        :param context: the database holding Users, user_id is ignored
+        """
+        if context is None:
+            context = UserContext()
+        self.lock = threading.RLock()
+        self.db = SQLDatabase(UserContext(db_path=context.db_path, sharded=context.sharded))
+        self.by_id = {}
+        self.by_username = {}
+
+    def load_user(self, where, value) -> dict | None:
+        row = self.db.execute_sql(
+            f"SELECT {', '.join(USER_COLUMNS)} FROM Users WHERE {where};",
+            (value, ),
+            False
+        ).fetchone()
+        if row is None:
+            return None
+        user = dict(zip(USER_COLUMNS, row))
+        self.by_id[user["user_id"]] = user
+        self.by_username[user["username"].lower()] = user
+        return user
+
+    def get_user(self, user_id) -> dict | None:
+        with self.lock:
+            user = self.by_id.get(user_id)
+            if user is None:
+                user = self.load_user("user_id = ?", int(user_id))
+            return user
+
+    def get_user_by_username(self, username) -> dict | None:
+        """
+        :param username: case insensitive
+        """
+        with self.lock:
+            user = self.by_username.get(username.lower())
+            if user is None:
+                user = self.load_user("LOWER(username) = ?", username.lower())
+            return user
+
+    def invalidate(self, user_id=None):
+        """
+        drops a user's cached row, or every cached row when user_id is None
+        """
+        with self.lock:
+            if user_id is None:
+                self.by_id.clear()
+                self.by_username.clear()
+                return
+            user = self.by_id.pop(user_id, None)
+            if user is not None:
+                self.by_username.pop(user["username"].lower(), None)
+
+    def add_user(self, username, password_hash) -> int | None:
+        """
+        :return: the new user's id, None if the username is taken
+        """
+        with self.lock:
+            try:
+                self.db.add_user(username, password_hash)
+            except sql.IntegrityError:
+                return None
+            user_id = self.db.cursor.lastrowid
+        log(f"Registered user {user_id}")
+        return user_id
+
+    def update_user(self, user_id, data: dict) -> bool:
+        """
+        :param data: columns of Users to set, e.g. {"username": "new name"}
+        :return: False if a new username is taken
+        """
+        for column in data:
+            if column not in USER_COLUMNS[1:]:
+                raise ValueError(f"Unknown Users column {column}")
+        data = {column: value for column, value in data.items() if value is not None}
+        with self.lock:
+            try:
+                self.db.execute_sql(
+                    sql_builder.update(self.db.cursor, "Users", list(data.keys()), "user_id"),
+                    tuple(data.values()) + (user_id, ),
+                    False
+                )
+            except sql.IntegrityError:
+                return False
+            finally:
+                self.invalidate(user_id)
+        return True
+
+
+_directories = {}
+_directories_lock = threading.Lock()
+
+def get_user_directory(context: UserContext | None = None) -> UserDirectory:
+    """
+    :return: the process wide directory for the context's Users table
+    """
+    if context is None:
+        context = UserContext()
+    key = (context.db_path, context.sharded)
+    with _directories_lock:
+        if key not in _directories:
+            _directories[key] = UserDirectory(context)
+        return _directories[key]
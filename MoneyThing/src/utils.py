@@ -3,7 +3,6 @@ from src.logger import log
 from pandas.errors import IntCastingNaNError
 import pandas as pd
 import numpy as np
-import streamlit as st
 import datetime
 
 
@@ -46,22 +45,6 @@ def filter_df(df, column, value):
         return df
     return df[(df[column] == value) | (pd.isna(df[column]) & pd.isna(value))]
 
-def is_authenticated() -> bool:
-    if "authenticated" not in st.session_state:
-        st.session_state["authenticated"] = False
-    return st.session_state["authenticated"]
-
-def block_if_no_auth():
-    if not is_authenticated():
-        log("Forcing user back to login page")
-        st.session_state["switch_page"] = "account"
-        st.rerun()
-
-def get_user_id():
-    if is_authenticated():
-        return st.session_state["current_user_id"]
-    return None
-
 def make_display_inner_joins(*args) -> list[dict]:
     """
     Takes any number of lists of data to generate inner join data
@@ -146,6 +129,12 @@ def date_to_string(date: datetime.date) -> str | None:
         return None
     return date.strftime("%a %d %b %Y")
 
+def parse_date_series(series: pd.Series) -> pd.Series:
+    """
+    vectorised string_to_date for columns stored by date_to_string, unparseable values become NaT
+    """
+    return pd.to_datetime(series, format="%a %d %b %Y", errors="coerce")
+
 
 def conform_time_string(input_string: str) -> str:
     time_obj = string_to_time(input_string)
@@ -256,4 +245,13 @@ def mode_of_list(lst):
         if val > max_val:
             max_val = val
             max_index = key
-    return max_index
\ No newline at end of file
+    return max_index
+
+def read_file_bytes(file) -> bytes:
+    """
+    :param file: a path or an uploaded file object
+    """
+    if hasattr(file, "getvalue"):
+        return file.getvalue()
+    with open(file, "rb") as f:
+        return f.read()
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import unittest
+from src.user_context import UserContext
+from src.sql_database import SQLDatabase
+import src.change_log as change_log
+
+
+class ChangeLogUndoTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db = SQLDatabase(UserContext(1, os.path.join(self.temp_dir.name, "database.db")))
+        self.transaction_ids = []
+        for i in range(3):
+            transaction_id = self.db.create_row("Transactions", {
+                "date": f"2024-01-0{i+1}",
+                "override_money": 10.5 + i,
+                "is_income": False,
+                "description": f"transaction {i}"
+            })
+            self.transaction_ids.append(transaction_id)
+            for j in range(2):
+                self.db.create_row("SpendingItems", {
+                    "transaction_id": transaction_id,
+                    "override_price": 1.25 * (j+1),
+                    "num_purchased": j+1
+                })
+
+    def tearDown(self):
+        self.db.connection.close()
+        self.temp_dir.cleanup()
+
+    def select_all(self, table):
+        return self.db.execute_sql(f"SELECT * FROM {table} ORDER BY 1;", do_log=False).fetchall()
+
+    def snapshot(self):
+        return {table: self.select_all(table) for table in ("Transactions", "SpendingItems", "MetaData")}
+
+    def test_undo_user_sql_update(self):
+        before = self.snapshot()
+        output, success = self.db.run_user_sql("UPDATE Transactions SET description = 'bad', override_money = 0;")
+        self.assertTrue(success, output)
+        self.assertNotEqual(self.select_all("Transactions"), before["Transactions"])
+
+        self.assertEqual(change_log.undo_range(self.db, *self.db.last_user_sql_change_range), 6)
+        self.assertEqual(self.snapshot(), before)
+
+    def test_undo_user_sql_delete(self):
+        before = self.snapshot()
+        output, success = self.db.run_user_sql(
+            f"DELETE FROM SpendingItems WHERE transaction_id = {self.transaction_ids[0]};"
+        )
+        self.assertTrue(success, output)
+        self.assertEqual(len(self.select_all("SpendingItems")), 4)
+
+        change_log.undo_range(self.db, *self.db.last_user_sql_change_range)
+        self.assertEqual(self.snapshot(), before)
+
+    def test_undo_range_keeps_later_changes(self):
+        self.db.run_user_sql("UPDATE Transactions SET description = 'bad';")
+        user_sql_range = self.db.last_user_sql_change_range
+        self.db.execute_sql(
+            "UPDATE Transactions SET override_money = 99 WHERE transaction_id = ?;", (self.transaction_ids[1], )
+        )
+
+        change_log.undo_range(self.db, *user_sql_range)
+        rows = self.db.execute_sql(
+            "SELECT description, override_money FROM Transactions ORDER BY transaction_id;"
+        ).fetchall()
+        self.assertEqual(rows, [("transaction 0", 10.5), ("transaction 1", 99), ("transaction 2", 12.5)])
+
+    def test_failed_user_sql_logs_nothing(self):
+        before = self.snapshot()
+        change_id = change_log.get_latest_change_id(self.db)
+        output, success = self.db.run_user_sql("UPDATE Transactions SET missing_column = 1;")
+        self.assertFalse(success)
+        self.assertEqual(change_log.get_latest_change_id(self.db), change_id)
+        self.assertEqual(self.snapshot(), before)
+
+    def test_restore_soft_deleted_transaction(self):
+        transaction_id = self.transaction_ids[0]
+        before = self.snapshot()
+        change_id = change_log.get_latest_change_id(self.db)
+
+        self.db.execute_sql(
+            "UPDATE Transactions SET description = 'edited' WHERE transaction_id = ?;", (transaction_id, )
+        )
+        self.db.delete("Transactions", "transaction_id", transaction_id)
+        self.db.execute_sql("DELETE FROM SpendingItems WHERE transaction_id = ?;", (transaction_id, ))
+        self.assertNotEqual(self.snapshot(), before)
+
+        change_log.restore_transaction(self.db, transaction_id, change_id)
+        self.assertEqual(self.snapshot(), before)
+        row_deleted = self.db.execute_sql(
+            """
+            SELECT row_deleted FROM MetaData
+            WHERE meta_data_id = (SELECT meta_data_id FROM Transactions WHERE transaction_id = ?);
+            """,
+            (transaction_id, )
+        ).fetchone()[0]
+        self.assertEqual(row_deleted, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import tempfile
+import unittest
+from src.user_context import UserContext
+from src.db_manager import DatabaseManager
+
+
+class MergeVendorsTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_manager = DatabaseManager(UserContext(1, os.path.join(self.temp_dir.name, "database.db")))
+        db = self.db = self.db_manager.db
+        self.category_id = db.create_row("Categories", {"name": "Groceries"})
+        self.target_id = db.create_row("Vendors", {"name": "Tesco"})
+        self.source_ids = [
+            db.create_row("Vendors", {"name": "TESCO STORES", "default_category_id": self.category_id}),
+            db.create_row("Vendors", {"name": "Tesco Express"}),
+        ]
+        self.other_id = db.create_row("Vendors", {"name": "Lidl"})
+        self.location_ids = {
+            vendor_id: db.create_row("ShopLocations", {"shop_location": f"Store {vendor_id}", "vendor_id": vendor_id})
+            for vendor_id in self.source_ids + [self.other_id]
+        }
+        self.transaction_ids = {
+            vendor_id: [db.create_row("Transactions", {"vendor_id": vendor_id, "override_money": i}) for i in range(3)]
+            for vendor_id in [self.target_id, self.other_id] + self.source_ids
+        }
+        self.product_ids = {
+            vendor_id: db.create_row("Products", {"name": f"Milk {vendor_id}", "vendor_id": vendor_id})
+            for vendor_id in [self.target_id, self.other_id] + self.source_ids
+        }
+        # another user's row for a source vendor id is left alone
+        self.other_user_db = DatabaseManager(UserContext(2, self.db_manager.context.db_path)).db
+        self.other_user_transaction_id = self.other_user_db.create_row(
+            "Transactions", {"vendor_id": self.source_ids[0]}
+        )
+
+    def tearDown(self):
+        self.db.connection.close()
+        self.other_user_db.connection.close()
+        self.temp_dir.cleanup()
+
+    def get_vendor_ids(self, table, id_name, ids) -> list:
+        return [
+            self.db.execute_sql(f"SELECT vendor_id FROM {table} WHERE {id_name} = ?;", (id_, )).fetchone()[0]
+            for id_ in ids
+        ]
+
+    def is_deleted(self, vendor_id) -> bool:
+        return self.db.execute_sql(
+            """
+            SELECT row_deleted FROM MetaData
+            WHERE meta_data_id = (SELECT meta_data_id FROM Vendors WHERE vendor_id = ?);
+            """,
+            (vendor_id, )
+        ).fetchone()[0] == 1
+
+    def test_merge_repoints_every_row(self):
+        moved = self.db_manager.merge_vendors(self.source_ids, self.target_id)
+        self.assertEqual(moved, {"Transactions": 6, "Products": 2, "ShopLocations": 2, "Vendors": 2})
+
+        for vendor_id in self.source_ids + [self.target_id]:
+            self.assertEqual(
+                self.get_vendor_ids("Transactions", "transaction_id", self.transaction_ids[vendor_id]),
+                [self.target_id]*3
+            )
+            self.assertEqual(
+                self.get_vendor_ids("Products", "product_id", [self.product_ids[vendor_id]]), [self.target_id]
+            )
+        for vendor_id in self.source_ids:
+            self.assertEqual(
+                self.get_vendor_ids("ShopLocations", "shop_location_id", [self.location_ids[vendor_id]]),
+                [self.target_id]
+            )
+            self.assertTrue(self.is_deleted(vendor_id))
+
+        self.assertFalse(self.is_deleted(self.target_id))
+        self.assertFalse(self.is_deleted(self.other_id))
+        self.assertEqual(
+            self.get_vendor_ids("Transactions", "transaction_id", self.transaction_ids[self.other_id]),
+            [self.other_id]*3
+        )
+        self.assertEqual(
+            self.get_vendor_ids("Transactions", "transaction_id", [self.other_user_transaction_id]),
+            [self.source_ids[0]]
+        )
+
+    def test_merge_fills_missing_defaults_and_reloads(self):
+        self.db_manager.merge_vendors(self.source_ids, self.target_id)
+        default_category_id = self.db.execute_sql(
+            "SELECT default_category_id FROM Vendors WHERE vendor_id = ?;", (self.target_id, )
+        ).fetchone()[0]
+        self.assertEqual(default_category_id, self.category_id)
+
+        self.assertEqual(sorted(self.db_manager.vendors.db_data["vendor_id"]), [self.target_id, self.other_id])
+        self.assertEqual(
+            set(self.db_manager.transactions.db_data["vendor_id"]), {self.target_id, self.other_id}
+        )
+
+    def test_merge_sets_target_location(self):
+        self.db_manager.merge_vendors(self.source_ids, self.target_id, target_location="Main Street")
+        location_ids = {
+            row[0] for row in self.db.execute_sql(
+                "SELECT shop_location_id FROM Transactions WHERE transaction_id IN (SELECT value FROM json_each(?));",
+                (str(self.transaction_ids[self.source_ids[0]] + self.transaction_ids[self.source_ids[1]]), )
+            ).fetchall()
+        }
+        self.assertEqual(len(location_ids), 1)
+        self.assertEqual(
+            self.db.execute_sql(
+                "SELECT shop_location, vendor_id FROM ShopLocations WHERE shop_location_id = ?;",
+                (location_ids.pop(), )
+            ).fetchone(),
+            ("Main Street", self.target_id)
+        )
+
+    def test_merge_into_itself_does_nothing(self):
+        self.assertEqual(self.db_manager.merge_vendors([self.target_id], self.target_id), {})
+        self.assertFalse(self.is_deleted(self.target_id))
+
+
+if __name__ == "__main__":
+    unittest.main()
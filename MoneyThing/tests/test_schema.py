@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from src.user_context import UserContext
+from src.sql_database import SQLDatabase
+import src.change_log as change_log
+import src.compaction as compaction
+import src.schema as schema
+
+
+def make_unversioned_database(path):
+    """
+    Writes a database shaped like one made before schema versions were tracked:
+    no ChangeLog or its triggers, no fingerprints, no added indexes, user_version 0
+    """
+    SQLDatabase(UserContext(1, path)).connection.close()
+    connection = sqlite3.connect(path)
+    for (trigger, ) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'trigger';").fetchall():
+        connection.execute(f"DROP TRIGGER {trigger};")
+    for (index, ) in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name NOT LIKE 'sqlite_%';"
+    ).fetchall():
+        connection.execute(f"DROP INDEX {index};")
+    connection.execute("DROP TABLE ChangeLog;")
+    connection.execute("DROP TABLE ArchivedFingerprints;")
+    connection.execute("ALTER TABLE Transactions DROP COLUMN fingerprint;")
+
+    connection.execute(
+        """
+        INSERT INTO MetaData (meta_data_id, created_timestamp, edited_timestamp, row_deleted, user_id)
+        VALUES (1, '2000-01-01T00:00:00', '2000-01-01T00:00:00', 0, 1),
+               (2, '2000-01-01T00:00:00', '2000-01-01T00:00:00', 1, 1);
+        """
+    )
+    connection.execute(
+        """
+        INSERT INTO Transactions (transaction_id, meta_data_id, date, override_money, description)
+        VALUES (1, 1, '2000-01-01', 5, 'kept'), (2, 2, '2000-01-01', 7, 'deleted long ago');
+        """
+    )
+    connection.execute("PRAGMA user_version = 0;")
+    connection.commit()
+    connection.close()
+    schema.forget_schema(path)
+
+
+class SchemaMigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "database.db")
+        make_unversioned_database(self.path)
+        self.db = SQLDatabase(UserContext(1, self.path))
+
+    def tearDown(self):
+        self.db.connection.close()
+        self.temp_dir.cleanup()
+
+    def get_names(self, kind) -> set[str]:
+        return {
+            name for (name, ) in self.db.execute_sql(
+                "SELECT name FROM sqlite_master WHERE type = ?;", (kind, ), False
+            ).fetchall()
+        }
+
+    def test_migrates_to_latest_version(self):
+        version = self.db.cursor.execute("PRAGMA main.user_version;").fetchone()[0]
+        self.assertEqual(version, schema.get_schema_version())
+        columns = change_log.get_table_columns(self.db.cursor, "Transactions")[1]
+        self.assertIn("fingerprint", columns)
+        self.assertIn("idx_transactions_fingerprint", self.get_names("index"))
+        self.assertIn("idx_users_username", self.get_names("index"))
+        self.assertTrue({"ChangeLog", "ArchivedFingerprints"}.issubset(self.get_names("table")))
+
+    def test_existing_rows_are_kept_and_logged(self):
+        rows = self.db.execute_sql("SELECT transaction_id, description FROM Transactions ORDER BY 1;").fetchall()
+        self.assertEqual(rows, [(1, "kept"), (2, "deleted long ago")])
+
+        change_id = change_log.get_latest_change_id(self.db)
+        self.db.execute_sql("UPDATE Transactions SET description = 'edited' WHERE transaction_id = 1;")
+        change_log.undo_after(self.db, change_id)
+        self.assertEqual(
+            self.db.execute_sql("SELECT description FROM Transactions WHERE transaction_id = 1;").fetchone()[0],
+            "kept"
+        )
+
+    def test_fingerprint_index_is_unique(self):
+        self.db.execute_sql("UPDATE Transactions SET fingerprint = 'same' WHERE transaction_id = 1;")
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.db.execute_sql("UPDATE Transactions SET fingerprint = 'same' WHERE transaction_id = 2;")
+
+    def test_legacy_soft_deletes_get_a_retention_window(self):
+        archive_path = os.path.join(self.temp_dir.name, "archive.db")
+        removed = compaction.archive_deleted_rows(self.db, archive_path, 30)
+        self.assertEqual(removed["Transactions"], 0)
+        removed = compaction.archive_deleted_rows(self.db, archive_path, 0)
+        self.assertEqual(removed["Transactions"], 1)
+
+    def test_migrations_run_once(self):
+        schema.forget_schema(self.path)
+        change_id = change_log.get_latest_change_id(self.db)
+        SQLDatabase(UserContext(1, self.path)).connection.close()
+        self.assertEqual(change_log.get_latest_change_id(self.db), change_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import datetime
+import os
+import tempfile
+import unittest
+import pandas as pd
+from src.user_context import UserContext
+from src.sql_database import SQLDatabase
+from src.db_manager import DatabaseManager
+import src.compaction as compaction
+from src.pdf_reader import store_transactions_df, combine_statement_dfs
+
+
+def make_statement(first, last) -> pd.DataFrame:
+    """
+    :return: a parsed statement holding transactions first to last - 1
+    """
+    return pd.DataFrame({
+        "date": [datetime.date(2024, 1, 1) + datetime.timedelta(days=i // 3) for i in range(first, last)],
+        "name": [f"VENDOR {i % 4}" for i in range(first, last)],
+        "description": [f"payment {i}" for i in range(first, last)],
+        "money": [round(1.5 * i, 2) for i in range(first, last)],
+        "is_income": [i % 5 == 0 for i in range(first, last)],
+    })
+
+
+class StatementImportTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.context = UserContext(1, os.path.join(self.temp_dir.name, "database.db"))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def store(self, statement_df) -> int:
+        # a fresh manager each time, as the app has after every rerun
+        db_manager = DatabaseManager(self.context)
+        try:
+            return store_transactions_df(statement_df, None, db_manager)
+        finally:
+            db_manager.db.connection.close()
+
+    def count_transactions(self) -> int:
+        db_manager = DatabaseManager(self.context)
+        try:
+            return db_manager.db.execute_sql("SELECT COUNT(*) FROM Transactions;").fetchone()[0]
+        finally:
+            db_manager.db.connection.close()
+
+    def test_reimport_stores_nothing(self):
+        self.assertEqual(self.store(make_statement(0, 30)), 30)
+        self.assertEqual(self.store(make_statement(0, 30)), 0)
+        self.assertEqual(self.count_transactions(), 30)
+
+    def test_overlapping_statements_store_only_new_rows(self):
+        self.assertEqual(self.store(make_statement(0, 20)), 20)
+        self.assertEqual(self.store(make_statement(10, 30)), 10)
+        self.assertEqual(self.count_transactions(), 30)
+
+    def test_combined_overlapping_statements(self):
+        combined = combine_statement_dfs([make_statement(0, 20), make_statement(10, 30), make_statement(25, 35)])
+        self.assertEqual(len(combined), 35)
+        self.assertEqual(self.store(combined), 35)
+        self.assertEqual(self.store(make_statement(0, 35)), 0)
+
+    def test_repeated_rows_in_one_statement_are_kept(self):
+        statement = pd.concat([make_statement(0, 5), make_statement(0, 1)], ignore_index=True)
+        self.assertEqual(self.store(statement), 6)
+        self.assertEqual(self.store(statement), 0)
+        self.assertEqual(self.store(make_statement(0, 5)), 0)
+
+    def test_deleted_and_archived_rows_are_not_reimported(self):
+        self.store(make_statement(0, 10))
+        db = SQLDatabase(self.context)
+        self.addCleanup(db.connection.close)
+        db.delete("Transactions", "transaction_id", 1)
+        self.assertEqual(self.store(make_statement(0, 10)), 0)
+
+        removed = compaction.archive_deleted_rows(db, os.path.join(self.temp_dir.name, "archive.db"), 0)
+        self.assertEqual(removed["Transactions"], 1)
+        self.assertEqual(self.store(make_statement(0, 10)), 0)
+        self.assertEqual(self.count_transactions(), 9)
+
+
+if __name__ == "__main__":
+    unittest.main()